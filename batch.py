@@ -0,0 +1,201 @@
+import argparse
+import contextlib
+import glob
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import llq
+import referee
+import replay
+
+BATCH_SITES = 30
+CHUNK_ROWS = 10000
+
+TEXT_COLUMNS = ('replay', 'branch', 'command', 'train', 'recorded')
+TURN_COLUMNS = ('turn', 'outcome', 'gold', 'touched_site', 'danger',
+                'queen_x', 'queen_y', 'queen_hp', 'enemy_queen_x', 'enemy_queen_y', 'enemy_queen_hp',
+                'own_mines', 'own_towers', 'own_barracks', 'own_knights', 'own_archers', 'own_giants',
+                'enemy_mines', 'enemy_towers', 'enemy_barracks', 'enemy_knights', 'enemy_archers', 'enemy_giants')
+SITE_FEATURES = ('site_type', 'structure_type', 'owner', 'param_1', 'param_2', 'gold', 'max_mine_size',
+                 'own_eta', 'enemy_eta', 'enemy_base_distance', 'under_fire', 'fire_suppressed')
+
+
+def columns(sites=BATCH_SITES):
+    names = list(TEXT_COLUMNS)+list(TURN_COLUMNS)
+    for site_id in range(sites):
+        names.extend('s{0}_{1}'.format(site_id, feature) for feature in SITE_FEATURES)
+    return names
+
+
+def outcome(turn):
+    # the recording stops before the losing queen is removed, so compare the last hp seen
+    hp = {}
+    for line in turn.unit_lines:
+        x, y, owner, unit_type, health = [int(i) for i in line.split()]
+        if unit_type == llq.QUEEN:
+            hp[owner] = health
+    own = hp.get(llq.FRIENDLY_UNIT, 0)
+    enemy = hp.get(llq.ENEMY_UNIT, 0)
+    return (own > enemy)-(own < enemy)
+
+
+def turn_row(path, n, game_outcome, strategy, command, recorded, sites):
+    me = strategy.own_side
+    enemy = strategy.enemy_side
+    table = strategy.site_table
+    row = [path, '/'.join(getattr(strategy, 'branch', [])), command[0], command[1], ' | '.join(recorded),
+           n, game_outcome, me.owned_gold, me.touched_site, strategy.danger,
+           me.queen.x, me.queen.y, me.queen.hp, enemy.queen.x, enemy.queen.y, enemy.queen.hp]
+    for side in (me, enemy):
+        row.extend((len(side.mines), len(side.towers), len(side.barracks),
+                    len(side.knights), len(side.archers), len(side.giants)))
+    for site_id in range(sites):
+        if site_id not in strategy.site_coords:
+            row.extend([None]*len(SITE_FEATURES))
+            continue
+        site = strategy.analyzed_views[site_id]
+        row.extend((site.site_type, table.structure_type[site_id], table.owner[site_id],
+                    table.param_1[site_id], table.param_2[site_id], table.gold[site_id],
+                    table.max_mine_size[site_id], site.own_eta, site.enemy_eta, site.enemy_base_distance,
+                    len(site.under_fire), int(site.fire_suppressed)))
+    return row
+
+
+_factory = None
+_sites = BATCH_SITES
+
+
+def _init_worker(path, sites):
+    global _factory, _sites
+    _factory = referee.load_strategy(path) if path else llq.Strategy
+    _sites = sites
+
+
+def process_file(path):
+    # a game is at most a few hundred turns, so one file's rows are held until its outcome is known
+    game = replay.load_replay(path)
+    game_outcome = outcome(game.turns[-1]) if game.turns else 0
+    rows = []
+    with contextlib.redirect_stderr(io.StringIO()) as stderr:
+        strategy = game.factory(_factory)(game.num_sites, list(game.site_lines))
+        for n, turn in enumerate(game.turns):
+            command = strategy.turn(turn.queen_status, turn.site_lines, turn.unit_lines)
+            rows.append(turn_row(path, n, game_outcome, strategy, command, turn.command, _sites))
+            stderr.seek(0)
+            stderr.truncate()
+    return path, rows
+
+
+def _guarded(path):
+    try:
+        return process_file(path)
+    except (replay.ReplayError, ValueError, IndexError) as e:
+        print('{0}: {1}'.format(path, e), file=sys.stderr)
+        return path, None
+
+
+class ChunkWriter:
+    def __init__(self, out, names, chunk_rows=CHUNK_ROWS, fmt='npz'):
+        self.out = out
+        self.names = names
+        self.chunk_rows = chunk_rows
+        self.fmt = fmt
+        self.columns = [[] for _ in names]
+        self.rows = 0
+        self.chunks = 0
+        self.total = 0
+        os.makedirs(out, exist_ok=True)
+        with open(os.path.join(out, 'schema.json'), 'w') as f:
+            json.dump({'columns': names, 'text': list(TEXT_COLUMNS), 'format': fmt}, f, indent=1)
+
+    def add(self, row):
+        for column, value in zip(self.columns, row):
+            column.append(value)
+        self.rows += 1
+        if self.rows >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if self.rows == 0:
+            return
+        path = os.path.join(self.out, 'part-{0:05d}.{1}'.format(self.chunks, self.fmt))
+        if self.fmt == 'npz':
+            arrays = {}
+            for name, column in zip(self.names, self.columns):
+                if name in TEXT_COLUMNS:
+                    arrays[name] = np.array(column, dtype=str)
+                else:
+                    arrays[name] = np.array([np.nan if v is None else v for v in column], dtype=np.float64)
+            np.savez_compressed(path, **arrays)
+        else:
+            with open(path, 'w') as f:
+                f.write('\t'.join(self.names)+'\n')
+                for row in zip(*self.columns):
+                    f.write('\t'.join('' if v is None else str(v) for v in row)+'\n')
+        self.columns = [[] for _ in self.names]
+        self.total += self.rows
+        self.rows = 0
+        self.chunks += 1
+
+
+def replay_paths(inputs):
+    paths = []
+    for path in inputs:
+        if os.path.isdir(path):
+            paths.extend(sorted(glob.glob(os.path.join(path, '*.replay'))))
+        else:
+            paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='llq.py batch',
+                                     description='Turn recorded games into a per-turn decision dataset')
+    parser.add_argument('replays', nargs='+', help='replay files or directories of *.replay')
+    parser.add_argument('--out', required=True, help='directory for schema.json and the part-* chunks')
+    parser.add_argument('--strategy', default=None, help='llq.py revision to run (default: this llq)')
+    parser.add_argument('--format', choices=['npz', 'tsv'], default='npz')
+    parser.add_argument('--chunk', type=int, default=CHUNK_ROWS, help='rows per output chunk')
+    parser.add_argument('--sites', type=int, default=BATCH_SITES, help='site columns per row')
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args(argv)
+    if args.format == 'npz' and np is None:
+        parser.error('--format npz needs numpy, use --format tsv')
+
+    paths = replay_paths(args.replays)
+    writer = ChunkWriter(args.out, columns(args.sites), args.chunk, args.format)
+    start = time.time()
+    failed = 0
+    pool = multiprocessing.Pool(args.processes or os.cpu_count(), _init_worker, (args.strategy, args.sites))
+    try:
+        for n, (path, rows) in enumerate(pool.imap_unordered(_guarded, paths)):
+            if rows is None:
+                failed += 1
+                continue
+            for row in rows:
+                writer.add(row)
+            if (n+1) % 100 == 0:
+                print('files {0}/{1} rows {2} elapsed {3:.0f}s'.format(
+                    n+1, len(paths), writer.total+writer.rows, time.time()-start), file=sys.stderr)
+        writer.flush()
+    finally:
+        pool.terminate()
+        pool.join()
+    elapsed = time.time()-start
+    print('files {0} failed {1} rows {2} chunks {3} elapsed {4:.1f}s rows/s {5:.0f}'.format(
+        len(paths), failed, writer.total, writer.chunks, elapsed, writer.total/elapsed if elapsed else 0))
+    return 1 if failed else 0
+
+
+
+if __name__ == '__main__':
+    sys.exit(main())
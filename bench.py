@@ -0,0 +1,267 @@
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+import llq
+import referee
+from llq import GOLDMINE, TOWER, BARRACKS, KNIGHT, ARCHER, GIANT, KNIGHT_BARRACKS, ARCHER_BARRACKS, GIANT_BARRACKS
+
+# phase: turn, min sites, (mines, towers, barracks) per side, creeps per side, gold
+PHASES = {
+    'early': (10, 12, (1, 1, 0), 2, 150),
+    'mid': (60, 16, (3, 3, 1), 8, 300),
+    'late': (150, 24, (1, 10, 1), 22, 500),
+}
+# perturbed copies of a state the turn benchmark cycles through
+TURN_VARIANTS = 16
+
+
+class BenchState:
+    def __init__(self, phase, turn, init_lines, queen_status, site_lines, unit_lines):
+        self.phase = phase
+        self.turn = turn
+        self.init_lines = init_lines
+        self.queen_status = queen_status
+        self.site_lines = site_lines
+        self.unit_lines = unit_lines
+
+    def block(self):
+        lines = [self.queen_status]+self.site_lines+[str(len(self.unit_lines))]+self.unit_lines
+        return ('\n'.join(lines)+'\n').encode()
+
+
+def make_state(phase, seed=0):
+    turn, min_sites, structures, creeps, gold = PHASES[phase]
+    while len(referee.generate_map(seed).sites) < min_sites:
+        seed += 1
+    game = referee.Game(referee.generate_map(seed))
+    rng = random.Random(seed)
+    game.gold = [gold, gold]
+    # site i and i+1 mirror each other, so both sides get the same layout
+    pairs = sorted(range(0, len(game.sites), 2), key=lambda i: game.sites[i].x)
+    kinds = [GOLDMINE]*structures[0]+[TOWER]*structures[1]+[BARRACKS]*structures[2]
+    for i, kind in zip(pairs, kinds):
+        for site, owner in ((game.sites[i], 0), (game.sites[i+1], 1)):
+            if site.x > llq.FIELD_WIDTH/2:
+                owner = 1-owner
+            site.structure_type = kind
+            site.owner = owner
+            if kind == GOLDMINE:
+                site.income = rng.randint(1, max(site.max_mine_size, 1))
+            elif kind == TOWER:
+                site.tower_hp = rng.randint(200, 800)
+            else:
+                site.creep_type = rng.choice([KNIGHT_BARRACKS, KNIGHT_BARRACKS, ARCHER_BARRACKS, GIANT_BARRACKS])
+                site.train_left = rng.randint(0, 5)
+    for owner in (0, 1):
+        queen = game.queens[owner]
+        queen.x = rng.randint(100, llq.FIELD_WIDTH-100)
+        queen.y = rng.randint(100, llq.FIELD_HEIGHT-100)
+        enemy = game.queens[1-owner]
+        for _ in range(creeps):
+            unit_type = rng.choice([KNIGHT, KNIGHT, KNIGHT, ARCHER, GIANT])
+            x = enemy.x+rng.randint(-600, 600)
+            y = enemy.y+rng.randint(-400, 400)
+            x = min(max(x, 0), llq.FIELD_WIDTH)
+            y = min(max(y, 0), llq.FIELD_HEIGHT)
+            game.creeps.append(referee.RefUnit(x, y, owner, unit_type, rng.randint(5, referee.CREEP_STATS[unit_type][3])))
+    queen_status, site_lines, unit_lines = game.player_input(0)
+    return BenchState(phase, turn, game.game_map.site_lines(), queen_status, site_lines, unit_lines)
+
+
+def perturbed_turns(state, count, seed=0):
+    # consecutive turns of a game differ in tower hp and gold, so the turn benchmark
+    # should not replay identical lines the site line cache answers for free
+    rng = random.Random(seed)
+    radius = {int(line.split()[0]): int(line.split()[3]) for line in state.init_lines}
+    gold, touched = state.queen_status.split()
+    turns = []
+    for _ in range(count):
+        site_lines = []
+        for line in state.site_lines:
+            values = line.split()
+            if int(values[3]) == TOWER:
+                site = referee.RefSite(0, 0, 0, radius[int(values[0])], 0, 0)
+                site.tower_hp = max(int(values[5])-rng.randint(0, 40), 1)
+                values[5:7] = [str(site.tower_hp), str(site.attack_radius())]
+            elif int(values[3]) == GOLDMINE and int(values[1]) > 0:
+                values[1] = str(max(int(values[1])-rng.randint(0, 10), 0))
+            site_lines.append(' '.join(values))
+        queen_status = '{0} {1}'.format(int(gold)+rng.randint(0, 30), touched)
+        turns.append((queen_status, site_lines, state.unit_lines))
+    return turns
+
+
+def prepared(factory, state):
+    strategy = factory(len(state.init_lines), list(state.init_lines))
+    strategy.turn(state.queen_status, state.site_lines, state.unit_lines)
+    strategy.current_turn = state.turn
+    return strategy
+
+
+def benchmarks(factory, module, state):
+    # yields (name, timed call, untimed setup run before every call or None)
+    strategy = prepared(factory, state)
+    analyzed = [list(strategy.analyze_sites().values())]
+
+    def reanalyze():
+        # a fresh turn: new stamp and a new list, so no filter mask is reused
+        analyzed[0] = list(strategy.analyze_sites().values())
+    turns = itertools.cycle(perturbed_turns(state, TURN_VARIANTS))
+    yield 'turn', lambda: strategy.turn(*next(turns)), None
+    yield 'analyze_sites', strategy.analyze_sites, None
+    if strategy.enemy_knights_danger.__code__.co_argcount > 1:
+        # older revisions pass the distance function in
+        yield 'enemy_knights_danger', lambda: strategy.enemy_knights_danger(strategy.distance), None
+    else:
+        yield 'enemy_knights_danger', strategy.enemy_knights_danger, None
+    filters = []
+    for name in sorted(dir(strategy)):
+        if name.startswith('filter_'):
+            method = getattr(strategy, name)
+            filters.append(method)
+            yield name, lambda method=method: method(analyzed[0]), reanalyze
+
+    def all_filters():
+        for method in filters:
+            method(analyzed[0])
+    yield 'filter_all', all_filters, reanalyze
+
+    parser = prepared(factory, state)
+
+    def parse_lines():
+        if hasattr(parser, 'unit_table'):
+            parser.unit_table.clear()
+            parser.own_side.clear_units()
+            parser.enemy_side.clear_units()
+        else:
+            parser.own_side.clear()
+            parser.enemy_side.clear()
+        for site_line in state.site_lines:
+            parser.parse_site_line(site_line)
+        for unit_line in state.unit_lines:
+            parser.parse_unit_line(unit_line)
+    yield 'parse_lines', parse_lines, None
+
+    if hasattr(module, 'TurnReader'):
+        block = state.block()
+        read_fd, write_fd = os.pipe()
+        reader = module.TurnReader(read_fd)
+        num_sites = len(state.site_lines)
+
+        def read_turn():
+            os.write(write_fd, block)
+            reader.read_turn(num_sites)
+        yield 'read_turn', read_turn, None
+
+
+def measure(func, min_time, min_calls=20, setup=None):
+    samples = []
+    clock = time.perf_counter
+    deadline = clock()+min_time
+    while len(samples) < min_calls or clock() < deadline:
+        if setup is not None:
+            setup()
+        start = clock()
+        func()
+        samples.append(clock()-start)
+    samples.sort()
+    n = len(samples)
+    total = sum(samples)
+    return {
+        'calls': n,
+        'ops': n/total if total else 0.0,
+        'p50': samples[n//2]*1e6,
+        'p90': samples[min(int(n*0.9), n-1)]*1e6,
+        'p99': samples[min(int(n*0.99), n-1)]*1e6,
+        'max': samples[-1]*1e6,
+    }
+
+
+def run(factory, module, phases, min_time, only=None, seed=0):
+    results = {}
+    with contextlib.redirect_stderr(io.StringIO()) as stderr:
+        for phase in phases:
+            state = make_state(phase, seed)
+            for name, func, setup in benchmarks(factory, module, state):
+                key = '{0}/{1}'.format(phase, name)
+                if only and only not in key:
+                    continue
+                results[key] = measure(func, min_time, setup=setup)
+                stderr.seek(0)
+                stderr.truncate()
+    return results
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    lines = ['{0:<36} {1:>10} {2:>10} {3:>8}'.format('benchmark', 'base p50', 'p50 us', 'change')]
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            lines.append('{0:<36} {1:>10} {2:>10.1f} {3:>8}'.format(key, '-', result['p50'], 'new'))
+            continue
+        change = result['p50']/base['p50']-1 if base['p50'] else 0.0
+        flag = ''
+        if change > threshold:
+            flag = ' REGRESSION'
+            regressions.append(key)
+        lines.append('{0:<36} {1:>10.1f} {2:>10.1f} {3:>+7.1%}{4}'.format(key, base['p50'], result['p50'], change, flag))
+    return lines, regressions
+
+
+def report(results):
+    lines = ['{0:<36} {1:>10} {2:>9} {3:>9} {4:>9} {5:>9}'.format('benchmark', 'ops/s', 'p50 us', 'p90 us', 'p99 us', 'max us')]
+    for key, r in results.items():
+        lines.append('{0:<36} {1:>10.0f} {2:>9.1f} {3:>9.1f} {4:>9.1f} {5:>9.1f}'.format(
+            key, r['ops'], r['p50'], r['p90'], r['p99'], r['max']))
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark llq.Strategy hot paths on synthetic game states')
+    parser.add_argument('--strategy', default=None, help='llq.py revision to benchmark (default: this llq)')
+    parser.add_argument('--phases', default=','.join(PHASES), help='comma separated subset of early,mid,late')
+    parser.add_argument('--only', default=None, help='run benchmarks whose name contains this')
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds per benchmark')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--numpy', action='store_true', help='use the numpy analysis engine')
+    parser.add_argument('--json', default=None, help='write results to this file')
+    parser.add_argument('--compare', default=None, help='baseline json to compare p50 latencies against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='p50 slowdown flagged as a regression')
+    args = parser.parse_args(argv)
+
+    factory = referee.load_strategy(args.strategy) if args.strategy else llq.Strategy
+    module = sys.modules[factory.__module__]
+    if args.numpy:
+        strategy_class = factory
+
+        def factory(num_sites, site_lines):
+            return strategy_class(num_sites, site_lines, use_numpy=True)
+    results = run(factory, module, args.phases.split(','), args.min_time, args.only, args.seed)
+    print('\n'.join(report(results)))
+    if args.json:
+        meta = {'python': platform.python_version(), 'strategy': args.strategy or 'llq.py',
+                'numpy': args.numpy, 'time': time.strftime('%Y-%m-%d %H:%M:%S')}
+        with open(args.json, 'w') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent=1, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        lines, regressions = compare(results, baseline, args.threshold)
+        print('\n'.join(lines))
+        if regressions:
+            print('{0} regressions'.format(len(regressions)))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
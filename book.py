@@ -0,0 +1,282 @@
+import argparse
+import base64
+import json
+import random
+import re
+import sys
+import time
+import zlib
+
+import llq
+import referee
+import replay
+
+
+class OpeningRecorder:
+    def __init__(self, strategy, layout_flipped, turns):
+        self.strategy = strategy
+        self.flipped = layout_flipped
+        self.turns = turns
+        self.mirrored = None
+        self.moves = []
+        self.queen = []
+
+    def turn(self, queen_status, site_lines, unit_lines):
+        command = self.strategy.turn(queen_status, site_lines, unit_lines)
+        if len(self.moves) < self.turns:
+            queen = self.strategy.own_side.queen
+            if self.mirrored is None:
+                self.mirrored = queen.x > llq.FIELD_WIDTH/2
+            self.queen.extend(llq.frame_point(queen.x, queen.y, self.mirrored, self.flipped))
+            self.moves.append(self.canonical(command[0]))
+        return command
+
+    def canonical(self, command):
+        parts = command.split()
+        if parts[0] == 'MOVE':
+            x, y = llq.frame_point(int(parts[1]), int(parts[2]), self.mirrored, self.flipped)
+            return 'M {0} {1}'.format(x, y)
+        elif parts[0] == 'BUILD':
+            site_id = int(parts[1])
+            x, y = llq.frame_point(self.strategy.site_x[site_id], self.strategy.site_y[site_id],
+                                   self.mirrored, self.flipped)
+            return 'B {0} {1} {2}'.format(x, y, parts[2])
+        return 'W'
+
+
+class PerturbedStrategy:
+    def __init__(self, strategy, rng, rate, turns, sites=4):
+        self.strategy = strategy
+        self.rng = rng
+        self.rate = rate
+        self.turns = turns
+        self.sites = sites
+
+    def __getattr__(self, name):
+        return getattr(self.strategy, name)
+
+    def turn(self, queen_status, site_lines, unit_lines):
+        command = self.strategy.turn(queen_status, site_lines, unit_lines)
+        strategy = self.strategy
+        if strategy.current_turn > self.turns or self.rng.random() >= self.rate:
+            return command
+        queen = strategy.own_side.queen
+        table = strategy.site_table
+        sites = [i for i in strategy.site_coords
+                 if not (table.structure_type[i] == llq.TOWER and table.owner[i] == llq.ENEMY)]
+        sites = sorted(sites, key=lambda i: (strategy.site_x[i]-queen.x)**2+(strategy.site_y[i]-queen.y)**2)
+        if not sites:
+            return command
+        site_id = self.rng.choice(sites[0:self.sites])
+        kind = self.rng.choice(['MINE', 'TOWER', 'BARRACKS-KNIGHT'])
+        return ['BUILD {0} {1}'.format(site_id, kind), command[1]]
+
+
+def perturb_map(game_map, rng, jitter):
+    # a map the book lookup would still match: every site pair moves by up to jitter,
+    # gold, mine sizes and queen hp are redrawn, the queen start stays
+    sites = []
+    placed = []
+    for site in game_map.sites[0::2]:
+        x = site.x+rng.randint(-jitter, jitter)
+        y = site.y+rng.randint(-jitter, jitter)
+        fits = (site.radius <= x <= referee.FIELD_WIDTH-site.radius
+                and site.radius <= y <= referee.FIELD_HEIGHT-site.radius)
+        for ox, oy, oradius in placed+[(referee.FIELD_WIDTH-x, referee.FIELD_HEIGHT-y, site.radius)]:
+            if referee.distance(x, y, ox, oy) < site.radius+oradius:
+                fits = False
+        if not fits:
+            x, y = site.x, site.y
+        placed.extend([(x, y, site.radius), (referee.FIELD_WIDTH-x, referee.FIELD_HEIGHT-y, site.radius)])
+        gold = rng.randint(*referee.SITE_GOLD_RANGE)
+        max_mine_size = rng.randint(*referee.SITE_MINE_SIZE_RANGE)
+        d = referee.distance(x, y, referee.FIELD_WIDTH/2, referee.FIELD_HEIGHT/2)
+        if d < referee.SITE_BONUS_DISTANCE_1:
+            gold += referee.SITE_GOLD_BONUS
+            max_mine_size += 1
+        if d < referee.SITE_BONUS_DISTANCE_2:
+            gold += referee.SITE_GOLD_BONUS
+        for px, py in ((x, y), (referee.FIELD_WIDTH-x, referee.FIELD_HEIGHT-y)):
+            sites.append(referee.RefSite(len(sites), px, py, site.radius, gold, max_mine_size))
+    queen_hp = rng.randint(*referee.QUEEN_HP_RANGE)*referee.QUEEN_HP_MULT
+    return referee.GameMap(game_map.seed, sites, game_map.queen_starts, queen_hp)
+
+
+def replay_map(game, seed):
+    # the layout and queens a recorded game was played on; gold and mine sizes the
+    # recording never saw are drawn the way the local referee draws them
+    rng = random.Random('replay {0}'.format(seed))
+    known = {}
+    for turn in game.turns:
+        for line in turn.site_lines:
+            site_id, gold, max_mine_size = (int(v) for v in line.split()[0:3])
+            if gold >= 0 and site_id not in known:
+                known[site_id] = (gold, max_mine_size)
+    coords = {}
+    for line in game.site_lines:
+        site_id, x, y, radius = (int(v) for v in line.split())
+        coords[(x, y)] = site_id
+    sites = []
+    for line in game.site_lines:
+        site_id, x, y, radius = (int(v) for v in line.split())
+        mirror = coords.get((referee.FIELD_WIDTH-x, referee.FIELD_HEIGHT-y))
+        values = known.get(site_id) or known.get(mirror)
+        if values is None:
+            gold = rng.randint(*referee.SITE_GOLD_RANGE)
+            max_mine_size = rng.randint(*referee.SITE_MINE_SIZE_RANGE)
+            d = referee.distance(x, y, referee.FIELD_WIDTH/2, referee.FIELD_HEIGHT/2)
+            if d < referee.SITE_BONUS_DISTANCE_1:
+                gold += referee.SITE_GOLD_BONUS
+                max_mine_size += 1
+            if d < referee.SITE_BONUS_DISTANCE_2:
+                gold += referee.SITE_GOLD_BONUS
+            values = (gold, max_mine_size)
+            known[site_id] = values
+        sites.append(referee.RefSite(site_id, x, y, radius, *values))
+    queens = {}
+    for line in game.turns[0].unit_lines:
+        x, y, owner, unit_type, hp = (int(v) for v in line.split())
+        if unit_type == llq.QUEEN:
+            queens[owner] = (x, y, hp)
+    queen_starts = (queens[llq.FRIENDLY_UNIT][0:2], queens[llq.ENEMY_UNIT][0:2])
+    return referee.GameMap(seed, sites, queen_starts, queens[llq.FRIENDLY_UNIT][2])
+
+
+def map_layout(game_map):
+    return llq.layout_key((s.x, s.y, s.radius) for s in game_map.sites)
+
+
+def record_line(factory, seed, layout, flipped, turns, max_turns, game_map=None):
+    recorders = []
+
+    def make(num_sites, site_lines):
+        recorder = OpeningRecorder(factory(num_sites, site_lines), flipped, turns)
+        recorders.append(recorder)
+        return recorder
+    referee.play_game((make, llq.Strategy), seed, max_turns, game_map=game_map)
+    recorder = recorders[0]
+    return {'key': [list(site) for site in layout], 'moves': recorder.moves, 'queen': recorder.queen}
+
+
+def evaluate_line(entry, seed, max_turns, game_map=None):
+    book = llq.OpeningBook(entries=[dict(entry)])
+
+    def player(num_sites, site_lines):
+        return llq.Strategy(num_sites, site_lines, opening_book=book)
+    score = 0.0
+    hp = 0
+    for swapped in (False, True):
+        if swapped:
+            result = referee.play_game((llq.Strategy, player), seed, max_turns, game_map=game_map).swapped()
+        else:
+            result = referee.play_game((player, llq.Strategy), seed, max_turns, game_map=game_map)
+        score += 1.0 if result.winner == 0 else 0.5 if result.winner == -1 else 0.0
+        hp += result.queen_hp[0]-result.queen_hp[1]
+    return score, hp
+
+
+def search_map(game_map, seed, candidates, rate, turns, max_turns):
+    layout, flipped = map_layout(game_map)
+    rng = random.Random(seed)
+    baseline = None
+    best = None
+    for n in range(candidates+1):
+        if n == 0:
+            factory = llq.Strategy
+        else:
+            def factory(num_sites, site_lines, seed=rng.random()):
+                return PerturbedStrategy(llq.Strategy(num_sites, site_lines), random.Random(seed), rate, turns)
+        entry = record_line(factory, seed, layout, flipped, turns, max_turns, game_map)
+        value = evaluate_line(entry, seed, max_turns, game_map)
+        if baseline is None:
+            baseline = value
+            baseline_entry = entry
+        if best is None or value > best[0]:
+            best = (value, entry)
+    return baseline, baseline_entry, best[0], best[1]
+
+
+def holdout_score(entry, game_map, seed, maps, jitter, max_turns):
+    # the search map itself is not counted: a line is only worth keeping if it also
+    # wins on the nearby layouts the lookup will hand it on unseen maps
+    rng = random.Random('holdout {0}'.format(seed))
+    score = 0.0
+    for _ in range(maps):
+        score += evaluate_line(entry, seed, max_turns, perturb_map(game_map, rng, jitter))[0]
+    return score
+
+
+def encode_book(entries):
+    data = json.dumps(entries, separators=(',', ':')).encode()
+    return base64.b64encode(zlib.compress(data, 9)).decode()
+
+
+def write_book(path, blob, width=96):
+    with open(path) as f:
+        source = f.read()
+    chunks = ''.join("    '{0}'\n".format(blob[i:i+width]) for i in range(0, len(blob), width)) or "    ''\n"
+    source, count = re.subn(r"^OPENING_BOOK = \(\n.*?^\)\n", 'OPENING_BOOK = (\n'+chunks+')\n',
+                            source, count=1, flags=re.M | re.S)
+    if count != 1:
+        raise ValueError('{0}: OPENING_BOOK block not found'.format(path))
+    with open(path, 'w') as f:
+        f.write(source)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Search opening lines on recorded layouts and embed them in llq.py')
+    parser.add_argument('replays', nargs='*', help='recorded games (llq.py --record) whose layouts the book is built for')
+    parser.add_argument('--maps', type=int, default=16, help='local referee maps searched when no replays are given')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--candidates', type=int, default=8, help='perturbed openings tried per map')
+    parser.add_argument('--rate', type=float, default=0.1, help='chance to replace a queen command while searching')
+    parser.add_argument('--turns', type=int, default=llq.BOOK_TURNS)
+    parser.add_argument('--holdout', type=int, default=8, help='perturbed maps a line must also win on')
+    parser.add_argument('--jitter', type=int, default=15, help='largest site move of a perturbed map')
+    parser.add_argument('--max-turns', type=int, default=referee.MAX_TURNS)
+    parser.add_argument('--replace', action='store_true', help='drop the entries already in the book')
+    parser.add_argument('--write', default=None, help='llq.py to write the book into')
+    args = parser.parse_args(argv)
+    if args.write and not args.replays:
+        # the local generator's layouts never come up in real games, a book built on them is never looked up
+        parser.error('--write needs recorded games to build the book from')
+
+    if args.replays:
+        maps = {}
+        for path in args.replays:
+            game_map = replay_map(replay.load_replay(path), len(maps))
+            maps.setdefault(map_layout(game_map)[0], game_map)
+        maps = list(maps.values())
+    else:
+        maps = [referee.generate_map(seed) for seed in range(args.seed, args.seed+args.maps)]
+
+    book = llq.OpeningBook(llq.OPENING_BOOK)
+    book.decode()
+    entries = {} if args.replace else {entry['key']: entry for entry in book.entries}
+    start = time.time()
+    for game_map in maps:
+        seed = game_map.seed
+        baseline, default_entry, value, entry = search_map(game_map, seed, args.candidates, args.rate, args.turns,
+                                                          args.max_turns)
+        kept = value > baseline
+        held = default_held = 0.0
+        if kept:
+            held = holdout_score(entry, game_map, seed, args.holdout, args.jitter, args.max_turns)
+            default_held = holdout_score(default_entry, game_map, seed, args.holdout, args.jitter, args.max_turns)
+            # two games per map: the line has to beat the default opening there and win the majority
+            kept = held > default_held and held > args.holdout
+        if kept:
+            entries[tuple(tuple(site) for site in entry['key'])] = entry
+        print('seed {0} sites {1} default {2[0]:.1f}/{2[1]} best {3[0]:.1f}/{3[1]} held out {4:.1f}/{5:.1f} {6}'.format(
+            seed, 2*len(entry['key']), baseline, value, held, default_held, 'kept' if kept else '-'),
+            file=sys.stderr)
+    for entry in entries.values():
+        entry['key'] = [list(site) for site in entry['key']]
+    blob = encode_book(list(entries.values()))
+    print('entries {0} blob {1} bytes elapsed {2:.1f}s'.format(len(entries), len(blob), time.time()-start))
+    if args.write:
+        write_book(args.write, blob)
+
+
+if __name__ == '__main__':
+    main()
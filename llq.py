@@ -1,5 +1,17 @@
+import os
 import sys
 import math
+import heapq
+import bisect
+import time
+import zlib
+import base64
+import json
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 FIELD_WIDTH = 1920
 FIELD_HEIGHT = 1000
@@ -54,136 +66,532 @@ KNIGHT = 0
 ARCHER = 1
 GIANT = 2
 
+TURN_BUDGET = 0.05
+FIRST_TURN_BUDGET = 1.0
+BUDGET_RESERVE = 0.01
+
+# name, default, lowest, highest; tune.py writes tuned defaults back here
+PARAM_SPACE = [
+    ('debut_turns', 40, 10, 80),
+    ('debut_low_hp', 30, 10, 60),
+    ('debut_income', 6, 2, 15),
+    ('defend_hp', 50, 20, 90),
+    ('queen_far', 600, 300, 1000),
+    ('queen_close', 300, 100, 600),
+    ('tower_hp_enough', 300, 100, 700),
+    ('emergency_tower_hp', 400, 100, 800),
+    ('enough_towers', 4, 1, 8),
+    ('bold_eta', 2, 0, 6),
+    ('defensive_offset', 60, 0, 120),
+    ('barracks_eta_margin', 6, 0, 12),
+    ('far_packs', 1, 1, 3),
+    ('near_packs', 1, 1, 3),
+]
+
+GRID_CELL = 160
+
+SITE_FIELDS = 7
+UNIT_FIELDS = 5
+READ_CHUNK = 1 << 16
+
+BOOK_TURNS = 40
+BOOK_MAX_DISTANCE = 40
+BOOK_SITE_TOLERANCE = 40
+BOOK_QUEEN_TOLERANCE = 30
+
+# written by book.py
+OPENING_BOOK = (
+    ''
+)
+
+REPLAY_HEADER = '# llq replay'
+REPLAY_VERSION = 2
+# header words after the version: how the recorded Strategy was built
+REPLAY_BOOK = 'book'
+
+PROFILE_PHASES = ['parse', 'analyze', 'danger', 'decision', 'search', 'train', 'total']
+
+TOUCH_DISTANCE = 5
+TOWER_MELT_RATE = 4
+KNIGHT_R = 20
+KNIGHT_DAMAGE = 1
+ARCHER_R = 25
+ARCHER_DAMAGE = 2
+ARCHER_DAMAGE_TO_GIANTS = 10
+ARCHER_RANGE = 200
+GIANT_R = 40
+GIANT_BUST_RATE = 80
+TOWER_CREEP_DAMAGE_MIN = 3
+TOWER_QUEEN_DAMAGE_MIN = 1
+TOWER_DAMAGE_CLIMB_DISTANCE = 200
+
+CREEP_HORIZON = 10
+CREEP_STAY_PROBABILITY = 0.9
+
+ECONOMY_HORIZON = 30
+
+SCHEDULE_HORIZON = 30
+SCHEDULE_GIANT_TOWERS = 4
+SCHEDULE_ARCHER_KNIGHTS = 4
+
+HISTORY_TURNS = 32
+HISTORY_CHANGES = 64
+HISTORY_WAVES = 8
+INTENT_QUEEN_TURNS = 4
+INTENT_RUSH_INTERVAL = 15
+
+PATH_NODES = 8
+PATH_TOWER_COST = 2.0
+
+# below this many candidates a full sort beats heap selection
+TOP_K_SORT = 100
+
+EVAL_HORIZON = 50
+EVAL_TOWER_HP = TOWER_START_HP+TOWER_UP_PER_TURN
+EVAL_COVER_VALUE = 40
+EVAL_PACK_VALUE = 400
+EVAL_ETA_COST = 15
+
+LOOKAHEAD_BUDGET = 0.02
+LOOKAHEAD_BEAM = 4
+LOOKAHEAD_MIN_DEPTH = 2
+LOOKAHEAD_MAX_DEPTH = 16
+LOOKAHEAD_SITES = 4
+LOOKAHEAD_MARGIN = 800
+# a simulated queen turtles up once enemy knights are this close
+SIM_THREAT_DISTANCE = 300
+
+# evaluation weights, in gold
+QUEEN_HP_VALUE = 20
+INCOME_VALUE = 40
+TOWER_HP_VALUE = 0.05
+BARRACKS_VALUE = 60
+ENEMY_STRUCTURE_VALUE = 30
+KNIGHT_HP_VALUE = 2
+
 
 class FireCondition:
+    __slots__ = ('site_id', 'needed_hp')
+
     def __init__(self, site_id, needed_hp):
         self.site_id = site_id
         self.needed_hp = needed_hp
 
 class Site:
+    __slots__ = ('x', 'y', 'radius', 'site_id', 'can_fire_upon', 'fire_thresholds', 'fire_targets')
+
     def __init__(self, x, y, radius, site_id):
         self.x = x
         self.y = y
         self.radius = radius
         self.site_id = site_id
         self.can_fire_upon = []
+        self.fire_thresholds = []
+        self.fire_targets = []
 
-    def calculate_can_fire_upon(self, site_coords, distance_func):
-        for key, value in site_coords.items():
-            hp_to_fire_upon = self.need_hp_to_fire_upon(value, distance_func)
+    def calculate_can_fire_upon(self, site_coords, distances):
+        for key in site_coords.keys():
+            hp_to_fire_upon = self.need_hp_to_fire_upon(distances[key])
             if hp_to_fire_upon <= TOWER_MAX_HP:
                 self.can_fire_upon.append(FireCondition(key, hp_to_fire_upon))
         self.can_fire_upon = sorted(self.can_fire_upon, key=lambda x: x.needed_hp)
+        self.fire_thresholds = [c.needed_hp for c in self.can_fire_upon]
+        self.fire_targets = [c.site_id for c in self.can_fire_upon]
 
-    def need_hp_to_fire_upon(self, site, distance_func):
-        need_r = distance_func(self.x, self.y, site.x, site.y)
+    def need_hp_to_fire_upon(self, need_r):
         need_hp = math.pi*(need_r**2-self.radius**2)/1000.0
         return need_hp
 
+    def firing_count(self, hp):
+        return bisect.bisect_right(self.fire_thresholds, hp)
+
     def currently_firing_at(self, hp):
-        result = []
-        for condition in self.can_fire_upon:
-            if condition.needed_hp <= hp:
-                result.append(condition.site_id)
-        return result
+        return self.fire_targets[:self.firing_count(hp)]
+
+class CoverageIndex:
+
+    def __init__(self, site_coords):
+        self.site_coords = site_coords
+        self.tower_owner = {}
+        self.tower_hp = {}
+        self.tower_count = {}
+        self.covering = ({}, {})
+
+    def set_tower(self, site_id, owner, hp):
+        if self.tower_owner.get(site_id, owner) != owner:
+            self.remove_tower(site_id)
+        site = self.site_coords[site_id]
+        old = self.tower_count.get(site_id, 0)
+        new = site.firing_count(hp)
+        covering = self.covering[owner]
+        for target in site.fire_targets[old:new]:
+            covering.setdefault(target, set()).add(site_id)
+        for target in site.fire_targets[new:old]:
+            covering[target].discard(site_id)
+        self.tower_owner[site_id] = owner
+        self.tower_hp[site_id] = hp
+        self.tower_count[site_id] = new
+
+    def remove_tower(self, site_id):
+        owner = self.tower_owner.pop(site_id, None)
+        if owner is None:
+            return
+        covering = self.covering[owner]
+        for target in self.site_coords[site_id].fire_targets[:self.tower_count.pop(site_id)]:
+            covering[target].discard(site_id)
+        del self.tower_hp[site_id]
+
+    def covered(self, site_id):
+        return self.site_coords[site_id].fire_targets[:self.tower_count.get(site_id, 0)]
+
+    def covered_by_owner(self, site_id, owner):
+        return len(self.covering[owner].get(site_id, ())) > 0
+
+    def hypothetical(self, site_id, hp):
+        return self.site_coords[site_id].currently_firing_at(hp)
+
+class SiteTable:
+    __slots__ = ('size', 'x', 'y', 'radius', 'gold', 'max_mine_size', 'structure_type', 'owner',
+                 'param_1', 'param_2', 'own_eta', 'enemy_eta', 'enemy_base_distance')
+
+    def __init__(self, size):
+        self.size = size
+        self.x = [0]*size
+        self.y = [0]*size
+        self.radius = [0]*size
+        self.gold = [-1]*size
+        self.max_mine_size = [-1]*size
+        self.structure_type = [NO_STRUCTURE]*size
+        self.owner = [NO_OWNER]*size
+        self.param_1 = [-1]*size
+        self.param_2 = [-1]*size
+        self.own_eta = [-1]*size
+        self.enemy_eta = [-1]*size
+        self.enemy_base_distance = [0]*size
+
+class UnitTable:
+    __slots__ = ('count', 'x', 'y', 'owner', 'unit_type', 'hp', 'views')
+
+    def __init__(self, capacity=32):
+        self.count = 0
+        self.x = []
+        self.y = []
+        self.owner = []
+        self.unit_type = []
+        self.hp = []
+        self.views = []
+        self.grow(capacity)
+
+    def grow(self, capacity):
+        extra = capacity-len(self.views)
+        self.x.extend([0]*extra)
+        self.y.extend([0]*extra)
+        self.owner.extend([0]*extra)
+        self.unit_type.extend([0]*extra)
+        self.hp.extend([0]*extra)
+        self.views.extend(Unit(self, slot) for slot in range(len(self.views), capacity))
+
+    def clear(self):
+        self.count = 0
+
+    def add(self, x, y, owner, unit_type, hp):
+        slot = self.count
+        if slot == len(self.views):
+            self.grow(2*slot)
+        self.x[slot] = x
+        self.y[slot] = y
+        self.owner[slot] = owner
+        self.unit_type[slot] = unit_type
+        self.hp[slot] = hp
+        self.count = slot+1
+        return self.views[slot]
+
+class Params:
+
+    def __init__(self, **overrides):
+        for name, default, _, _ in PARAM_SPACE:
+            setattr(self, name, default)
+        for name, value in overrides.items():
+            if not hasattr(self, name):
+                raise TypeError('unknown parameter {0}'.format(name))
+            setattr(self, name, value)
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name, _, _, _ in PARAM_SPACE}
+
+class UnitGrid:
+    __slots__ = ('cell', 'cols', 'rows', 'cells', 'used', 'units')
+
+    def __init__(self, units, cell=GRID_CELL):
+        self.units = units
+        self.cell = cell
+        self.cols = FIELD_WIDTH//cell+1
+        self.rows = FIELD_HEIGHT//cell+1
+        self.cells = tuple([[] for _ in range(self.cols*self.rows)] for owner in (FRIENDLY_UNIT, ENEMY_UNIT))
+        self.used = ([], [])
+
+    def col(self, x):
+        return min(max(int(x//self.cell), 0), self.cols-1)
+
+    def row(self, y):
+        return min(max(int(y//self.cell), 0), self.rows-1)
+
+    def rebuild(self):
+        for cells, used in zip(self.cells, self.used):
+            for index in used:
+                cells[index].clear()
+            used.clear()
+        units = self.units
+        for slot in range(units.count):
+            if units.unit_type[slot] == QUEEN:
+                continue
+            owner = units.owner[slot]
+            index = self.row(units.y[slot])*self.cols+self.col(units.x[slot])
+            bucket = self.cells[owner][index]
+            if not bucket:
+                self.used[owner].append(index)
+            bucket.append(slot)
+
+    def slots_within(self, x, y, radius, owner, unit_type=None):
+        units = self.units
+        cells = self.cells[owner]
+        radius_2 = radius*radius
+        col_from = self.col(x-radius)
+        col_to = self.col(x+radius)
+        for row in range(self.row(y-radius), self.row(y+radius)+1):
+            base = row*self.cols
+            for index in range(base+col_from, base+col_to+1):
+                for slot in cells[index]:
+                    if unit_type is not None and units.unit_type[slot] != unit_type:
+                        continue
+                    dx = units.x[slot]-x
+                    dy = units.y[slot]-y
+                    if dx*dx+dy*dy < radius_2:
+                        yield slot
+
+    def any_within(self, x, y, radius, owner, unit_type=None):
+        for _ in self.slots_within(x, y, radius, owner, unit_type):
+            return True
+        return False
+
+def table_column(name, index='site_id'):
+    def get(self):
+        return getattr(self.table, name)[getattr(self, index)]
+    def set(self, value):
+        getattr(self.table, name)[getattr(self, index)] = value
+    return property(get, set)
 
 class SiteStatus:
-    def __init__(self, gold, max_mine_size, structure_type, owner, param_1, param_2):
-        self.gold = gold
-        self.max_mine_size = max_mine_size
-        self.structure_type = structure_type
-        self.owner = owner
-        self.param_1 = param_1
-        self.param_2 = param_2
+    __slots__ = ('table', 'site_id')
+
+    def __init__(self, table, site_id):
+        self.table = table
+        self.site_id = site_id
+
+    gold = table_column('gold')
+    max_mine_size = table_column('max_mine_size')
+    structure_type = table_column('structure_type')
+    owner = table_column('owner')
+    param_1 = table_column('param_1')
+    param_2 = table_column('param_2')
+
+    def same_structure(self, structure_type, owner, param_2):
+        if self.structure_type != structure_type or self.owner != owner:
+            return False
+        return structure_type != BARRACKS or self.param_2 == param_2
+
+class StructureChange:
+    __slots__ = ('turn', 'site_id', 'old_type', 'old_owner', 'new_type', 'new_owner')
+
+    def __init__(self, turn, site_id, old_type, old_owner, new_type, new_owner):
+        self.turn = turn
+        self.site_id = site_id
+        self.old_type = old_type
+        self.old_owner = old_owner
+        self.new_type = new_type
+        self.new_owner = new_owner
+
+class RingBuffer:
+    __slots__ = ('items', 'start', 'count')
+
+    def __init__(self, size):
+        self.items = [None]*size
+        self.start = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        # 0 is the oldest item still kept, -1 the newest
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return self.items[(self.start+i) % len(self.items)]
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self.items[(self.start+i) % len(self.items)]
+
+    def append(self, item):
+        size = len(self.items)
+        if self.count < size:
+            self.items[(self.start+self.count) % size] = item
+            self.count += 1
+        else:
+            self.items[self.start] = item
+            self.start = (self.start+1) % size
+
+    def newest(self, n):
+        for i in range(1, min(n, self.count)+1):
+            yield self[-i]
 
 class Unit:
-    def __init__(self, x, y, owner, unit_type, hp):
-        self.x = x
-        self.y = y
-        self.owner = owner
-        self.unit_type = unit_type
-        self.hp = hp
+    __slots__ = ('table', 'slot')
+
+    def __init__(self, table, slot):
+        self.table = table
+        self.slot = slot
+
+    x = table_column('x', 'slot')
+    y = table_column('y', 'slot')
+    owner = table_column('owner', 'slot')
+    unit_type = table_column('unit_type', 'slot')
+    hp = table_column('hp', 'slot')
 
 class Tower:
-    def __init__(self, site_id, hp, attack_radius, owner):
+    __slots__ = ('table', 'site_id')
+
+    def __init__(self, table, site_id):
+        self.table = table
         self.site_id = site_id
-        self.hp = hp
-        self.attack_radius = attack_radius
-        self.owner = owner
+
+    hp = table_column('param_1')
+    attack_radius = table_column('param_2')
+    owner = table_column('owner')
 
 class Barrack:
-    def __init__(self, site_id, build_progress, creep_type, owner):
+    __slots__ = ('table', 'site_id')
+
+    def __init__(self, table, site_id):
+        self.table = table
         self.site_id = site_id
-        self.build_progress = build_progress
-        self.creep_type = creep_type
-        self.owner = owner
+
+    build_progress = table_column('param_1')
+    creep_type = table_column('param_2')
+    owner = table_column('owner')
 
 class Mine:
-    def __init__(self, site_id, gold, max_size, income, owner):
+    __slots__ = ('table', 'site_id')
+
+    def __init__(self, table, site_id):
+        self.table = table
         self.site_id = site_id
-        self.gold = gold
-        self.max_size = max_size
-        self.income = income
-        self.owner = owner
+
+    gold = table_column('gold')
+    max_size = table_column('max_mine_size')
+    income = table_column('param_1')
+    owner = table_column('owner')
 
 class FreeSite:
+    __slots__ = ('site_id',)
+
     def __init__(self, site_id):
         self.site_id = site_id
 
 class Side:
 
     def clear(self):
-        self.queen = None
         self.mines = {}
         self.knight_barracks = {}
         self.archer_barracks = {}
         self.giant_barracks = {}
+        self.barracks = {}
+        self.towers = {}
+        self.building_x = 0
+        self.building_y = 0
+        self.building_weight = 0
+        self.clear_units()
+
+    def clear_units(self):
+        self.queen = None
         self.archers = []
         self.knights = []
         self.giants = []
-        self.towers = {}
 
-    def __init__(self, owner):
+    def __init__(self, owner, sites, units):
+        self.sites = sites
+        self.units = units
         self.clear()
         self.owner = owner
         self.owned_gold = 0
         self.touched_site = -1
 
+    def set_structure(self, site_id, structure_type, param_1, param_2):
+        self.sites.structure_type[site_id] = structure_type
+        self.sites.owner[site_id] = self.owner
+        self.sites.param_1[site_id] = param_1
+        self.sites.param_2[site_id] = param_2
+
+    def track_building(self, site_id, weight):
+        self.building_x += weight*self.sites.x[site_id]
+        self.building_y += weight*self.sites.y[site_id]
+        self.building_weight += weight
+
+    def building_centroid(self):
+        # archer and giant barracks are in two of the dicts and have always counted twice
+        if self.building_weight == 0:
+            return None
+        return self.building_x/self.building_weight, self.building_y/self.building_weight
+
     def add_mine(self, site_id, gold, max_size, income):
-        self.mines[site_id] = Mine(
-                    site_id,
-                    gold,
-                    max_size,
-                    income,
-                    self.owner)
+        self.set_structure(site_id, GOLDMINE, income, -1)
+        self.sites.gold[site_id] = gold
+        self.sites.max_mine_size[site_id] = max_size
+        self.mines[site_id] = Mine(self.sites, site_id)
+        self.track_building(site_id, 1)
 
     def add_tower(self, site_id, hp, attack_radius):
-        self.towers[site_id] = Tower(
-                    site_id,
-                    hp,
-                    attack_radius,
-                    self.owner)
+        self.set_structure(site_id, TOWER, hp, attack_radius)
+        self.towers[site_id] = Tower(self.sites, site_id)
+        self.track_building(site_id, 1)
 
     def add_barracks(self, site_id, build_progress, creep_type):
-        barracks = Barrack(site_id, build_progress, creep_type, self.owner)
+        self.set_structure(site_id, BARRACKS, build_progress, creep_type)
+        barracks = Barrack(self.sites, site_id)
+        self.barracks[site_id] = barracks
         if creep_type == KNIGHT_BARRACKS:
             self.knight_barracks[site_id] = barracks
         elif creep_type == ARCHER_BARRACKS:
             self.archer_barracks[site_id] = barracks
         elif creep_type == GIANT_BARRACKS:
             self.giant_barracks[site_id] = barracks
+        self.track_building(site_id, 1+(site_id in self.archer_barracks)+(site_id in self.giant_barracks))
+
+    def remove_structure(self, site_id):
+        weight = sum(site_id in d for d in (self.mines, self.towers, self.barracks,
+                                            self.archer_barracks, self.giant_barracks))
+        if weight:
+            self.track_building(site_id, -weight)
+        self.mines.pop(site_id, None)
+        self.towers.pop(site_id, None)
+        self.barracks.pop(site_id, None)
+        self.knight_barracks.pop(site_id, None)
+        self.archer_barracks.pop(site_id, None)
+        self.giant_barracks.pop(site_id, None)
 
     def set_queen(self, x, y, hp):
-        self.queen = Unit(x, y, self.owner, QUEEN, hp)
+        self.queen = self.units.add(x, y, self.owner, QUEEN, hp)
 
     def add_knight(self, x, y, hp):
-        self.knights.append(Unit(x, y, self.owner, KNIGHT, hp))
+        self.knights.append(self.units.add(x, y, self.owner, KNIGHT, hp))
 
     def add_archer(self, x, y, hp):
-        self.archers.append(Unit(x, y, self.owner, ARCHER, hp))
+        self.archers.append(self.units.add(x, y, self.owner, ARCHER, hp))
 
     def add_giant(self, x, y, hp):
-        self.giants.append(Unit(x, y, self.owner, GIANT, hp))
+        self.giants.append(self.units.add(x, y, self.owner, GIANT, hp))
 
 class SiteType:
     EMPTY = 0
@@ -195,76 +603,1821 @@ class SiteType:
     OWN_MINE = 6
 
 
+class SiteAnalysis:
+    # analyze_sites only records the turn's inputs and bumps the stamp. The eta and base
+    # distance columns are a list comprehension each, filled whole on their first read;
+    # the fire data is worked out per AnalyzedSite, so filtered out sites never pay for it
+
+    def __init__(self, strategy):
+        self.strategy = strategy
+        self.table = strategy.site_table
+        self.stamp = 0
+        self.eta_stamp = -1
+        self.base_stamp = -1
+        self.own_x = self.own_y = 0
+        self.enemy_x = self.enemy_y = 0
+        self.base_x = self.base_y = 0
+        self.tower_order = {}
+        self.suppressed = {}
+        self.covering = strategy.coverage.covering[ENEMY]
+
+    def begin(self):
+        strategy = self.strategy
+        me = strategy.own_side
+        enemy = strategy.enemy_side
+        self.stamp += 1
+        self.own_x, self.own_y = me.queen.x, me.queen.y
+        self.enemy_x, self.enemy_y = enemy.queen.x, enemy.queen.y
+        self.base_x, self.base_y = strategy.enemy_x, strategy.enemy_y
+        self.tower_order = {site_id: i for i, site_id in enumerate(sorted(enemy.towers))}
+        self.suppressed = {}
+
+    def filled(self, views):
+        # the numpy engine writes every field itself
+        for view in views:
+            view.fire_stamp = self.stamp
+        self.eta_stamp = self.base_stamp = self.stamp
+
+    def etas_filled(self):
+        self.eta_stamp = self.stamp
+
+    def etas(self):
+        strategy = self.strategy
+        self.table.own_eta = strategy.queen_etas(strategy.distances_from(self.own_x, self.own_y))
+        self.table.enemy_eta = strategy.queen_etas(strategy.distances_from(self.enemy_x, self.enemy_y))
+        self.eta_stamp = self.stamp
+
+    def base_distances(self):
+        self.table.enemy_base_distance = self.strategy.distances_from(self.base_x, self.base_y)
+        self.base_stamp = self.stamp
+
+    def tower_suppressed(self, site_id):
+        suppressed = self.suppressed.get(site_id)
+        if suppressed is None:
+            strategy = self.strategy
+            suppressed = strategy.tower_suppressed(strategy.enemy_side.towers[site_id])
+            self.suppressed[site_id] = suppressed
+        return suppressed
+
+    def fire(self, view):
+        # matches the old eager pass over enemy.towers in site id order: a tower's own flag
+        # was overwritten when its turn came, so only towers after it still count
+        site_id = view.site_id
+        order = self.tower_order
+        view.fire_stamp = self.stamp
+        covering = self.covering.get(site_id)
+        if not covering and site_id not in order:
+            view.firing_towers = []
+            view.towers_suppressed = True
+            return
+        towers = sorted((t for t in covering or () if t in order), key=order.get)
+        if site_id in order:
+            view.firing_towers = [site_id]
+            towers = [site_id]+[t for t in towers if order[t] > order[site_id]]
+        else:
+            view.firing_towers = towers
+        view.towers_suppressed = all(self.tower_suppressed(t) for t in towers)
+
 class AnalyzedSite():
+    __slots__ = ('analysis', 'table', 'site_id', 'site_type', 'enemy_knights_eta', 'gold_remain',
+                 'mine_value', 'barrack_value', 'tower_value', 'fire_stamp', 'firing_towers', 'towers_suppressed')
 
-    def __init__(self, site_id, site_type):
+    def __init__(self, analysis, site_id, site_type):
+        self.analysis = analysis
+        self.table = analysis.table
         self.site_id = site_id
+        self.fire_stamp = -1
+        self.reset(site_type)
+
+    def reset(self, site_type):
         self.site_type = site_type
-        self.own_eta = -1
-        self.enemy_eta = -1
-        self.under_fire = []
-        self.fire_suppressed = True
-        self.enemy_base_distance = 0
+        self.firing_towers = []
+        self.towers_suppressed = True
         self.enemy_knights_eta = -1
         self.gold_remain = -1
         self.mine_value = 0
         self.barrack_value = 0
         self.tower_value = 0
 
+    @property
+    def under_fire(self):
+        if self.fire_stamp != self.analysis.stamp:
+            self.analysis.fire(self)
+        return self.firing_towers
+
+    @under_fire.setter
+    def under_fire(self, value):
+        self.firing_towers = value
+
+    @property
+    def fire_suppressed(self):
+        if self.fire_stamp != self.analysis.stamp:
+            self.analysis.fire(self)
+        return self.towers_suppressed
+
+    @fire_suppressed.setter
+    def fire_suppressed(self, value):
+        self.towers_suppressed = value
+
+    @property
+    def own_eta(self):
+        analysis = self.analysis
+        if analysis.eta_stamp != analysis.stamp:
+            analysis.etas()
+        return self.table.own_eta[self.site_id]
+
+    @property
+    def enemy_eta(self):
+        analysis = self.analysis
+        if analysis.eta_stamp != analysis.stamp:
+            analysis.etas()
+        return self.table.enemy_eta[self.site_id]
+
+    @property
+    def enemy_base_distance(self):
+        analysis = self.analysis
+        if analysis.base_stamp != analysis.stamp:
+            analysis.base_distances()
+        return self.table.enemy_base_distance[self.site_id]
+
+class SiteFilter:
+    # a filter is a tuple of predicates that exclude sites, each a bitset over site ids cached
+    # until the next analyze_sites. The cheap ones are built whole from the owned structures;
+    # the partial ones only for the sites still kept when they are asked, so the etas and
+    # lazy fire data of sites an earlier predicate dropped are never looked at
+    PARTIAL = ('eta_behind', 'exposed')
+
+    def __init__(self, strategy):
+        self.strategy = strategy
+        self.stamp = -1
+        self.masks = {}
+        self.known = {}
+        self.sites = None
+        self.sites_mask = 0
+
+    def select(self, sites, predicates):
+        stamp = self.strategy.site_analysis.stamp
+        if self.stamp != stamp:
+            self.stamp = stamp
+            self.masks = {}
+            self.known = {}
+            self.sites = None
+        if sites is not self.sites:
+            # every filter of a turn is handed the same analyzed list
+            keep = 0
+            for site in sites:
+                keep |= 1 << site.site_id
+            self.sites = sites
+            self.sites_mask = keep
+        keep = self.sites_mask
+        for key in predicates:
+            if keep == 0:
+                break
+            keep &= ~self.exclude(key, keep)
+        return [site for site in sites if keep >> site.site_id & 1]
+
+    def exclude(self, key, candidates):
+        mask = self.masks.get(key)
+        if key[0] in self.PARTIAL:
+            known = self.known.get(key, 0)
+            missing = candidates & ~known
+            if missing:
+                mask = (mask or 0) | getattr(self, key[0])(missing, *key[1:])
+                self.masks[key] = mask
+                self.known[key] = known | missing
+        elif mask is None:
+            mask = getattr(self, key[0])(*key[1:])
+            self.masks[key] = mask
+        return mask & candidates
+
+    def eta_behind(self, missing, margin):
+        analysis = self.strategy.site_analysis
+        if analysis.eta_stamp != analysis.stamp:
+            analysis.etas()
+        table = self.strategy.site_table
+        own_eta = table.own_eta
+        enemy_eta = table.enemy_eta
+        mask = 0
+        while missing:
+            low = missing & -missing
+            missing ^= low
+            site_id = low.bit_length()-1
+            if own_eta[site_id] >= enemy_eta[site_id]-margin:
+                mask |= low
+        return mask
+
+    def exposed(self, missing):
+        analysis = self.strategy.site_analysis
+        views = self.strategy.analyzed_views
+        mask = 0
+        while missing:
+            low = missing & -missing
+            missing ^= low
+            site = views[low.bit_length()-1]
+            if site.fire_stamp != analysis.stamp:
+                analysis.fire(site)
+            if site.firing_towers and not site.towers_suppressed:
+                mask |= low
+        return mask
+
+    def site_type(self, site_type):
+        return self.strategy.site_type_masks.get(site_type, 0)
+
+    def mine_full(self):
+        table = self.strategy.site_table
+        mask = 0
+        for site_id in self.strategy.own_side.mines:
+            if table.max_mine_size[site_id] == table.param_1[site_id]:
+                mask |= 1 << site_id
+        return mask
+
+    def tower_above(self, hp):
+        hp_column = self.strategy.site_table.param_1
+        mask = 0
+        for site_id in self.strategy.own_side.towers:
+            if hp_column[site_id] > hp:
+                mask |= 1 << site_id
+        return mask
+
+    def barracks_training(self):
+        progress = self.strategy.site_table.param_1
+        mask = 0
+        for site_id in self.strategy.own_side.barracks:
+            if progress[site_id] != 0:
+                mask |= 1 << site_id
+        return mask
+
+    def no_gold(self):
+        mask = 0
+        for site_id, gold in self.strategy.for_mining.items():
+            if gold == 0:
+                mask |= 1 << site_id
+        return mask
+
+class SiteEvaluator:
+
+    def __init__(self, strategy):
+        self.strategy = strategy
+        self.tower_targets = {}
+
+    def targets(self, site_id):
+        # what a fresh tower would reach depends only on the geometry
+        targets = self.tower_targets.get(site_id)
+        if targets is None:
+            targets = self.strategy.coverage.hypothetical(site_id, EVAL_TOWER_HP)
+            self.tower_targets[site_id] = targets
+        return targets
+
+    def evaluate(self, analyzed):
+        strategy = self.strategy
+        table = strategy.site_table
+        coverage = strategy.coverage
+        for site in analyzed:
+            site_id = site.site_id
+            exposed = len(site.under_fire) > 0 and not site.fire_suppressed
+            if site.site_type == SiteType.ENEMY_TOWER or exposed:
+                site.mine_value = 0
+                site.tower_value = 0
+                site.barrack_value = 0
+                continue
+            rate = table.max_mine_size[site_id]
+            if site.site_type == SiteType.OWN_MINE:
+                rate -= table.param_1[site_id]
+            gold = strategy.for_mining[site_id]
+            site.gold_remain = gold
+            site.mine_value = max(rate, 0)*EVAL_HORIZON if gold < 0 else min(max(rate, 0)*EVAL_HORIZON, gold)
+            value = 0
+            for target in self.targets(site_id):
+                if coverage.covered_by_owner(target, FRIENDLY):
+                    continue
+                value += EVAL_COVER_VALUE if table.owner[target] == FRIENDLY else EVAL_COVER_VALUE/4
+            site.tower_value = value
+            travel = KNIGHT_TRAIN+site.enemy_base_distance/KNIGHT_SPEED
+            site.barrack_value = EVAL_PACK_VALUE*max(1-travel/EVAL_HORIZON, 0)
+
+    def best(self, targets, value):
+        return max(targets, key=lambda x: value(x)-EVAL_ETA_COST*x.own_eta).site_id
+
+class TurnProfiler:
+
+    def __init__(self, enabled=True, guard=False, trace=None, budget=TURN_BUDGET,
+                 first_budget=FIRST_TURN_BUDGET, reserve=BUDGET_RESERVE):
+        self.enabled = enabled or guard
+        self.guard = guard
+        self.trace = trace
+        self.budget = budget
+        self.first_budget = first_budget
+        self.reserve = reserve
+        self.turns = 0
+        self.guarded = 0
+        self.wall = {phase: [] for phase in PROFILE_PHASES}
+        self.cpu = {phase: [] for phase in PROFILE_PHASES}
+        self.started = False
+
+    def start_turn(self, now=None):
+        if not self.enabled or self.started:
+            return
+        self.started = True
+        self.turn_wall = time.perf_counter() if now is None else now
+        self.turn_cpu = time.process_time()
+        self.phase_wall = self.turn_wall
+        self.phase_cpu = self.turn_cpu
+        self.current = {}
+
+    def mark(self, phase):
+        if not self.enabled:
+            return
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        self.current[phase] = (wall-self.phase_wall, cpu-self.phase_cpu)
+        self.phase_wall = wall
+        self.phase_cpu = cpu
+
+    def near_deadline(self):
+        if not self.guard:
+            return False
+        budget = self.first_budget if self.turns == 0 else self.budget
+        return time.perf_counter()-self.turn_wall > budget-self.reserve
+
+    def end_turn(self, guarded=False):
+        if not self.enabled:
+            return
+        self.current['total'] = (time.perf_counter()-self.turn_wall,
+                                 time.process_time()-self.turn_cpu)
+        for phase, (wall, cpu) in self.current.items():
+            self.wall[phase].append(wall)
+            self.cpu[phase].append(cpu)
+        self.turns += 1
+        self.guarded += guarded
+        self.started = False
+        if self.trace is not None:
+            fields = [str(self.turns), str(int(guarded))]
+            for phase in PROFILE_PHASES:
+                wall, cpu = self.current.get(phase, (0.0, 0.0))
+                fields.append('{0:.0f}/{1:.0f}'.format(wall*1e6, cpu*1e6))
+            print('\t'.join(fields), file=self.trace)
+
+    def merge(self, other):
+        self.turns += other.turns
+        self.guarded += other.guarded
+        for phase in PROFILE_PHASES:
+            self.wall[phase].extend(other.wall[phase])
+            self.cpu[phase].extend(other.cpu[phase])
+
+    def percentiles(self, samples):
+        if len(samples) == 0:
+            return 0.0, 0.0, 0.0
+        ordered = sorted(samples)
+        p50 = ordered[(len(ordered)-1)//2]
+        p99 = ordered[min(len(ordered)-1, int(len(ordered)*0.99))]
+        return p50, p99, ordered[-1]
+
+    def summary(self):
+        lines = ['prof turns {0} guarded {1} ms p50/p99/max wall|cpu'.format(self.turns, self.guarded)]
+        for phase in PROFILE_PHASES:
+            wall = self.percentiles(self.wall[phase])
+            cpu = self.percentiles(self.cpu[phase])
+            lines.append('{0} {1:.2f}/{2:.2f}/{3:.2f}|{4:.2f}/{5:.2f}/{6:.2f}'.format(
+                phase, *[t*1000 for t in wall+cpu]))
+        return '\n'.join(lines)
+
+def value_lines(values, fields):
+    return [' '.join(map(str, values[i:i+fields])) for i in range(0, len(values), fields)]
+
+class TurnReader:
+
+    def __init__(self, fd=0):
+        self.fd = fd
+        self.values = []
+        self.pos = 0
+        self.tail = b''
+        self.gold = 0
+        self.touched_site = -1
+        self.site_values = []
+        self.unit_values = []
+
+    def fill(self, count):
+        while len(self.values)-self.pos < count:
+            chunk = os.read(self.fd, READ_CHUNK)
+            if not chunk:
+                if not self.tail:
+                    raise EOFError
+                chunk = b'\n'
+            data = self.tail+chunk
+            # a number cut by the end of the chunk waits for the next read
+            head = data.rstrip(b'-0123456789')
+            self.tail = data[len(head):]
+            if self.pos:
+                del self.values[:self.pos]
+                self.pos = 0
+            self.values.extend(map(int, head.split()))
+
+    def wait(self):
+        self.fill(1)
+
+    def take(self, count, out):
+        self.fill(count)
+        out[:] = self.values[self.pos:self.pos+count]
+        self.pos += count
+        return out
+
+    def ints(self, count):
+        return self.take(count, [])
+
+    def read_init(self):
+        num_sites = self.ints(1)[0]
+        values = self.ints(num_sites*4)
+        return num_sites, value_lines(values, 4)
+
+    def read_turn(self, num_sites):
+        self.gold, self.touched_site = self.ints(2)
+        self.take(num_sites*SITE_FIELDS, self.site_values)
+        num_units = self.ints(1)[0]
+        self.take(num_units*UNIT_FIELDS, self.unit_values)
+
+class ReplayRecorder:
+
+    def __init__(self, out):
+        self.out = out
+
+    def record_init(self, num_sites, site_lines, options=()):
+        self.out.write(' '.join([REPLAY_HEADER, str(REPLAY_VERSION)]+list(options))+'\n')
+        self.write_input([str(num_sites)]+site_lines)
+
+    def record_values(self, gold, touched_site, site_values, unit_values, command):
+        self.record_turn('{0} {1}'.format(gold, touched_site), value_lines(site_values, SITE_FIELDS),
+                         value_lines(unit_values, UNIT_FIELDS), command)
+
+    def record_turn(self, queen_status, site_lines, unit_lines, command):
+        self.write_input([queen_status]+site_lines+[str(len(unit_lines))]+unit_lines)
+        for line in command:
+            self.out.write('> '+line+'\n')
+        self.out.flush()
+
+    def write_input(self, lines):
+        for line in lines:
+            self.out.write('< '+line+'\n')
+
+    def close(self):
+        self.out.close()
+
+class ArrayAnalysis:
+
+    def __init__(self, strategy):
+        self.strategy = strategy
+        table = strategy.site_table
+        size = table.size
+        self.x = np.array(table.x, dtype=np.int64)
+        self.y = np.array(table.y, dtype=np.int64)
+        self.radius = np.array(table.radius, dtype=np.int64)
+        self.needed_hp = np.full((size, size), np.inf)
+        for site_id, site in strategy.site_coords.items():
+            for condition in site.can_fire_upon:
+                self.needed_hp[site_id, condition.site_id] = condition.needed_hp
+        self.site_type = np.full(size, -1, dtype=np.int64)
+
+    def distances_from(self, x, y):
+        dx = x-self.x
+        dy = y-self.y
+        return np.sqrt(dx*dx+dy*dy)
+
+    def analyze(self, result):
+        strategy = self.strategy
+        table = strategy.site_table
+        me = strategy.own_side
+        enemy = strategy.enemy_side
+        self.site_type[:] = -1
+        for site_id, site in result.items():
+            self.site_type[site_id] = site.site_type
+
+        own_eta = (self.distances_from(me.queen.x, me.queen.y)-self.radius)/QUEEN_SPEED
+        enemy_eta = (self.distances_from(enemy.queen.x, enemy.queen.y)-self.radius)/QUEEN_SPEED
+        table.own_eta = own_eta.tolist()
+        table.enemy_eta = enemy_eta.tolist()
+        table.enemy_base_distance = self.distances_from(strategy.enemy_x, strategy.enemy_y).tolist()
+
+        towers = [enemy.towers[site_id] for site_id in sorted(enemy.towers)]
+        tower_ids = np.fromiter((t.site_id for t in towers), dtype=np.int64, count=len(towers))
+        tower_hp = np.fromiter((t.hp for t in towers), dtype=np.float64, count=len(towers))
+        tower_radius = np.fromiter((t.attack_radius for t in towers), dtype=np.int64, count=len(towers))
+        units = me.knights+me.archers+me.giants
+        unit_x = np.fromiter((u.x for u in units), dtype=np.int64, count=len(units))
+        unit_y = np.fromiter((u.y for u in units), dtype=np.int64, count=len(units))
+        dx = self.x[tower_ids][:, None]-unit_x[None, :]
+        dy = self.y[tower_ids][:, None]-unit_y[None, :]
+        suppressed = (dx*dx+dy*dy < (tower_radius*tower_radius)[:, None]).any(axis=1)
+        firing = self.needed_hp[tower_ids] <= tower_hp[:, None]
+
+        fire_suppressed = np.ones(table.size, dtype=bool)
+        for i, site_id in enumerate(tower_ids.tolist()):
+            covered = np.flatnonzero(firing[i])
+            fire_suppressed[site_id] = suppressed[i]
+            fire_suppressed[covered] &= suppressed[i]
+            for fired in covered.tolist():
+                result[fired].under_fire.append(site_id)
+        for site_id in tower_ids.tolist():
+            result[site_id].under_fire = [site_id]
+        for site_id, site in result.items():
+            site.fire_suppressed = bool(fire_suppressed[site_id])
+
+        under_fire = firing.any(axis=0)
+        under_fire[tower_ids] = True
+        self.own_eta = own_eta
+        self.enemy_eta = enemy_eta
+        self.exposed = under_fire & ~fire_suppressed
+        self.param_1 = np.array(table.param_1, dtype=np.int64)
+        self.gold = np.array(table.gold, dtype=np.int64)
+        self.mine_full = np.array(table.max_mine_size, dtype=np.int64) == self.param_1
+
+    def base_mask(self):
+        site_type = self.site_type
+        return (site_type >= 0) & (site_type != SiteType.ENEMY_TOWER) & ~self.exposed
+
+    def is_type(self, site_type):
+        return self.site_type == site_type
+
+    def barracks_training(self):
+        return self.is_type(SiteType.OWN_BARRACKS) & (self.param_1 != 0)
+
+    def tower_above(self, hp):
+        return self.is_type(SiteType.OWN_TOWER) & (self.param_1 > hp)
+
+    def empty_mask(self):
+        return (self.base_mask() & (self.own_eta < self.enemy_eta)
+                & ~(self.is_type(SiteType.OWN_MINE) & self.mine_full)
+                & ~self.is_type(SiteType.OWN_BARRACKS) & ~self.tower_above(self.strategy.params.tower_hp_enough))
+
+    def barracks_mask(self):
+        return (self.base_mask() & (self.own_eta < self.enemy_eta-self.strategy.params.barracks_eta_margin)
+                & ~self.is_type(SiteType.OWN_BARRACKS) & ~self.is_type(SiteType.OWN_MINE))
+
+    def money_mask(self):
+        return (self.base_mask() & (self.own_eta < self.enemy_eta)
+                & ~(self.is_type(SiteType.OWN_MINE) & self.mine_full)
+                & (self.gold != 0) & ~self.barracks_training())
+
+    def emergency_with_towers_mask(self):
+        return self.base_mask() & (self.own_eta < self.enemy_eta) & ~self.barracks_training()
+
+    def emergency_mask(self, tower_hp):
+        return (self.base_mask() & (self.own_eta < self.enemy_eta)
+                & ~self.tower_above(tower_hp) & ~self.barracks_training())
+
+    def danger_mask(self):
+        return (self.base_mask() & (self.own_eta < self.enemy_eta) & ~self.tower_above(self.strategy.params.tower_hp_enough)
+                & ~self.is_type(SiteType.OWN_MINE) & ~self.barracks_training())
+
+    def select(self, analyzed_sites, mask):
+        return [site for site in analyzed_sites if mask[site.site_id]]
+
+class SimState:
+    __slots__ = ('turn', 'gold', 'queen_x', 'queen_y', 'queen_hp',
+                 'unit_x', 'unit_y', 'unit_hp', 'unit_owner', 'unit_type',
+                 'structure_type', 'owner', 'param_1', 'param_2', 'site_gold', 'max_mine_size')
+
+    def copy(self):
+        state = SimState()
+        state.turn = self.turn
+        state.gold = self.gold[:]
+        state.queen_x = self.queen_x[:]
+        state.queen_y = self.queen_y[:]
+        state.queen_hp = self.queen_hp[:]
+        state.unit_x = self.unit_x[:]
+        state.unit_y = self.unit_y[:]
+        state.unit_hp = self.unit_hp[:]
+        state.unit_owner = self.unit_owner[:]
+        state.unit_type = self.unit_type[:]
+        state.structure_type = self.structure_type[:]
+        state.owner = self.owner[:]
+        state.param_1 = self.param_1[:]
+        state.param_2 = self.param_2[:]
+        state.site_gold = self.site_gold[:]
+        state.max_mine_size = self.max_mine_size[:]
+        return state
+
+class Simulator:
+
+    def __init__(self, site_x, site_y, site_r):
+        self.site_x = site_x
+        self.site_y = site_y
+        self.site_r = site_r
+        self.site_area = [math.pi*r**2 for r in site_r]
+
+    def from_strategy(self, strategy):
+        sites = strategy.site_table
+        units = strategy.unit_table
+        me = strategy.own_side
+        enemy = strategy.enemy_side
+        state = SimState()
+        state.turn = strategy.current_turn
+        state.gold = [me.owned_gold, 0]
+        state.queen_x = [me.queen.x, enemy.queen.x]
+        state.queen_y = [me.queen.y, enemy.queen.y]
+        state.queen_hp = [me.queen.hp, enemy.queen.hp]
+        state.unit_x = []
+        state.unit_y = []
+        state.unit_hp = []
+        state.unit_owner = []
+        state.unit_type = []
+        for slot in range(units.count):
+            if units.unit_type[slot] == QUEEN:
+                continue
+            state.unit_x.append(units.x[slot])
+            state.unit_y.append(units.y[slot])
+            state.unit_hp.append(units.hp[slot])
+            state.unit_owner.append(units.owner[slot])
+            state.unit_type.append(units.unit_type[slot])
+        state.structure_type = sites.structure_type[:]
+        state.owner = sites.owner[:]
+        state.param_1 = sites.param_1[:]
+        state.param_2 = sites.param_2[:]
+        state.site_gold = sites.gold[:]
+        state.max_mine_size = sites.max_mine_size[:]
+        return state
+
+    def attack_radius(self, site_id, hp):
+        return ((hp*1000+self.site_area[site_id])/math.pi)**0.5
+
+    def rollout(self, state, action, depth):
+        # the candidate is played until it is done once (a build lands, a move arrives),
+        # then both queens follow the default policy
+        for _ in range(depth):
+            if action is None:
+                self.step(state, self.policy(state, FRIENDLY))
+            elif self.step(state, action):
+                action = None
+        return self.evaluate(state)
+
+    def step(self, state, action):
+        state.turn += 1
+        self.train(state)
+        done = self.queen_action(state, FRIENDLY, action)
+        self.queen_action(state, ENEMY, self.policy(state, ENEMY))
+        self.move_units(state)
+        self.fight(state)
+        self.update_sites(state)
+        return done
+
+    def policy(self, state, player):
+        # run to a tower when knights are close, keep a barracks, then take the nearest free site
+        x = state.queen_x[player]
+        y = state.queen_y[player]
+        threatened = False
+        for i, unit_type in enumerate(state.unit_type):
+            if (unit_type == KNIGHT and state.unit_owner[i] != player
+                    and (state.unit_x[i]-x)**2+(state.unit_y[i]-y)**2 < SIM_THREAT_DISTANCE**2):
+                threatened = True
+                break
+        has_barracks = False
+        best = -1
+        best_d = 0
+        for site_id, structure_type in enumerate(state.structure_type):
+            owner = state.owner[site_id]
+            if owner == player:
+                has_barracks = has_barracks or structure_type == BARRACKS
+                if not (threatened and structure_type == TOWER):
+                    continue
+            elif structure_type == TOWER and owner != NO_OWNER:
+                continue
+            d = (self.site_x[site_id]-x)**2+(self.site_y[site_id]-y)**2
+            if best < 0 or d < best_d:
+                best = site_id
+                best_d = d
+        if best < 0:
+            return ('WAIT',)
+        if threatened:
+            return ('BUILD', best, 'TOWER')
+        if not has_barracks:
+            return ('BUILD', best, 'BARRACKS-KNIGHT')
+        return ('BUILD', best, 'MINE' if state.site_gold[best] != 0 else 'TOWER')
+
+    def train(self, state):
+        for site_id, structure_type in enumerate(state.structure_type):
+            owner = state.owner[site_id]
+            if structure_type != BARRACKS or owner == NO_OWNER or state.param_1[site_id] != 0:
+                continue
+            cost, train_turns, _, _ = CREEP_TYPES[state.param_2[site_id]]
+            if state.gold[owner] >= cost:
+                state.gold[owner] -= cost
+                state.param_1[site_id] = train_turns
+
+    def move(self, x, y, tx, ty, speed, stop):
+        dx = tx-x
+        dy = ty-y
+        d = (dx*dx+dy*dy)**0.5
+        step = min(speed, d-stop)
+        if d == 0 or step <= 0:
+            return x, y
+        return x+dx/d*step, y+dy/d*step
+
+    def queen_action(self, state, player, action):
+        x = state.queen_x[player]
+        y = state.queen_y[player]
+        if action[0] == 'MOVE':
+            state.queen_x[player], state.queen_y[player] = self.move(x, y, action[1], action[2], QUEEN_SPEED, 0)
+            return (action[1]-x)**2+(action[2]-y)**2 <= QUEEN_SPEED**2
+        elif action[0] == 'BUILD':
+            site_id = action[1]
+            sx = self.site_x[site_id]
+            sy = self.site_y[site_id]
+            stop = self.site_r[site_id]+QUEEN_R
+            if ((sx-x)**2+(sy-y)**2)**0.5-stop <= TOUCH_DISTANCE:
+                self.build(state, player, site_id, action[2])
+                return True
+            state.queen_x[player], state.queen_y[player] = self.move(x, y, sx, sy, QUEEN_SPEED, stop)
+            return False
+        return True
+
+    def build(self, state, player, site_id, kind):
+        structure_type = state.structure_type[site_id]
+        owner = state.owner[site_id]
+        if structure_type == TOWER and owner == 1-player:
+            return
+        own = owner == player
+        if kind == 'MINE':
+            if state.site_gold[site_id] == 0:
+                return
+            if own and structure_type == GOLDMINE:
+                state.param_1[site_id] = min(state.param_1[site_id]+1, max(state.max_mine_size[site_id], 1))
+                return
+            structure_type, param_1, param_2 = GOLDMINE, 1, -1
+        elif kind == 'TOWER':
+            if own and structure_type == TOWER:
+                hp = min(state.param_1[site_id]+TOWER_UP_PER_TURN, TOWER_MAX_HP)
+                state.param_1[site_id] = hp
+                state.param_2[site_id] = self.attack_radius(site_id, hp)
+                return
+            structure_type, param_1, param_2 = TOWER, TOWER_START_HP, self.attack_radius(site_id, TOWER_START_HP)
+        else:
+            if own and structure_type == BARRACKS:
+                return
+            structure_type, param_1, param_2 = BARRACKS, 0, BARRACKS_KINDS.get(kind, KNIGHT_BARRACKS)
+        state.structure_type[site_id] = structure_type
+        state.owner[site_id] = player
+        state.param_1[site_id] = param_1
+        state.param_2[site_id] = param_2
+
+    def nearest_creep(self, state, i):
+        x = state.unit_x[i]
+        y = state.unit_y[i]
+        owner = state.unit_owner[i]
+        target = -1
+        target_d = 0
+        for j, other in enumerate(state.unit_owner):
+            if other == owner or state.unit_hp[j] <= 0:
+                continue
+            d = ((state.unit_x[j]-x)**2+(state.unit_y[j]-y)**2)**0.5
+            if target < 0 or d < target_d:
+                target = j
+                target_d = d
+        return target, target_d
+
+    def nearest_tower(self, state, x, y, owner):
+        target = -1
+        target_d = 0
+        for site_id, structure_type in enumerate(state.structure_type):
+            if structure_type != TOWER or state.owner[site_id] != owner:
+                continue
+            d = ((self.site_x[site_id]-x)**2+(self.site_y[site_id]-y)**2)**0.5
+            if target < 0 or d < target_d:
+                target = site_id
+                target_d = d
+        return target, target_d
+
+    def move_units(self, state):
+        for i, unit_type in enumerate(state.unit_type):
+            x = state.unit_x[i]
+            y = state.unit_y[i]
+            owner = state.unit_owner[i]
+            if unit_type == KNIGHT:
+                state.unit_x[i], state.unit_y[i] = self.move(
+                    x, y, state.queen_x[1-owner], state.queen_y[1-owner], KNIGHT_SPEED, KNIGHT_R+QUEEN_R)
+            elif unit_type == GIANT:
+                site_id, _ = self.nearest_tower(state, x, y, 1-owner)
+                if site_id >= 0:
+                    state.unit_x[i], state.unit_y[i] = self.move(
+                        x, y, self.site_x[site_id], self.site_y[site_id], GIANT_SPEED, GIANT_R+self.site_r[site_id])
+            else:
+                target, _ = self.nearest_creep(state, i)
+                if target >= 0:
+                    state.unit_x[i], state.unit_y[i] = self.move(
+                        x, y, state.unit_x[target], state.unit_y[target], ARCHER_SPEED, ARCHER_RANGE)
+                else:
+                    state.unit_x[i], state.unit_y[i] = self.move(
+                        x, y, state.queen_x[owner], state.queen_y[owner], ARCHER_SPEED, ARCHER_R+QUEEN_R)
+
+    def fight(self, state):
+        unit_x = state.unit_x
+        unit_y = state.unit_y
+        unit_hp = state.unit_hp
+        for i, unit_type in enumerate(state.unit_type):
+            enemy = 1-state.unit_owner[i]
+            if unit_type == KNIGHT:
+                d = ((unit_x[i]-state.queen_x[enemy])**2+(unit_y[i]-state.queen_y[enemy])**2)**0.5
+                if d-KNIGHT_R-QUEEN_R <= TOUCH_DISTANCE:
+                    state.queen_hp[enemy] -= KNIGHT_DAMAGE
+            elif unit_type == ARCHER:
+                target, d = self.nearest_creep(state, i)
+                if target >= 0 and d-ARCHER_R-SIM_UNIT_R[state.unit_type[target]] <= ARCHER_RANGE:
+                    unit_hp[target] -= ARCHER_DAMAGE_TO_GIANTS if state.unit_type[target] == GIANT else ARCHER_DAMAGE
+            else:
+                site_id, d = self.nearest_tower(state, unit_x[i], unit_y[i], enemy)
+                if site_id >= 0 and d-GIANT_R-self.site_r[site_id] <= TOUCH_DISTANCE:
+                    hp = state.param_1[site_id]-GIANT_BUST_RATE
+                    if hp <= 0:
+                        self.clear_site(state, site_id)
+                    else:
+                        state.param_1[site_id] = hp
+                        state.param_2[site_id] = self.attack_radius(site_id, hp)
+        for site_id, structure_type in enumerate(state.structure_type):
+            if structure_type != TOWER:
+                continue
+            enemy = 1-state.owner[site_id]
+            radius = state.param_2[site_id]
+            sx = self.site_x[site_id]
+            sy = self.site_y[site_id]
+            target = -1
+            target_d = radius
+            for i, owner in enumerate(state.unit_owner):
+                if owner != enemy or unit_hp[i] <= 0:
+                    continue
+                d = ((unit_x[i]-sx)**2+(unit_y[i]-sy)**2)**0.5
+                if d < target_d:
+                    target = i
+                    target_d = d
+            if target >= 0:
+                unit_hp[target] -= TOWER_CREEP_DAMAGE_MIN+int((radius-target_d)/TOWER_DAMAGE_CLIMB_DISTANCE)
+                continue
+            d = ((state.queen_x[enemy]-sx)**2+(state.queen_y[enemy]-sy)**2)**0.5
+            if d < radius:
+                state.queen_hp[enemy] -= TOWER_QUEEN_DAMAGE_MIN+int((radius-d)/TOWER_DAMAGE_CLIMB_DISTANCE)
+        alive = [i for i, hp in enumerate(unit_hp) if hp > CREEP_AGING]
+        if len(alive) != len(unit_hp):
+            state.unit_x = [unit_x[i] for i in alive]
+            state.unit_y = [unit_y[i] for i in alive]
+            state.unit_owner = [state.unit_owner[i] for i in alive]
+            state.unit_type = [state.unit_type[i] for i in alive]
+            unit_hp = [unit_hp[i] for i in alive]
+        state.unit_hp = [hp-CREEP_AGING for hp in unit_hp]
+
+    def update_sites(self, state):
+        for site_id, structure_type in enumerate(state.structure_type):
+            if structure_type == GOLDMINE:
+                income = state.param_1[site_id]
+                gold = state.site_gold[site_id]
+                if gold >= 0:
+                    income = min(income, gold)
+                    state.site_gold[site_id] = gold-income
+                state.gold[state.owner[site_id]] += income
+                if state.site_gold[site_id] == 0:
+                    self.clear_site(state, site_id)
+            elif structure_type == TOWER:
+                hp = state.param_1[site_id]-TOWER_MELT_RATE
+                if hp <= 0:
+                    self.clear_site(state, site_id)
+                else:
+                    state.param_1[site_id] = hp
+                    state.param_2[site_id] = self.attack_radius(site_id, hp)
+            elif structure_type == BARRACKS and state.param_1[site_id] > 0:
+                state.param_1[site_id] -= 1
+                if state.param_1[site_id] == 0:
+                    unit_type, squad, health = SIM_SQUADS[state.param_2[site_id]]
+                    for _ in range(squad):
+                        state.unit_x.append(self.site_x[site_id])
+                        state.unit_y.append(self.site_y[site_id])
+                        state.unit_hp.append(health)
+                        state.unit_owner.append(state.owner[site_id])
+                        state.unit_type.append(unit_type)
+
+    def clear_site(self, state, site_id):
+        state.structure_type[site_id] = NO_STRUCTURE
+        state.owner[site_id] = NO_OWNER
+        state.param_1[site_id] = -1
+        state.param_2[site_id] = -1
+
+    def evaluate(self, state):
+        score = (state.queen_hp[0]-state.queen_hp[1])*QUEEN_HP_VALUE+state.gold[0]
+        if state.queen_hp[0] <= 0:
+            score -= 100000
+        if state.queen_hp[1] <= 0:
+            score += 100000
+        for site_id, structure_type in enumerate(state.structure_type):
+            owner = state.owner[site_id]
+            if owner == ENEMY:
+                score -= ENEMY_STRUCTURE_VALUE
+            elif owner != FRIENDLY:
+                continue
+            elif structure_type == GOLDMINE:
+                score += state.param_1[site_id]*INCOME_VALUE
+            elif structure_type == TOWER:
+                score += state.param_1[site_id]*TOWER_HP_VALUE
+            elif structure_type == BARRACKS:
+                score += BARRACKS_VALUE
+        for i, owner in enumerate(state.unit_owner):
+            if owner == ENEMY:
+                score -= state.unit_hp[i]*KNIGHT_HP_VALUE
+            else:
+                score += state.unit_hp[i]*KNIGHT_HP_VALUE
+        return score
+
+class EconomyPlan:
+    __slots__ = ('turn', 'key', 'ready', 'upgrades', 'packs', 'income', 'states')
+
+    def __init__(self, turn, key, ready, upgrades, packs, income, states):
+        self.turn = turn
+        self.key = key
+        self.ready = ready
+        self.upgrades = upgrades
+        self.packs = packs
+        self.income = income
+        self.states = states
+
+    def upgrades_left(self, turn):
+        return max(self.upgrades-(turn-self.turn), 0)
+
+class EconomyPlanner:
+
+    def __init__(self, horizon=ECONOMY_HORIZON):
+        self.horizon = horizon
+        self.plan = None
+        self.hits = 0
+        self.drifts = 0
+        self.misses = 0
+
+    def get(self, turn, gold, mines, upgrade_id, cooldowns, barracks_eta):
+        # mines: sorted (site_id, income, max_size, remaining gold or -1)
+        key = (tuple((site_id, income, max_size) for site_id, income, max_size, _ in mines), upgrade_id)
+        ready = turn+barracks_eta if not cooldowns else None
+        plan = self.plan
+        if plan is not None and plan.key == key:
+            elapsed = turn-plan.turn
+            if (0 <= elapsed < len(plan.states) and plan.ready == ready
+                    and plan.states[elapsed] == (gold, tuple(cooldowns))):
+                self.hits += 1
+                return plan
+            # same mines, but gold or barracks moved off the projection: keep the chosen
+            # upgrade count and only project the rest of it again
+            self.drifts += 1
+            upgrades = plan.upgrades_left(turn)
+            packs, income, states = self.project(gold, mines, upgrade_id, upgrades, cooldowns, barracks_eta)
+            self.plan = EconomyPlan(turn, key, ready, upgrades, packs, income, states)
+            return self.plan
+        self.misses += 1
+        best = None
+        capacity = 0
+        for site_id, income, max_size, _ in mines:
+            if site_id == upgrade_id:
+                capacity = max(max_size-income, 0)
+        for upgrades in range(capacity+1):
+            packs, income, states = self.project(gold, mines, upgrade_id, upgrades, cooldowns, barracks_eta)
+            if best is None or (packs, income) > (best.packs, best.income):
+                best = EconomyPlan(turn, key, ready, upgrades, packs, income, states)
+        self.plan = best
+        return best
+
+    def project(self, gold, mines, upgrade_id, upgrades, cooldowns, barracks_eta):
+        incomes = [income for _, income, _, _ in mines]
+        limits = [max_size for _, _, max_size, _ in mines]
+        remaining = [math.inf if left < 0 else left for _, _, _, left in mines]
+        target = [site_id for site_id, _, _, _ in mines].index(upgrade_id) if upgrades else -1
+        cooldowns = list(cooldowns)
+        ready_turn = upgrades+barracks_eta if not cooldowns else -1
+        packs = 0
+        states = []
+        for t in range(self.horizon):
+            states.append((gold, tuple(cooldowns)))
+            for i, cooldown in enumerate(cooldowns):
+                if cooldown == 0 and gold >= KNIGHT_COST:
+                    gold -= KNIGHT_COST
+                    cooldowns[i] = KNIGHT_TRAIN
+                    break
+            if t < upgrades:
+                incomes[target] = min(incomes[target]+1, limits[target])
+            elif t == ready_turn:
+                cooldowns.append(0)
+            for i, income in enumerate(incomes):
+                extracted = min(income, remaining[i])
+                gold += extracted
+                remaining[i] -= extracted
+            for i, cooldown in enumerate(cooldowns):
+                if cooldown > 0:
+                    cooldowns[i] = cooldown-1
+                    if cooldown == 1 and t < self.horizon-1:
+                        packs += 1
+        return packs, sum(incomes), states
+
+# barracks type: cost, train turns, speed, build command
+CREEP_TYPES = {
+    KNIGHT_BARRACKS: (KNIGHT_COST, KNIGHT_TRAIN, KNIGHT_SPEED, 'BARRACKS-KNIGHT'),
+    ARCHER_BARRACKS: (ARCHER_COST, ARCHER_TRAIN, ARCHER_SPEED, 'BARRACKS-ARCHER'),
+    GIANT_BARRACKS: (GIANT_COST, GIANT_TRAIN, GIANT_SPEED, 'BARRACKS-GIANT'),
+}
+BARRACKS_KINDS = {name: kind for kind, (_, _, _, name) in CREEP_TYPES.items()}
+# barracks type: unit type, squad, health
+SIM_SQUADS = {
+    KNIGHT_BARRACKS: (KNIGHT, KNIGHT_SQUAD, KNIGHT_HEALTH),
+    ARCHER_BARRACKS: (ARCHER, ARCHER_SQUAD, ARCHER_HEALTH),
+    GIANT_BARRACKS: (GIANT, GIANT_SQUAD, GIANT_HEALTH),
+}
+SIM_UNIT_R = {KNIGHT: KNIGHT_R, ARCHER: ARCHER_R, GIANT: GIANT_R}
+
+class TrainingWave:
+    __slots__ = ('arrival', 'launches')
+
+    def __init__(self, arrival, launches):
+        self.arrival = arrival
+        # site_id: turn to send TRAIN so the pack reaches its target on arrival
+        self.launches = launches
+
+class ProductionScheduler:
+
+    def __init__(self, strategy, horizon=SCHEDULE_HORIZON):
+        self.strategy = strategy
+        self.horizon = horizon
+        self.wave = None
+        self.replans = 0
+
+    def wanted_barracks(self):
+        me = self.strategy.own_side
+        enemy = self.strategy.enemy_side
+        if len(me.knight_barracks) == 0:
+            return KNIGHT_BARRACKS
+        if len(enemy.towers) >= SCHEDULE_GIANT_TOWERS and len(me.giant_barracks) == 0:
+            return GIANT_BARRACKS
+        if len(enemy.knights) >= SCHEDULE_ARCHER_KNIGHTS and len(me.archer_barracks) == 0:
+            return ARCHER_BARRACKS
+        return None
+
+    def attackers(self):
+        me = self.strategy.own_side
+        members = sorted(me.knight_barracks)
+        if len(self.strategy.enemy_side.towers) >= SCHEDULE_GIANT_TOWERS:
+            members += sorted(me.giant_barracks)
+        return members
+
+    def travel(self, site_id):
+        strategy = self.strategy
+        enemy = strategy.enemy_side
+        x = strategy.site_x[site_id]
+        y = strategy.site_y[site_id]
+        creep_type = strategy.site_table.param_2[site_id]
+        targets = [(enemy.queen.x, enemy.queen.y)]
+        if creep_type == GIANT_BARRACKS and enemy.towers:
+            targets = [(strategy.site_x[i], strategy.site_y[i]) for i in enemy.towers]
+        d = min(math.sqrt((x-tx)**2+(y-ty)**2) for tx, ty in targets)
+        return int(d/CREEP_TYPES[creep_type][2])
+
+    def affordable(self, launches, turn):
+        strategy = self.strategy
+        table = strategy.site_table
+        gold = strategy.own_side.owned_gold
+        income = strategy.own_income()
+        spent = 0
+        for site_id, launch in sorted(launches.items(), key=lambda item: item[1]):
+            spent += CREEP_TYPES[table.param_2[site_id]][0]
+            if gold+income*(launch-turn)-spent < 0:
+                return False
+        return True
+
+    def plan(self):
+        strategy = self.strategy
+        table = strategy.site_table
+        turn = strategy.current_turn
+        members = self.attackers()
+        if not members:
+            return None
+        lead = {site_id: CREEP_TYPES[table.param_2[site_id]][1]+self.travel(site_id) for site_id in members}
+        earliest = max(turn+table.param_1[site_id]+lead[site_id] for site_id in members)
+        for arrival in range(earliest, earliest+self.horizon):
+            launches = {site_id: arrival-lead[site_id] for site_id in members}
+            if self.affordable(launches, turn):
+                return TrainingWave(arrival, launches)
+        return None
+
+    def valid(self, wave):
+        strategy = self.strategy
+        turn = strategy.current_turn
+        own = strategy.own_side.barracks
+        if set(wave.launches) != set(self.attackers()):
+            return False
+        for site_id, launch in wave.launches.items():
+            if site_id not in own or launch < turn+strategy.site_table.param_1[site_id]:
+                return False
+        return self.affordable(wave.launches, turn)
+
+    def update(self):
+        # the wave is kept across turns and only replanned once it stops holding
+        if self.wave is not None and not self.valid(self.wave):
+            self.wave = None
+            self.replans += 1
+        if self.wave is None:
+            self.wave = self.plan()
+        return self.wave
+
+    def train_command(self):
+        strategy = self.strategy
+        table = strategy.site_table
+        turn = strategy.current_turn
+        gold = strategy.own_side.owned_gold
+        sites = []
+        wave = self.update()
+        if wave is not None:
+            sites = [site_id for site_id, launch in sorted(wave.launches.items()) if launch == turn]
+            cost = sum(CREEP_TYPES[table.param_2[site_id]][0] for site_id in sites)
+            if cost > gold:
+                sites = []
+            for site_id in sites:
+                del wave.launches[site_id]
+            gold -= sum(CREEP_TYPES[table.param_2[site_id]][0] for site_id in sites)
+            if not wave.launches:
+                self.wave = None
+        if len(strategy.enemy_side.knights) >= SCHEDULE_ARCHER_KNIGHTS:
+            reserve = 0
+            if self.wave is not None:
+                reserve = sum(CREEP_TYPES[table.param_2[i]][0] for i in self.wave.launches)
+            for site_id in sorted(strategy.own_side.archer_barracks):
+                if table.param_1[site_id] == 0 and gold-ARCHER_COST >= reserve:
+                    sites.append(site_id)
+                    gold -= ARCHER_COST
+        if not sites:
+            return 'TRAIN'
+        return 'TRAIN {0}'.format(' '.join(str(site_id) for site_id in sites))
+
+class Archetype:
+    UNKNOWN = -1
+    TURTLE = 0
+    RUSH = 1
+    ECO = 2
+
+class EnemyModel:
+
+    def __init__(self, strategy, size=HISTORY_TURNS, waves=HISTORY_WAVES):
+        self.strategy = strategy
+        self.queen_x = RingBuffer(size)
+        self.queen_y = RingBuffer(size)
+        self.builds = RingBuffer(size)
+        self.waves = RingBuffer(waves)
+        self.progress = {}
+        self.archetype = Archetype.UNKNOWN
+
+    def observe(self):
+        strategy = self.strategy
+        turn = strategy.current_turn
+        queen = strategy.enemy_side.queen
+        self.queen_x.append(queen.x)
+        self.queen_y.append(queen.y)
+        for change in strategy.structure_changes.newest(len(strategy.structure_changes)):
+            if change.turn != turn:
+                break
+            if change.new_owner == ENEMY:
+                self.builds.append(change)
+        progress = {}
+        spawned = False
+        for site_id, barracks in strategy.enemy_side.knight_barracks.items():
+            now = barracks.build_progress
+            last = self.progress.get(site_id, 0)
+            # a pack leaves when the countdown ends, possibly retrained on the same turn
+            if last > 0 and (now == 0 or now > last):
+                spawned = True
+            progress[site_id] = now
+        self.progress = progress
+        if spawned:
+            self.waves.append(turn)
+        self.archetype = self.classify()
+
+    def classify(self):
+        if len(self.waves) >= 2 and self.wave_interval() <= INTENT_RUSH_INTERVAL:
+            return Archetype.RUSH
+        counts = {GOLDMINE: 0, TOWER: 0, BARRACKS: 0}
+        for change in self.builds:
+            counts[change.new_type] += 1
+        if counts[TOWER] == counts[GOLDMINE] == counts[BARRACKS] == 0:
+            return Archetype.UNKNOWN
+        if counts[TOWER] > counts[GOLDMINE]+counts[BARRACKS]:
+            return Archetype.TURTLE
+        if counts[GOLDMINE] >= counts[TOWER]:
+            return Archetype.ECO
+        return Archetype.UNKNOWN
+
+    def wave_interval(self):
+        return (self.waves[-1]-self.waves[0])/(len(self.waves)-1)
+
+    def queen_distance(self, x, y, turns=INTENT_QUEEN_TURNS):
+        total = 0.0
+        n = 0
+        for qx, qy in zip(self.queen_x.newest(turns), self.queen_y.newest(turns)):
+            total += math.sqrt((qx-x)**2+(qy-y)**2)
+            n += 1
+        return total/n if n else 0.0
+
+def parse_command(command):
+    parts = command.split()
+    if parts[0] == 'MOVE':
+        return ('MOVE', int(parts[1]), int(parts[2]))
+    elif parts[0] == 'BUILD':
+        return ('BUILD', int(parts[1]), parts[2])
+    return ('WAIT',)
+
+def format_command(action):
+    if action[0] == 'MOVE':
+        return 'MOVE {0} {1}'.format(int(action[1]), int(action[2]))
+    elif action[0] == 'BUILD':
+        return 'BUILD {0} {1}'.format(action[1], action[2])
+    return 'WAIT'
+
+class LookaheadSearch:
+
+    def __init__(self, strategy, budget=LOOKAHEAD_BUDGET, beam=LOOKAHEAD_BEAM,
+                 max_depth=LOOKAHEAD_MAX_DEPTH, margin=LOOKAHEAD_MARGIN, pool=None):
+        self.simulator = Simulator(strategy.site_x, strategy.site_y, strategy.site_r)
+        self.pool = pool
+        self.budget = budget
+        self.beam = beam
+        self.max_depth = max_depth
+        self.margin = margin
+        self.nodes = 0
+        self.depth = 0
+
+    def candidates(self, strategy, analyzed, default_command):
+        actions = [parse_command(default_command)]
+        reachable = strategy.site_filter.select(analyzed, (('site_type', SiteType.ENEMY_TOWER), ('exposed',)))
+        reachable = strategy.top_k(reachable, lambda x: x.own_eta, LOOKAHEAD_SITES)
+        no_barracks = strategy.no_barracks()
+        for site in reachable:
+            if site.site_type != SiteType.OWN_BARRACKS:
+                actions.append(('BUILD', site.site_id, 'TOWER'))
+            if site.site_type != SiteType.OWN_TOWER and strategy.for_mining[site.site_id] != 0:
+                actions.append(('BUILD', site.site_id, 'MINE'))
+            if no_barracks and site.site_type in (SiteType.EMPTY, SiteType.ENEMY_MINE, SiteType.ENEMY_BARRACKS):
+                actions.append(('BUILD', site.site_id, 'BARRACKS-KNIGHT'))
+        queen = strategy.own_side.queen
+        enemy_queen = strategy.enemy_side.queen
+        tx = min(max(2*queen.x-enemy_queen.x, 0), FIELD_WIDTH)
+        ty = min(max(2*queen.y-enemy_queen.y, 0), FIELD_HEIGHT)
+        actions.append(('MOVE', tx, ty))
+        actions.append(('WAIT',))
+        unique = []
+        for action in actions:
+            if action not in unique:
+                unique.append(action)
+        return unique
+
+    def rollout(self, root, action, depth):
+        self.nodes += depth
+        return self.simulator.rollout(root.copy(), action, depth)
+
+    def choose(self, strategy, analyzed, default_command):
+        deadline = time.perf_counter()+self.budget
+        root = self.simulator.from_strategy(strategy)
+        alive = self.candidates(strategy, analyzed, default_command)
+        self.nodes = 0
+        self.depth = 0
+        default = alive[0]
+        best = default
+        depth = LOOKAHEAD_MIN_DEPTH
+        while len(alive) > 1 and depth <= self.max_depth:
+            scored = []
+            if self.pool is not None:
+                # offline runs spread the rollouts over processes sharing the turn's snapshot
+                if time.perf_counter() > deadline:
+                    return format_command(best)
+                scored = list(zip(self.pool.evaluate(strategy, alive, depth), alive))
+                self.nodes += depth*len(alive)
+            for action in alive[len(scored):]:
+                if time.perf_counter() > deadline:
+                    return format_command(best)
+                scored.append((self.rollout(root, action, depth), action))
+            # the default stays first in the beam so every depth compares against it
+            default_score = scored[0][0]
+            ranked = sorted(scored[1:], key=lambda x: -x[0])
+            best = default
+            if ranked[0][0]-default_score >= self.margin:
+                best = ranked[0][1]
+            self.depth = depth
+            alive = [default]+[action for _, action in ranked[0:self.beam-1]]
+            depth *= 2
+        return format_command(best)
+
+class CreepPredictor:
+
+    def __init__(self, site_x, site_y, site_r, horizon=CREEP_HORIZON, stay=CREEP_STAY_PROBABILITY,
+                 use_numpy=True):
+        self.site_x = site_x
+        self.site_y = site_y
+        self.site_min_d = [r+KNIGHT_R for r in site_r]
+        self.horizon = horizon
+        self.stay = stay
+        self.use_numpy = use_numpy and np is not None
+        if self.use_numpy:
+            self.site_xa = np.array(site_x, dtype=float)
+            self.site_ya = np.array(site_y, dtype=float)
+            self.site_min_da = np.array(self.site_min_d, dtype=float)
+
+    def predict(self, knights, towers, queen_x, queen_y):
+        if len(knights) == 0:
+            return [0.0]*self.horizon
+        if self.use_numpy:
+            return self.predict_arrays(knights, towers, queen_x, queen_y)
+        return self.predict_lists(knights, towers, queen_x, queen_y)
+
+    def predict_arrays(self, knights, towers, queen_x, queen_y):
+        x = np.array([k.x for k in knights], dtype=float)
+        y = np.array([k.y for k in knights], dtype=float)
+        hp = np.array([k.hp for k in knights], dtype=float)
+        tower_x = np.array([self.site_x[t.site_id] for t in towers], dtype=float)
+        tower_y = np.array([self.site_y[t.site_id] for t in towers], dtype=float)
+        tower_r = np.array([t.attack_radius for t in towers], dtype=float)
+        contact = KNIGHT_R+QUEEN_R
+        damage = []
+        weight = 1.0
+        for _ in range(self.horizon):
+            weight *= self.stay
+            dx = queen_x-x
+            dy = queen_y-y
+            d = np.sqrt(dx*dx+dy*dy)
+            step = np.minimum(KNIGHT_SPEED, np.maximum(d-contact, 0.0))
+            moving = d > 0
+            x[moving] += dx[moving]/d[moving]*step[moving]
+            y[moving] += dy[moving]/d[moving]*step[moving]
+
+            # push knights out of the deepest site circle they ended up in
+            sx = x[:, None]-self.site_xa
+            sy = y[:, None]-self.site_ya
+            sd = np.sqrt(sx*sx+sy*sy)
+            depth = self.site_min_da-sd
+            deepest = np.argmax(depth, axis=1)
+            rows = np.arange(len(x))
+            inside = (depth[rows, deepest] > 0) & (sd[rows, deepest] > 0)
+            k = rows[inside]
+            s = deepest[inside]
+            scale = self.site_min_da[s]/sd[k, s]
+            x[k] = self.site_xa[s]+sx[k, s]*scale
+            y[k] = self.site_ya[s]+sy[k, s]*scale
+
+            alive = hp > 0
+            gap = np.sqrt((x-queen_x)**2+(y-queen_y)**2)-contact
+            damage.append(float(np.count_nonzero(alive & (gap <= TOUCH_DISTANCE)))*KNIGHT_DAMAGE*weight)
+
+            if len(towers) > 0:
+                td = np.sqrt((x[None, :]-tower_x[:, None])**2+(y[None, :]-tower_y[:, None])**2)
+                for j in range(len(towers)):
+                    # towers fire one after another and skip knights already killed this turn
+                    row = np.where(hp > 0, td[j], np.inf)
+                    target = np.argmin(row)
+                    if row[target] < tower_r[j]:
+                        hp[target] -= TOWER_CREEP_DAMAGE_MIN+int((tower_r[j]-row[target])/TOWER_DAMAGE_CLIMB_DISTANCE)
+            hp -= CREEP_AGING
+        return damage
+
+    def predict_lists(self, knights, towers, queen_x, queen_y):
+        x = [float(k.x) for k in knights]
+        y = [float(k.y) for k in knights]
+        hp = [k.hp for k in knights]
+        tower_xy = [(self.site_x[t.site_id], self.site_y[t.site_id], t.attack_radius) for t in towers]
+        sites = list(zip(self.site_x, self.site_y, self.site_min_d))
+        contact = KNIGHT_R+QUEEN_R
+        damage = []
+        weight = 1.0
+        for _ in range(self.horizon):
+            weight *= self.stay
+            touching = 0
+            for i in range(len(x)):
+                dx = queen_x-x[i]
+                dy = queen_y-y[i]
+                d = math.sqrt(dx*dx+dy*dy)
+                if d > 0:
+                    step = min(KNIGHT_SPEED, max(d-contact, 0.0))
+                    x[i] += dx/d*step
+                    y[i] += dy/d*step
+                depth = 0
+                deepest = None
+                for sx, sy, min_d in sites:
+                    dx = x[i]-sx
+                    dy = y[i]-sy
+                    sd = math.sqrt(dx*dx+dy*dy)
+                    if min_d-sd > depth and sd > 0:
+                        depth = min_d-sd
+                        deepest = (sx, sy, min_d, dx, dy, sd)
+                if deepest is not None:
+                    sx, sy, min_d, dx, dy, sd = deepest
+                    x[i] = sx+dx*(min_d/sd)
+                    y[i] = sy+dy*(min_d/sd)
+                if hp[i] > 0 and math.sqrt((x[i]-queen_x)**2+(y[i]-queen_y)**2)-contact <= TOUCH_DISTANCE:
+                    touching += 1
+            damage.append(touching*KNIGHT_DAMAGE*weight)
+            for tx, ty, radius in tower_xy:
+                target = -1
+                target_d = math.inf
+                for i in range(len(x)):
+                    if hp[i] <= 0:
+                        continue
+                    d = math.sqrt((x[i]-tx)**2+(y[i]-ty)**2)
+                    if d < target_d:
+                        target = i
+                        target_d = d
+                if target >= 0 and target_d < radius:
+                    hp[target] -= TOWER_CREEP_DAMAGE_MIN+int((radius-target_d)/TOWER_DAMAGE_CLIMB_DISTANCE)
+            hp = [h-CREEP_AGING for h in hp]
+        return damage
+
+class PathTree:
+
+    def __init__(self, planner, x, y, penalty, cost, length, prev):
+        self.planner = planner
+        self.x = x
+        self.y = y
+        self.penalty = penalty
+        self.cost = cost
+        self.length = length
+        self.prev = prev
+
+    def site_etas(self):
+        planner = self.planner
+        etas = []
+        for site_id, (sx, sy, r) in enumerate(planner.sites):
+            touch = r+QUEEN_R
+            d = math.sqrt((self.x-sx)**2+(self.y-sy)**2)
+            if d <= touch:
+                etas.append(0.0)
+                continue
+            best_cost = math.inf
+            best_length = math.inf
+            if planner.clear(self.x, self.y, sx+(self.x-sx)*touch/d, sy+(self.y-sy)*touch/d):
+                best_cost = (d-touch)*(1+self.penalty[-1])
+                best_length = d-touch
+            for n in planner.site_nodes[site_id]:
+                if self.cost[n] < best_cost:
+                    best_cost = self.cost[n]
+                    best_length = self.length[n]
+            etas.append(best_length/QUEEN_SPEED)
+        return etas
+
+    def waypoint(self, tx, ty):
+        planner = self.planner
+        tx = min(max(tx, 0), FIELD_WIDTH)
+        ty = min(max(ty, 0), FIELD_HEIGHT)
+        if planner.clear(self.x, self.y, tx, ty):
+            return tx, ty
+        order = sorted((self.cost[n]+math.sqrt((planner.node_x[n]-tx)**2+(planner.node_y[n]-ty)**2), n)
+                       for n in range(len(self.cost)) if self.cost[n] < math.inf)
+        for _, n in order:
+            if not planner.clear(planner.node_x[n], planner.node_y[n], tx, ty):
+                continue
+            path = [(tx, ty)]
+            while n >= 0:
+                path.append((planner.node_x[n], planner.node_y[n]))
+                n = self.prev[n]
+            # aim at the furthest point of the path still in sight
+            for px, py in path:
+                if planner.clear(self.x, self.y, px, py):
+                    return int(px), int(py)
+        return tx, ty
+
+
+class PathPlanner:
+    # visibility graph over the site circles grown by QUEEN_R, built once per game;
+    # tower ranges only add a per-turn cost to the nodes they cover
+
+    def __init__(self, site_x, site_y, site_r, nodes=PATH_NODES, tower_cost=PATH_TOWER_COST):
+        self.tower_cost = tower_cost
+        self.sites = list(zip(site_x, site_y, site_r))
+        # chords between neighbouring nodes cut into the circle, so obstacles are tested shrunk
+        shrink = math.cos(math.pi/nodes)
+        self.circles = [(x, y, (r+QUEEN_R)*shrink-1) for x, y, r in self.sites]
+        self.node_x = []
+        self.node_y = []
+        self.site_nodes = []
+        for x, y, r in self.sites:
+            own = []
+            for k in range(nodes):
+                angle = 2*math.pi*k/nodes
+                nx = x+(r+QUEEN_R+1)*math.cos(angle)
+                ny = y+(r+QUEEN_R+1)*math.sin(angle)
+                if 0 <= nx <= FIELD_WIDTH and 0 <= ny <= FIELD_HEIGHT and not self.inside(nx, ny):
+                    own.append(len(self.node_x))
+                    self.node_x.append(nx)
+                    self.node_y.append(ny)
+            self.site_nodes.append(own)
+        count = len(self.node_x)
+        self.edges = [[] for _ in range(count)]
+        for a in range(count):
+            ax = self.node_x[a]
+            ay = self.node_y[a]
+            for b in range(a+1, count):
+                bx = self.node_x[b]
+                by = self.node_y[b]
+                if self.clear(ax, ay, bx, by):
+                    length = math.sqrt((ax-bx)**2+(ay-by)**2)
+                    self.edges[a].append((b, length))
+                    self.edges[b].append((a, length))
+
+    def inside(self, x, y):
+        for cx, cy, cr in self.circles:
+            if (x-cx)**2+(y-cy)**2 < cr*cr:
+                return True
+        return False
+
+    def clear(self, ax, ay, bx, by):
+        # circles holding either end are the ones being left or touched, they do not block
+        dx = bx-ax
+        dy = by-ay
+        ll = dx*dx+dy*dy
+        min_x = min(ax, bx)
+        max_x = max(ax, bx)
+        min_y = min(ay, by)
+        max_y = max(ay, by)
+        for cx, cy, cr in self.circles:
+            if cx+cr < min_x or cx-cr > max_x or cy+cr < min_y or cy-cr > max_y:
+                continue
+            rr = cr*cr
+            ex = cx-ax
+            ey = cy-ay
+            if ex*ex+ey*ey < rr or (cx-bx)**2+(cy-by)**2 < rr:
+                continue
+            t = (ex*dx+ey*dy)/ll if ll else 0.0
+            if t <= 0 or t >= 1:
+                continue
+            px = ex-t*dx
+            py = ey-t*dy
+            if px*px+py*py < rr:
+                return False
+        return True
+
+    def penalties(self, x, y, towers):
+        penalty = []
+        for nx, ny in zip(self.node_x+[x], self.node_y+[y]):
+            covered = 0
+            for tx, ty, radius in towers:
+                if (nx-tx)**2+(ny-ty)**2 < radius*radius:
+                    covered += 1
+            penalty.append(self.tower_cost*covered)
+        return penalty
+
+    def search(self, x, y, towers):
+        count = len(self.node_x)
+        penalty = self.penalties(x, y, towers)
+        cost = [math.inf]*count
+        length = [math.inf]*count
+        prev = [-1]*count
+        heap = []
+        for n in range(count):
+            nx = self.node_x[n]
+            ny = self.node_y[n]
+            if self.clear(x, y, nx, ny):
+                d = math.sqrt((x-nx)**2+(y-ny)**2)
+                cost[n] = d*(1+(penalty[n]+penalty[-1])/2)
+                length[n] = d
+                heap.append((cost[n], n))
+        heapq.heapify(heap)
+        while heap:
+            c, a = heapq.heappop(heap)
+            if c > cost[a]:
+                continue
+            pa = penalty[a]
+            for b, d in self.edges[a]:
+                nc = c+d*(1+(pa+penalty[b])/2)
+                if nc < cost[b]:
+                    cost[b] = nc
+                    length[b] = length[a]+d
+                    prev[b] = a
+                    heapq.heappush(heap, (nc, b))
+        return PathTree(self, x, y, penalty, cost, length, prev)
+
+def layout_key(sites):
+    half = [(x, y, r) for x, y, r in sites if (x, y) < (FIELD_WIDTH-x, FIELD_HEIGHT-y)]
+    plain = sorted(half)
+    flipped = sorted((x, FIELD_HEIGHT-y, r) for x, y, r in half)
+    if flipped < plain:
+        return tuple(flipped), True
+    return tuple(plain), False
+
+def frame_point(x, y, mirrored, flipped):
+    if mirrored:
+        x = FIELD_WIDTH-x
+        y = FIELD_HEIGHT-y
+    if flipped:
+        y = FIELD_HEIGHT-y
+    return x, y
+
+def layout_distance(key, other):
+    if len(key) != len(other):
+        return math.inf
+    total = 0
+    for x, y, r in key:
+        total += min(math.sqrt((x-ox)**2+(y-oy)**2)+abs(r-oradius) for ox, oy, oradius in other)
+    return total/len(key) if key else 0
+
+class OpeningBook:
+
+    def __init__(self, blob='', entries=None):
+        self.blob = blob
+        self.entries = entries
+        self.by_key = None
+
+    def decode(self):
+        if self.entries is None:
+            self.entries = json.loads(zlib.decompress(base64.b64decode(self.blob))) if self.blob else []
+        self.by_key = {}
+        for entry in self.entries:
+            entry['key'] = tuple(tuple(site) for site in entry['key'])
+            self.by_key[entry['key']] = entry
+
+    def lookup(self, key, max_distance=BOOK_MAX_DISTANCE):
+        if self.by_key is None:
+            self.decode()
+        entry = self.by_key.get(key)
+        if entry is not None:
+            return entry
+        best = None
+        best_d = max_distance
+        for entry in self.entries:
+            d = layout_distance(key, entry['key'])
+            if d <= best_d:
+                best = entry
+                best_d = d
+        return best
+
+class OpeningLine:
+
+    def __init__(self, entry, mirrored, flipped):
+        self.moves = entry['moves']
+        self.queen = entry['queen']
+        self.mirrored = mirrored
+        self.flipped = flipped
+        self.diverged = False
+
+    def command(self, strategy):
+        if self.diverged:
+            return None
+        turn = strategy.current_turn-1
+        if turn >= len(self.moves) or strategy.danger > 0:
+            return self.diverge(strategy, 'book ended' if turn >= len(self.moves) else 'danger')
+        queen = strategy.own_side.queen
+        x, y = frame_point(self.queen[2*turn], self.queen[2*turn+1], self.mirrored, self.flipped)
+        if abs(queen.x-x) > BOOK_QUEEN_TOLERANCE or abs(queen.y-y) > BOOK_QUEEN_TOLERANCE:
+            return self.diverge(strategy, 'queen at {0} {1}, expected {2} {3}'.format(queen.x, queen.y, x, y))
+        move = self.moves[turn].split()
+        if move[0] == 'M':
+            x, y = frame_point(int(move[1]), int(move[2]), self.mirrored, self.flipped)
+            return 'MOVE {0} {1}'.format(x, y)
+        elif move[0] == 'B':
+            x, y = frame_point(int(move[1]), int(move[2]), self.mirrored, self.flipped)
+            site_id = min(strategy.site_coords, key=lambda i: (strategy.site_x[i]-x)**2+(strategy.site_y[i]-y)**2)
+            if (strategy.site_x[site_id]-x)**2+(strategy.site_y[site_id]-y)**2 > BOOK_SITE_TOLERANCE**2:
+                return self.diverge(strategy, 'no site near {0} {1}'.format(x, y))
+            table = strategy.site_table
+            if table.structure_type[site_id] == TOWER and table.owner[site_id] == ENEMY:
+                return self.diverge(strategy, 'site {0} is an enemy tower'.format(site_id))
+            return 'BUILD {0} {1}'.format(site_id, move[3])
+        return 'WAIT'
+
+    def diverge(self, strategy, reason):
+        print('leaving book at turn {0}: {1}'.format(strategy.current_turn, reason), file=sys.stderr)
+        self.diverged = True
+        return None
+
 class Strategy:
 
-    def __init__(self, num_sites, site_lines):
+    def __init__(self, num_sites, site_lines, profiler=None, use_numpy=False, lookahead=False,
+                 predict_creeps=False, opening_book=None, plan_economy=False, params=None,
+                 evaluate_builds=False, plan_paths=False, model_enemy=False, schedule_creeps=False,
+                 rollout_pool=None):
         self.num_sites = num_sites
+        self.params = params if params is not None else Params()
+        self.profiler = profiler if profiler is not None else TurnProfiler(enabled=False)
         self.site_coords = {}
         for site_line in site_lines:
             site_id, x, y, radius = [int(j) for j in site_line.split()]
             self.site_coords[site_id] = Site(x, y, radius, site_id)
+        size = max(self.site_coords.keys())+1 if self.site_coords else 0
+        self.site_table = SiteTable(size)
+        self.unit_table = UnitTable()
+        self.unit_grid = UnitGrid(self.unit_table)
+        self.site_x = self.site_table.x
+        self.site_y = self.site_table.y
+        self.site_r = self.site_table.radius
+        for site_id, site in self.site_coords.items():
+            self.site_x[site_id] = site.x
+            self.site_y[site_id] = site.y
+            self.site_r[site_id] = site.radius
+        self.site_distances = [self.distances_from(x, y) for x, y in zip(self.site_x, self.site_y)]
         for site_coord in self.site_coords.values():
-            site_coord.calculate_can_fire_upon(self.site_coords, self.distance)
-        self.own_side = Side(FRIENDLY)
-        self.enemy_side = Side(ENEMY)
-        self.free_sites = []
+            site_coord.calculate_can_fire_upon(self.site_coords, self.site_distances[site_coord.site_id])
+        self.coverage = CoverageIndex(self.site_coords)
+        self.own_side = Side(FRIENDLY, self.site_table, self.unit_table)
+        self.enemy_side = Side(ENEMY, self.site_table, self.unit_table)
+        self.site_analysis = SiteAnalysis(self)
+        self.analyzed_views = [AnalyzedSite(self.site_analysis, site_id, SiteType.EMPTY) for site_id in range(size)]
+        self.site_filter = SiteFilter(self)
+        self.site_type_masks = {}
+        self.array_analysis = ArrayAnalysis(self) if use_numpy and np is not None else None
+        self.lookahead = LookaheadSearch(self, pool=rollout_pool) if lookahead else None
+        self.creep_predictor = CreepPredictor(self.site_x, self.site_y, self.site_r) if predict_creeps else None
+        self.queen_damage = []
+        self.economy = EconomyPlanner() if plan_economy else None
+        self.evaluator = SiteEvaluator(self) if evaluate_builds else None
+        self.paths = PathPlanner(self.site_x, self.site_y, self.site_r) if plan_paths else None
+        self.own_paths = None
+        self.enemy_model = EnemyModel(self) if model_enemy else None
+        self.scheduler = ProductionScheduler(self) if schedule_creeps else None
+        self.layout, self.layout_flipped = layout_key((s.x, s.y, s.radius) for s in self.site_coords.values())
+        self.opening_entry = opening_book.lookup(self.layout) if opening_book is not None else None
+        self.opening = None
+        self.free_sites = set()
         self.for_mining = {}
+        self.site_status = {}
+        self.last_site_values = []
+        self.structure_changes = RingBuffer(HISTORY_CHANGES)
+        self.branch = []
         self.current_turn = 0
 
     def turn(self, queen_status, site_lines, unit_lines):
-
-        self.own_side.clear()
-        self.enemy_side.clear()
-        self.free_sites = []
-        
+        # the line API parses straight into the tables; an unchanged site line is skipped
+        # before it is even split
+        self.profiler.start_turn()
+        gold, touched_site = [int(i) for i in queen_status.split()]
+        self.begin_turn(len(site_lines))
+        last = self.last_site_values
+        for i, line in enumerate(site_lines):
+            if last[i] == line:
+                continue
+            last[i] = line
+            self.update_site(*[int(j) for j in line.split()])
+        for line in unit_lines:
+            self.add_unit(*[int(j) for j in line.split()])
+        return self.decide(gold, touched_site)
+
+    def turn_values(self, gold, touched_site, site_values, unit_values):
+        self.profiler.start_turn()
+        self.begin_turn(len(site_values)//SITE_FIELDS)
+        last = self.last_site_values
+        for n, i in enumerate(range(0, len(site_values), SITE_FIELDS)):
+            values = site_values[i:i+SITE_FIELDS]
+            if last[n] == values:
+                continue
+            last[n] = values
+            self.update_site(*values)
+        for i in range(0, len(unit_values), UNIT_FIELDS):
+            self.add_unit(*unit_values[i:i+UNIT_FIELDS])
+        return self.decide(gold, touched_site)
+
+    def begin_turn(self, num_sites):
+        self.branch = []
+        self.unit_table.clear()
+        self.own_side.clear_units()
+        self.enemy_side.clear_units()
         self.current_turn = self.current_turn + 1
-
-        for site_line in site_lines:
-            self.parse_site_line(site_line)
-
-        self.own_side.owned_gold, self.own_side.touched_site = [int(i) for i in queen_status.split()]
-
-        for unit_line in unit_lines:
-            self.parse_unit_line(unit_line)
+        # one entry per site: the raw line or the value slice it was last updated from
+        if len(self.last_site_values) != num_sites:
+            self.last_site_values = [None]*num_sites
+
+    def decide(self, gold, touched_site):
+        self.own_side.owned_gold = gold
+        self.own_side.touched_site = touched_site
+        self.unit_grid.rebuild()
+        if self.enemy_model is not None:
+            self.enemy_model.observe()
+        self.profiler.mark('parse')
 
         result = ['', '']
 
         analyzed_d = self.analyze_sites()
         analyzed = list(analyzed_d.values())
+        if self.evaluator is not None:
+            self.evaluator.evaluate(analyzed)
+        self.profiler.mark('analyze')
         
-        self.danger = self.enemy_knights_danger(self.distance)
+        self.danger = self.enemy_knights_danger()
+        self.profiler.mark('danger')
+
+        if self.profiler.near_deadline():
+            print('deadline, waiting', file=sys.stderr)
+            self.branch.append('deadline')
+            self.profiler.end_turn(guarded=True)
+            return ['WAIT', 'TRAIN']
         
-        if self.current_turn < 40:
+        book_command = self.opening_move()
+        if book_command is not None:
+            print('book {0}'.format(self.current_turn), file=sys.stderr)
+            self.branch.append('book')
+            result[0] = book_command
+        elif self.current_turn < self.params.debut_turns:
             print('debut {0}'.format(self.current_turn), file=sys.stderr)
-            if self.own_side.queen.hp < 30 and len(self.own_side.knight_barracks) == 0 and not self.no_money():
+            self.branch.append('debut')
+            if self.own_side.queen.hp < self.params.debut_low_hp and len(self.own_side.knight_barracks) == 0 and not self.no_money():
                 result[0] = self.build_barracks(analyzed, bold=False)
             elif self.danger > 0:
                 if self.danger < self.own_side.queen.hp:
                     result[0] = self.push_towers(analyzed)
                 else:
                     result[0] = self.defend(analyzed)
-            elif self.own_income() > 6 and len(self.own_side.knight_barracks) == 0:
+            elif self.barracks_due(analyzed) and len(self.own_side.knight_barracks) == 0:
                 result[0] = self.build_barracks(analyzed, bold=False)
             else:
                 result[0] = self.earn_money(analyzed)
         elif self.danger > 0:
             print('dangerous', file=sys.stderr)
+            self.branch.append('dangerous')
             if not self.no_money(1) and self.no_barracks() and self.own_side.queen.hp > self.danger:
                 result[0] = self.build_barracks(analyzed, bold=True)
             else:
@@ -272,12 +2425,14 @@ class Strategy:
                 result[0] = self.defend(analyzed)
         elif self.enemy_have_knights() or self.enemy_training_knights():
             print('pushing', file=sys.stderr)
+            self.branch.append('pushing')
             result[0] = self.push_towers(analyzed)
         elif self.enemy_queen_far(self.distance):
             print('enemy far', file=sys.stderr)
+            self.branch.append('enemy_far')
             if self.no_money(1):
                 result[0] = self.push_mines(analyzed)
-            elif self.no_barracks():
+            elif self.barracks_wanted():
                 result[0] = self.build_barracks(analyzed)
             elif self.enough_towers():
                 result[0] = self.earn_money(analyzed)
@@ -285,70 +2440,111 @@ class Strategy:
                 result[0] = self.push_mines(analyzed)
         elif self.enemy_queen_too_close(self.distance):
             print('enemy too close', file=sys.stderr)
+            self.branch.append('enemy_close')
             result[0] = self.defend(analyzed)
         else:
             print('doing something', file=sys.stderr)
+            self.branch.append('other')
             if self.enough_towers():
                 if self.no_money():
                     result[0] = self.earn_money(analyzed)
-                elif self.no_barracks():
+                elif self.barracks_wanted():
                     result[0] = self.build_barracks(analyzed)
                 else:
                     result[0] = self.earn_money(analyzed)
             else:
                 result[0] = self.push_towers(analyzed)
+        self.profiler.mark('decision')
+
+        if self.lookahead is not None and not self.profiler.near_deadline():
+            result[0] = self.lookahead.choose(self, analyzed, result[0])
+            print('search depth {0} nodes {1}'.format(self.lookahead.depth, self.lookahead.nodes), file=sys.stderr)
+        self.profiler.mark('search')
 
         if self.enemy_queen_far(self.distance):
-            need_packs = 1
+            need_packs = self.params.far_packs
         else:
-            need_packs = 1
-        if self.able_to_train_knights(need_packs):
+            need_packs = self.params.near_packs
+        if self.scheduler is not None:
+            result[1] = self.scheduler.train_command()
+        elif self.able_to_train_knights(need_packs):
             # own_knight_barracks = list(self.own_side.knight_barracks.values())
             barracks = self.get_knight_barracks(analyzed_d)
             result[1] = 'TRAIN {0}'.format(barracks)
         else:
             result[1] = 'TRAIN'
+        self.profiler.mark('train')
+        self.profiler.end_turn()
 
         return result
 
-    def enemy_knights_danger(self, distance_func):
+    def opening_move(self):
+        if self.opening_entry is None:
+            return None
+        if self.opening is None:
+            self.opening = OpeningLine(self.opening_entry, self.own_side.queen.x > FIELD_WIDTH/2, self.layout_flipped)
+        return self.opening.command(self)
+
+    def enemy_knights_danger(self):
+        if self.creep_predictor is not None:
+            queen = self.own_side.queen
+            towers = self.own_side.towers
+            self.queen_damage = self.creep_predictor.predict(
+                self.enemy_side.knights, [towers[i] for i in sorted(towers)], queen.x, queen.y)
+            return sum(self.queen_damage)
         result = 0
+        x2 = self.own_side.queen.x
+        y2 = self.own_side.queen.y
         for knight in self.enemy_side.knights:
-            x1 = knight.x
-            y1 = knight.y
-            x2 = self.own_side.queen.x
-            y2 = self.own_side.queen.y
-            eta = distance_func(x1, y1, x2, y2) / KNIGHT_SPEED
+            eta = ((knight.x-x2)**2+(knight.y-y2)**2)**0.5 / KNIGHT_SPEED
             result = result + knight.hp-eta
         return result  
         
+    def economy_plan(self, analyzed):
+        me = self.own_side
+        mines = tuple((site_id, mine.income, mine.max_size, self.for_mining[site_id])
+                      for site_id, mine in sorted(me.mines.items()))
+        touched = self.mine_touched(analyzed)
+        cooldowns = [me.knight_barracks[site_id].build_progress for site_id in sorted(me.knight_barracks)]
+        barracks_eta = 0
+        if not cooldowns:
+            targets = self.filter_for_barracks(analyzed)
+            if len(targets) == 0:
+                barracks_eta = self.economy.horizon
+            else:
+                barracks_eta = int(min(site.own_eta for site in targets))+1
+        return self.economy.get(self.current_turn, me.owned_gold, mines, touched, cooldowns, barracks_eta)
+
+    def barracks_due(self, analyzed):
+        if self.economy is None:
+            return self.own_income() > self.params.debut_income
+        plan = self.economy_plan(analyzed)
+        return plan.packs > 0 and plan.upgrades_left(self.current_turn) == 0
+
     def own_income(self):
         result = 0
         for m in self.own_side.mines.values():
             result = result+m.income
         return result
 
-    def enemy_queen_far(self, distance_func):
+    def enemy_queen_distance(self, distance_func):
         own_x = self.own_side.queen.x
         own_y = self.own_side.queen.y
-        enemy_x = self.enemy_side.queen.x
-        enemy_y = self.enemy_side.queen.y
-        d = distance_func(own_x, own_y, enemy_x, enemy_y)
-        return d > 600
+        if self.enemy_model is not None:
+            return self.enemy_model.queen_distance(own_x, own_y)
+        return distance_func(own_x, own_y, self.enemy_side.queen.x, self.enemy_side.queen.y)
+
+    def enemy_queen_far(self, distance_func):
+        return self.enemy_queen_distance(distance_func) > self.params.queen_far
 
     def enemy_queen_too_close(self, distance_func):
-        own_x = self.own_side.queen.x
-        own_y = self.own_side.queen.y
-        enemy_x = self.enemy_side.queen.x
-        enemy_y = self.enemy_side.queen.y
-        d = distance_func(own_x, own_y, enemy_x, enemy_y)
-        return d < 300
+        return self.enemy_queen_distance(distance_func) < self.params.queen_close
 
     def enemy_have_knights(self):
         return len(self.enemy_side.knights) > 0
         
     def enemy_training_knights(self):
-        for k, v in self.enemy_side.knight_barracks.items():
+        for k, v in self.enemy_side.barracks.items():
             if v.build_progress != 0:
                 return True
         else:
@@ -358,53 +2554,78 @@ class Strategy:
         return len(self.own_side.knight_barracks) > 0 and self.own_side.owned_gold >= KNIGHT_COST*n
 
     def enough_towers(self):
-        return len(self.own_side.towers) >= 4
+        towers = self.params.enough_towers
+        if self.enemy_model is not None:
+            # a rusher gets one more tower, a turtle one less
+            if self.enemy_model.archetype == Archetype.RUSH:
+                towers += 1
+            elif self.enemy_model.archetype == Archetype.TURTLE:
+                towers -= 1
+        return len(self.own_side.towers) >= towers
 
     def no_barracks(self):
         return len(self.own_side.knight_barracks) == 0
         
+    def barracks_wanted(self):
+        if self.scheduler is not None:
+            return self.scheduler.wanted_barracks() is not None
+        return self.no_barracks()
+
+    def barracks_kind(self):
+        kind = KNIGHT_BARRACKS
+        if self.scheduler is not None:
+            kind = self.scheduler.wanted_barracks()
+        return CREEP_TYPES[KNIGHT_BARRACKS if kind is None else kind][3]
+
     def no_money(self, n=1):
         return self.own_side.owned_gold < KNIGHT_COST*n
 
     def defend(self, analyzed):
         print('defend', file=sys.stderr)
-        if self.own_side.queen.hp > 50:
+        self.branch.append('defend')
+        if self.own_side.queen.hp > self.params.defend_hp:
             targets = self.filter_danger(analyzed)
         else:
             targets = self.filter_emergency(analyzed)
         if len(targets) == 0:
-            targets = self.filter_emergency(analyzed, 400)
+            targets = self.filter_emergency(analyzed, self.params.emergency_tower_hp)
             if len(targets) == 0:
                 vx = self.own_side.queen.x-self.enemy_side.queen.x
                 vy = self.own_side.queen.y-self.enemy_side.queen.y
                 tx = int(self.own_side.queen.x+vx)
                 ty = int(self.own_side.queen.y+vy)                            
-                return 'MOVE {0} {1}'.format(tx, ty)
-        closest = self.sort_by(targets, lambda x: x.own_eta)
-        safest = self.sort_by(closest[0:2], lambda x: -x.enemy_base_distance)
+                return self.move_command(tx, ty)
+        closest = self.top_k(targets, lambda x: x.own_eta, 2)
+        safest = self.sort_by(closest, lambda x: -x.enemy_base_distance)
         target_id = self.be_bold(safest)
         return self.move_to_tower_defencively(target_id)
         # return 'BUILD {0} TOWER'.format(target_id)
 
     def build_barracks(self, analyzed, bold=False):
         print('barracks {0}'.format(bold), file=sys.stderr)
+        self.branch.append('build_barracks')
         targets = self.filter_for_barracks(analyzed)
         if len(targets) == 0:
             return self.push_towers(analyzed)
-        closest = self.sort_by(targets, lambda x: x.own_eta)
-        to_build = self.sort_by(closest[0:2], lambda x: x.enemy_base_distance)
+        if self.evaluator is not None:
+            return 'BUILD {0} {1}'.format(self.evaluator.best(targets, lambda x: x.barrack_value), self.barracks_kind())
+        closest = self.top_k(targets, lambda x: x.own_eta, 2)
+        to_build = self.sort_by(closest, lambda x: x.enemy_base_distance)
         if bold:
             target_id = self.be_bold(to_build)
         else:
             target_id = to_build[0].site_id
-        return 'BUILD {0} BARRACKS-KNIGHT'.format(target_id)
+        return 'BUILD {0} {1}'.format(target_id, self.barracks_kind())
 
     def push_towers(self, analyzed):
+        self.branch.append('push_towers')
         targets = self.filter_empty(analyzed)
         if len(targets) == 0:
             return 'WAIT'
-        closest = self.sort_by(targets, lambda x: x.own_eta)
-        to_build = self.sort_by(closest[0:2], lambda x: x.enemy_base_distance)
+        if self.evaluator is not None:
+            return 'BUILD {0} TOWER'.format(self.evaluator.best(targets, lambda x: x.tower_value))
+        closest = self.top_k(targets, lambda x: x.own_eta, 2)
+        to_build = self.sort_by(closest, lambda x: x.enemy_base_distance)
         target_id = self.be_bold(to_build)
         return 'BUILD {0} TOWER'.format(target_id)
 
@@ -412,16 +2633,19 @@ class Strategy:
         targets = self.filter_empty(analyzed)
         if len(targets) == 0:
             return 'WAIT'
-        closest = self.sort_by(targets, lambda x: x.own_eta)
-        to_build = self.sort_by(closest[0:3], lambda x: x.enemy_base_distance)
+        closest = self.top_k(targets, lambda x: x.own_eta, 3)
+        to_build = self.sort_by(closest, lambda x: x.enemy_base_distance)
         return 'BUILD {0} TOWER'.format(to_build[0].site_id)
 
     def push_mines(self, analyzed):
+        self.branch.append('push_mines')
         targets = self.filter_for_money(analyzed)
         if len(targets) == 0:
             return self.push_towers(analyzed)
-        closest = self.sort_by(targets, lambda x: x.own_eta)
-        to_build = self.sort_by(closest[0:2], lambda x: x.enemy_base_distance)
+        if self.evaluator is not None:
+            return self.move_to_mine(self.evaluator.best(targets, lambda x: x.mine_value))
+        closest = self.top_k(targets, lambda x: x.own_eta, 2)
+        to_build = self.sort_by(closest, lambda x: x.enemy_base_distance)
         target_id = self.be_bold(to_build)        
         # return 'BUILD {0} MINE'.format(target_id)
         return self.move_to_mine(target_id)
@@ -430,11 +2654,12 @@ class Strategy:
         targets = self.filter_for_money(analyzed)
         if len(targets) == 0:
             return self.push_towers_aggresively(analyzed)
-        closest = self.sort_by(targets, lambda x: x.own_eta)
-        to_build = self.sort_by(closest[0:3], lambda x: x.enemy_base_distance)
+        closest = self.top_k(targets, lambda x: x.own_eta, 3)
+        to_build = self.sort_by(closest, lambda x: x.enemy_base_distance)
         return 'BUILD {0} MINE'.format(to_build[0].site_id)
     
     def earn_money(self, analyzed):
+        self.branch.append('earn_money')
         touched = self.mine_touched(analyzed)
         if touched != -1:
             if self.mine_upgradable(touched):
@@ -442,8 +2667,8 @@ class Strategy:
         targets = self.filter_for_money(analyzed)
         if len(targets) == 0:
             return self.push_towers(analyzed)
-        closest = self.sort_by(targets, lambda x: x.own_eta)
-        to_build = self.sort_by(closest[0:2], lambda x: -x.enemy_base_distance)
+        closest = self.top_k(targets, lambda x: x.own_eta, 2)
+        to_build = self.sort_by(closest, lambda x: -x.enemy_base_distance)
         # return 'BUILD {0} MINE'.format(to_build[0].site_id)
         return self.move_to_mine(closest[0].site_id)
         
@@ -459,7 +2684,7 @@ class Strategy:
             l = (env_x**2+env_y**2)**0.5
             dx = env_x/l*(site_radius+QUEEN_R)
             dy = env_y/l*(site_radius+QUEEN_R)
-            return 'MOVE {0} {1}'.format(int(site_x+dx), int(site_y+dy))
+            return self.move_command(int(site_x+dx), int(site_y+dy))
 
     def move_to_tower_defencively(self, site_id):
         if self.own_side.touched_site == site_id:
@@ -470,14 +2695,14 @@ class Strategy:
             env_x = self.enemy_x - site_x
             env_y = self.enemy_y - site_y
             l = (env_x**2+env_y**2)**0.5
-            dx = env_x/l*60
-            dy = env_y/l*60
-            return 'MOVE {0} {1}'.format(int(site_x-dx), int(site_y-dy))
+            dx = env_x/l*self.params.defensive_offset
+            dy = env_y/l*self.params.defensive_offset
+            return self.move_command(int(site_x-dx), int(site_y-dy))
 
     def be_bold(self, targets):
         result_id = targets[0].site_id
         for i in range(1, len(targets)):
-            if targets[i].own_eta <= 2:
+            if targets[i].own_eta <= self.params.bold_eta:
                 return targets[i].site_id
         return result_id
 
@@ -497,235 +2722,196 @@ class Strategy:
         return False
     
     def filter_empty(self, analyzed_sites):
-        buildable = []
-        for site in analyzed_sites:
-            if site.site_type == SiteType.ENEMY_TOWER:
-                continue
-            if len(site.under_fire) > 0 and not site.fire_suppressed:
-                continue
-            if site.own_eta >= site.enemy_eta:
-                continue
-            if site.site_type == SiteType.OWN_MINE:
-                mine = self.own_side.mines[site.site_id]
-                if mine.max_size == mine.income:
-                    continue
-            if site.site_type == SiteType.OWN_BARRACKS:
-                continue
-            if site.site_type == SiteType.OWN_TOWER:
-                tower = self.own_side.towers[site.site_id]
-                if tower.hp > 300:
-                    continue
-            buildable.append(site)
-        return buildable
+        if self.array_analysis is not None:
+            return self.array_analysis.select(analyzed_sites, self.array_analysis.empty_mask())
+        return self.site_filter.select(analyzed_sites, (
+            ('site_type', SiteType.ENEMY_TOWER), ('site_type', SiteType.OWN_BARRACKS), ('mine_full',),
+            ('tower_above', self.params.tower_hp_enough), ('eta_behind', 0), ('exposed',)))
 
     def filter_for_barracks(self, analyzed_sites):
-        buildable = []
-        for site in analyzed_sites:
-            if site.site_type == SiteType.ENEMY_TOWER:
-                continue
-            if len(site.under_fire) > 0 and not site.fire_suppressed:
-                continue
-            if site.own_eta >= (site.enemy_eta-(KNIGHT_TRAIN+1)):
-                continue
-            if site.site_type == SiteType.OWN_BARRACKS:
-                continue
-            if site.site_type == SiteType.OWN_MINE:
-                continue
-            buildable.append(site)
-        return buildable
- 
+        if self.array_analysis is not None:
+            return self.array_analysis.select(analyzed_sites, self.array_analysis.barracks_mask())
+        return self.site_filter.select(analyzed_sites, (
+            ('site_type', SiteType.ENEMY_TOWER), ('site_type', SiteType.OWN_BARRACKS),
+            ('site_type', SiteType.OWN_MINE), ('eta_behind', self.params.barracks_eta_margin), ('exposed',)))
+
     def filter_for_money(self, analyzed_sites):
-        buildable = []
-        for site in analyzed_sites:
-            if site.site_type == SiteType.ENEMY_TOWER:
-                continue
-            if len(site.under_fire) > 0 and not site.fire_suppressed:
-                continue
-            if site.own_eta >= site.enemy_eta:
-                continue
-            if site.site_type == SiteType.OWN_MINE:
-                mine = self.own_side.mines[site.site_id]
-                if mine.max_size == mine.income:
-                    continue
-            if self.for_mining[site.site_id] == 0:
-                continue
-            if site.site_type == SiteType.OWN_BARRACKS:
-                if self.own_side.knight_barracks[site.site_id].build_progress != 0:
-                    continue
-            buildable.append(site)
-        return buildable
+        if self.array_analysis is not None:
+            return self.array_analysis.select(analyzed_sites, self.array_analysis.money_mask())
+        return self.site_filter.select(analyzed_sites, (
+            ('site_type', SiteType.ENEMY_TOWER), ('mine_full',), ('no_gold',), ('barracks_training',),
+            ('eta_behind', 0), ('exposed',)))
 
     def filter_emergency_with_towers(self, analyzed_sites):
-        buildable = []
-        for site in analyzed_sites:
-            if site.site_type == SiteType.ENEMY_TOWER:
-                continue
-            if len(site.under_fire) > 0 and not site.fire_suppressed:
-                continue
-            if site.own_eta >= site.enemy_eta:
-                continue
-            if site.site_type == SiteType.OWN_BARRACKS:
-                if self.own_side.knight_barracks[site.site_id].build_progress != 0:
-                    continue
-            buildable.append(site)
-        return buildable
-
-    def filter_emergency(self, analyzed_sites, tower_hp=300):
-        buildable = []
-        for site in analyzed_sites:
-            if site.site_type == SiteType.ENEMY_TOWER:
-                continue
-            if len(site.under_fire) > 0 and not site.fire_suppressed:
-                continue
-            if site.own_eta >= site.enemy_eta:
-                continue
-            if site.site_type == SiteType.OWN_TOWER:
-                tower = self.own_side.towers[site.site_id]
-                if tower.hp > tower_hp:
-                    continue
-            if site.site_type == SiteType.OWN_BARRACKS:
-                if self.own_side.knight_barracks[site.site_id].build_progress != 0:
-                    continue
-            buildable.append(site)
-        return buildable
+        if self.array_analysis is not None:
+            return self.array_analysis.select(analyzed_sites, self.array_analysis.emergency_with_towers_mask())
+        return self.site_filter.select(analyzed_sites, (
+            ('site_type', SiteType.ENEMY_TOWER), ('barracks_training',), ('eta_behind', 0), ('exposed',)))
+
+    def filter_emergency(self, analyzed_sites, tower_hp=None):
+        if tower_hp is None:
+            tower_hp = self.params.tower_hp_enough
+        if self.array_analysis is not None:
+            return self.array_analysis.select(analyzed_sites, self.array_analysis.emergency_mask(tower_hp))
+        return self.site_filter.select(analyzed_sites, (
+            ('site_type', SiteType.ENEMY_TOWER), ('tower_above', tower_hp), ('barracks_training',),
+            ('eta_behind', 0), ('exposed',)))
 
     def filter_danger(self, analyzed_sites):
-        buildable = []
-        for site in analyzed_sites:
-            if site.site_type == SiteType.ENEMY_TOWER:
-                continue
-            if len(site.under_fire) > 0 and not site.fire_suppressed:
-                continue
-            if site.own_eta >= site.enemy_eta:
-                continue
-            if site.site_type == SiteType.OWN_TOWER:
-                tower = self.own_side.towers[site.site_id]
-                if tower.hp > 300:
-                    continue
-            if site.site_type == SiteType.OWN_MINE:
-                continue
-            if site.site_type == SiteType.OWN_BARRACKS:
-                if self.own_side.knight_barracks[site.site_id].build_progress != 0:
-                    continue
-            buildable.append(site)
-        return buildable
+        if self.array_analysis is not None:
+            return self.array_analysis.select(analyzed_sites, self.array_analysis.danger_mask())
+        return self.site_filter.select(analyzed_sites, (
+            ('site_type', SiteType.ENEMY_TOWER), ('site_type', SiteType.OWN_MINE),
+            ('tower_above', self.params.tower_hp_enough), ('barracks_training',), ('eta_behind', 0), ('exposed',)))
 
     def sort_by(self, sites, sort_func):
         return sorted(sites, key=sort_func)
 
+    def top_k(self, sites, sort_func, k):
+        # same as sort_by(...)[0:k], ties included
+        if len(sites) < TOP_K_SORT:
+            return sorted(sites, key=sort_func)[0:k]
+        return heapq.nsmallest(k, sites, key=sort_func)
+
     def analyze_sites(self):
-        enemy = self.enemy_side
-        me = self.own_side
         result = self.init_analyze()
-        enemy_towers = list(enemy.towers.values())
-        own_units = me.knights+me.archers+me.giants
-        enemy_units = enemy.knights
-        enemy_buildings = list(enemy.mines.values())+list(enemy.towers.values())
-        enemy_buildings += list(enemy.knight_barracks.values())
-        enemy_buildings += list(enemy.archer_barracks.values())
-        enemy_buildings += list(enemy.giant_barracks.values())
-        if len(enemy_buildings) == 0:
+        centroid = self.enemy_side.building_centroid()
+        if centroid is None:
             self.enemy_x = self.enemy_side.queen.x
             self.enemy_y = self.enemy_side.queen.y
         else:
-            enemy_x = 0
-            enemy_y = 0
-            for building in enemy_buildings:
-                enemy_x += self.site_coords[building.site_id].x
-                enemy_y += self.site_coords[building.site_id].y
-            self.enemy_x = enemy_x/len(enemy_buildings)
-            self.enemy_y = enemy_y/len(enemy_buildings)
-        for site_id, enemy_tower in enemy.towers.items():
-            suppressed = self.tower_suppressed(enemy_tower, own_units, self.distance)
-            result[site_id].fire_suppressed = suppressed
-            fired_upon = self.site_coords[site_id].currently_firing_at(enemy_tower.hp)
-            for fired in fired_upon:
-                result[fired].under_fire.append(site_id)
-                result[fired].fire_suppressed = result[fired].fire_suppressed and suppressed
-            
-        for site in result.values():
-            for enemy_tower in enemy_towers:
-                if site.site_id == enemy_tower.site_id:
-                    site.under_fire = [site.site_id]
-                    continue
-            site.own_eta = self.queen_eta(self.own_side.queen, site, self.distance)
-            site.enemy_eta = self.queen_eta(self.enemy_side.queen, site, self.distance)
-            site.enemy_base_distance = self.enemy_base_distance(site, self.distance)
+            self.enemy_x, self.enemy_y = centroid
+        self.site_analysis.begin()
+        if self.array_analysis is not None:
+            self.site_analysis.filled(self.analyzed_views)
+            self.array_analysis.analyze(result)
+        self.route_queens()
         return result
-            
+
+    def site_categories(self):
+        me = self.own_side
+        enemy = self.enemy_side
+        return [
+            (me.towers, SiteType.OWN_TOWER),
+            (enemy.towers, SiteType.ENEMY_TOWER),
+            (me.mines, SiteType.OWN_MINE),
+            (enemy.mines, SiteType.ENEMY_MINE),
+            (me.knight_barracks, SiteType.OWN_BARRACKS),
+            (me.archer_barracks, SiteType.OWN_BARRACKS),
+            (me.giant_barracks, SiteType.OWN_BARRACKS),
+            (enemy.knight_barracks, SiteType.ENEMY_BARRACKS),
+            (enemy.archer_barracks, SiteType.ENEMY_BARRACKS),
+            (enemy.giant_barracks, SiteType.ENEMY_BARRACKS),
+            (self.free_sites, SiteType.EMPTY),
+        ]
+
     def init_analyze(self):
-        result = {} 
-        for site_id, tower in self.own_side.towers.items():
-            result[site_id] = AnalyzedSite(site_id, SiteType.OWN_TOWER)
-        for site_id, tower in self.enemy_side.towers.items():
-            result[site_id] = AnalyzedSite(site_id, SiteType.ENEMY_TOWER)
-        for site_id, mine in self.own_side.mines.items():
-            result[site_id] = AnalyzedSite(site_id, SiteType.OWN_MINE)
-        for site_id, mine in self.enemy_side.mines.items():
-            result[site_id] = AnalyzedSite(site_id, SiteType.ENEMY_MINE)
-        barracks = self.own_side.knight_barracks
-        barracks.update(self.own_side.archer_barracks)
-        barracks.update(self.own_side.giant_barracks)
-        for site_id, barrack in barracks.items():
-            result[site_id] = AnalyzedSite(site_id, SiteType.OWN_BARRACKS)
-        barracks = self.enemy_side.knight_barracks
-        barracks.update(self.enemy_side.archer_barracks)
-        barracks.update(self.enemy_side.giant_barracks)
-        for site_id, barracks in barracks.items():
-            result[site_id] = AnalyzedSite(barracks.site_id, SiteType.ENEMY_BARRACKS)
-        for empty_site in self.free_sites:
-            result[empty_site] = AnalyzedSite(empty_site, SiteType.EMPTY)
+        result = {}
+        type_masks = {}
+        for site_ids, site_type in self.site_categories():
+            mask = type_masks.get(site_type, 0)
+            for site_id in sorted(site_ids):
+                view = self.analyzed_views[site_id]
+                view.reset(site_type)
+                result[site_id] = view
+                mask |= 1 << site_id
+            type_masks[site_type] = mask
+        self.site_type_masks = type_masks
         return result
 
-    def tower_suppressed(self, tower, units, distance_func):
-        tower_x = self.site_coords[tower.site_id].x
-        tower_y = self.site_coords[tower.site_id].y
-        for unit in units:
-            d = distance_func(tower_x, tower_y, unit.x, unit.y)
-            if d < tower.attack_radius:
-                return True
-        return False 
-
-    def site_under_fire(self, site, tower, distance_func):
-        tower_x = self.site_coords[tower.site_id].x
-        tower_y = self.site_coords[tower.site_id].y
-        site_x = self.site_coords[site.site_id].x
-        site_y = self.site_coords[site.site_id].y
-        return distance_func(tower_x, tower_y, site_x, site_y) < tower.attack_radius
-
-    def queen_eta(self, queen, site, distance_func):
-        site_x = self.site_coords[site.site_id].x
-        site_y = self.site_coords[site.site_id].y
-        site_r = self.site_coords[site.site_id].radius
-        return (distance_func(queen.x, queen.y, site_x, site_y)-site_r)/QUEEN_SPEED
-
-    def enemy_base_distance(self, site, distance_func):
-        site_x = self.site_coords[site.site_id].x
-        site_y = self.site_coords[site.site_id].y
-        return distance_func(self.enemy_x, self.enemy_y, site_x, site_y)
+    def route_queens(self):
+        if self.paths is None:
+            return
+        me = self.own_side
+        enemy = self.enemy_side
+        table = self.site_table
+        own_towers = [(self.site_x[i], self.site_y[i], t.attack_radius) for i, t in me.towers.items()]
+        enemy_towers = [(self.site_x[i], self.site_y[i], t.attack_radius) for i, t in enemy.towers.items()]
+        self.own_paths = self.paths.search(me.queen.x, me.queen.y, enemy_towers)
+        table.own_eta = self.own_paths.site_etas()
+        table.enemy_eta = self.paths.search(enemy.queen.x, enemy.queen.y, own_towers).site_etas()
+        self.site_analysis.etas_filled()
+        if self.array_analysis is not None:
+            self.array_analysis.own_eta = np.array(table.own_eta)
+            self.array_analysis.enemy_eta = np.array(table.enemy_eta)
+
+    def move_command(self, x, y):
+        if self.own_paths is not None:
+            x, y = self.own_paths.waypoint(x, y)
+        return 'MOVE {0} {1}'.format(x, y)
+
+    def tower_suppressed(self, tower):
+        return self.unit_grid.any_within(self.site_x[tower.site_id], self.site_y[tower.site_id],
+                                         tower.attack_radius, FRIENDLY_UNIT)
+
+    def queen_etas(self, queen_distances):
+        return [(d-site_r)/QUEEN_SPEED for d, site_r in zip(queen_distances, self.site_r)]
+
+    def distances_from(self, x, y):
+        # sqrt and plain products round the same way as the numpy engine
+        return [math.sqrt((x-site_x)*(x-site_x)+(y-site_y)*(y-site_y))
+                for site_x, site_y in zip(self.site_x, self.site_y)]
 
     def distance(self, x1, y1, x2, y2):
         return ((x1-x2)**2+(y1-y2)**2)**0.5
 
     def parse_site_line(self, site_line):
         site_id, gold, max_mine_size, structure_type, owner, param_1, param_2 = [int(j) for j in site_line.split()]
+        self.update_site(site_id, gold, max_mine_size, structure_type, owner, param_1, param_2)
+
+    def side_of(self, owner):
+        if owner == FRIENDLY:
+            return self.own_side
+        return self.enemy_side
+
+    def update_site(self, site_id, gold, max_mine_size, structure_type, owner, param_1, param_2):
         self.for_mining[site_id] = gold
-        if structure_type == NO_STRUCTURE:
-            self.free_sites.append(site_id)
+        table = self.site_table
+        status = self.site_status.get(site_id)
+        if status is None:
+            status = SiteStatus(table, site_id)
+            self.site_status[site_id] = status
+            self.free_sites.add(site_id)
+        if status.same_structure(structure_type, owner, param_2):
+            table.gold[site_id] = gold
+            table.max_mine_size[site_id] = max_mine_size
+            table.param_1[site_id] = param_1
+            table.param_2[site_id] = param_2
+            if structure_type == TOWER:
+                self.coverage.set_tower(site_id, owner, param_1)
+            return
+        old_type = table.structure_type[site_id]
+        old_owner = table.owner[site_id]
+        self.structure_changes.append(StructureChange(
+            self.current_turn, site_id, old_type, old_owner, structure_type, owner))
+        if old_type == NO_STRUCTURE:
+            self.free_sites.discard(site_id)
         else:
-            if owner == FRIENDLY:
-                side = self.own_side
-            else:
-                side = self.enemy_side
-            if structure_type == GOLDMINE:
-                side.add_mine(site_id, gold, max_mine_size, param_1)
-            elif structure_type == BARRACKS:
-                side.add_barracks(site_id, param_1, param_2)
-            elif structure_type == TOWER:
-                side.add_tower(site_id, param_1, param_2)
+            self.side_of(old_owner).remove_structure(site_id)
+        if old_type == TOWER:
+            self.coverage.remove_tower(site_id)
+        table.gold[site_id] = gold
+        table.max_mine_size[site_id] = max_mine_size
+        if structure_type == NO_STRUCTURE:
+            table.structure_type[site_id] = NO_STRUCTURE
+            table.owner[site_id] = NO_OWNER
+            table.param_1[site_id] = param_1
+            table.param_2[site_id] = param_2
+            self.free_sites.add(site_id)
+            return
+        side = self.side_of(owner)
+        if structure_type == GOLDMINE:
+            side.add_mine(site_id, gold, max_mine_size, param_1)
+        elif structure_type == BARRACKS:
+            side.add_barracks(site_id, param_1, param_2)
+        elif structure_type == TOWER:
+            side.add_tower(site_id, param_1, param_2)
+            self.coverage.set_tower(site_id, owner, param_1)
 
     def parse_unit_line(self, unit_line):
-        x, y, owner, unit_type, health = [int(j) for j in unit_line.split()]
+        self.add_unit(*[int(j) for j in unit_line.split()])
+
+    def add_unit(self, x, y, owner, unit_type, health):
         if owner == FRIENDLY_UNIT:
             side = self.own_side
         else:
@@ -740,7 +2926,8 @@ class Strategy:
             side.add_giant(x, y, health)
 
     def get_knight_barracks(self, analyzed):
-        barracks = list(self.own_side.knight_barracks.values())
+        knight_barracks = self.own_side.knight_barracks
+        barracks = [knight_barracks[site_id] for site_id in sorted(knight_barracks)]
         barracks = sorted(barracks, 
         key=lambda x: 
             (analyzed[x.site_id].enemy_eta > KNIGHT_TRAIN+1) * (-analyzed[x.site_id].enemy_eta))
@@ -748,22 +2935,30 @@ class Strategy:
         return barracks[0].site_id
 
 
-num_sites = int(input())
-sites_lines = []
-for i in range(num_sites):
-    sites_lines.append(input())
-
-strategy = Strategy(num_sites, sites_lines)
-
-while True:
-    queen_status = input()
-    site_lines = []
-    for i in range(num_sites):
-        site_lines.append(input())
-    num_units = int(input())
-    unit_lines = []
-    for i in range(num_units):
-        unit_lines.append(input())
-    command = strategy.turn(queen_status, site_lines, unit_lines)
-    print('\n'.join(command))
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'batch':
+        # the dataset export is an offline tool, only loaded when asked for
+        import batch
+        sys.exit(batch.main(sys.argv[2:]))
+
+    reader = TurnReader(sys.stdin.fileno())
+    num_sites, sites_lines = reader.read_init()
+
+    strategy = Strategy(num_sites, sites_lines, TurnProfiler(guard=True), opening_book=OpeningBook(OPENING_BOOK))
+
+    recorder = None
+    if len(sys.argv) > 2 and sys.argv[1] == '--record':
+        recorder = ReplayRecorder(open(sys.argv[2], 'w'))
+        recorder.record_init(num_sites, sites_lines, (REPLAY_BOOK,))
+
+    while True:
+        reader.wait()
+        strategy.profiler.start_turn()
+        reader.read_turn(num_sites)
+        command = strategy.turn_values(reader.gold, reader.touched_site, reader.site_values, reader.unit_values)
+        print('\n'.join(command), flush=True)
+        if recorder is not None:
+            recorder.record_values(reader.gold, reader.touched_site, reader.site_values, reader.unit_values, command)
+        if strategy.profiler.turns % 50 == 0:
+            print(strategy.profiler.summary(), file=sys.stderr)
 
@@ -0,0 +1,744 @@
+import argparse
+import ast
+import contextlib
+import importlib.util
+import io
+import math
+import os
+import random
+import sys
+import time
+
+import llq
+from llq import (
+    FIELD_WIDTH, FIELD_HEIGHT, QUEEN_R, QUEEN_SPEED,
+    TOWER_MAX_HP, TOWER_START_HP, TOWER_UP_PER_TURN, CREEP_AGING,
+    KNIGHT_COST, KNIGHT_SPEED, KNIGHT_SQUAD, KNIGHT_HEALTH, KNIGHT_TRAIN,
+    ARCHER_COST, ARCHER_SPEED, ARCHER_SQUAD, ARCHER_HEALTH, ARCHER_TRAIN,
+    GIANT_COST, GIANT_SPEED, GIANT_SQUAD, GIANT_HEALTH, GIANT_TRAIN,
+    NO_STRUCTURE, GOLDMINE, TOWER, BARRACKS, NO_OWNER,
+    KNIGHT_BARRACKS, ARCHER_BARRACKS, GIANT_BARRACKS,
+    QUEEN, KNIGHT, ARCHER, GIANT,
+)
+
+MAX_TURNS = 200
+STARTING_GOLD = 100
+
+QUEEN_HP_RANGE = (5, 20)
+QUEEN_HP_MULT = 5
+QUEEN_MASS = 10000
+QUEEN_VISION = 300
+
+TOUCH_DISTANCE = 5
+
+SITE_PAIRS_RANGE = (6, 12)
+SITE_RADIUS_RANGE = (60, 90)
+SITE_GAP = 60
+SITE_GOLD_RANGE = (200, 250)
+SITE_MINE_SIZE_RANGE = (1, 3)
+SITE_GOLD_BONUS = 50
+SITE_BONUS_DISTANCE_1 = 500
+SITE_BONUS_DISTANCE_2 = 200
+
+TOWER_MELT_RATE = 4
+TOWER_COVERAGE_PER_HP = 1000
+TOWER_CREEP_DAMAGE_MIN = 3
+TOWER_QUEEN_DAMAGE_MIN = 1
+TOWER_DAMAGE_CLIMB_DISTANCE = 200
+
+KNIGHT_DAMAGE = 1
+ARCHER_DAMAGE = 2
+ARCHER_DAMAGE_TO_GIANTS = 10
+ARCHER_RANGE = 200
+GIANT_BUST_RATE = 80
+
+COLLISION_ITERATIONS = 5
+
+# unit_type: (radius, mass, speed)
+UNIT_STATS = {
+    QUEEN: (QUEEN_R, QUEEN_MASS, QUEEN_SPEED),
+    KNIGHT: (20, 400, KNIGHT_SPEED),
+    ARCHER: (25, 900, ARCHER_SPEED),
+    GIANT: (40, 2000, GIANT_SPEED),
+}
+
+# creep_type: (unit_type, cost, squad, health, train turns)
+CREEP_STATS = {
+    KNIGHT_BARRACKS: (KNIGHT, KNIGHT_COST, KNIGHT_SQUAD, KNIGHT_HEALTH, KNIGHT_TRAIN),
+    ARCHER_BARRACKS: (ARCHER, ARCHER_COST, ARCHER_SQUAD, ARCHER_HEALTH, ARCHER_TRAIN),
+    GIANT_BARRACKS: (GIANT, GIANT_COST, GIANT_SQUAD, GIANT_HEALTH, GIANT_TRAIN),
+}
+
+BUILD_TYPES = {
+    'MINE': (GOLDMINE, -1),
+    'TOWER': (TOWER, -1),
+    'BARRACKS-KNIGHT': (BARRACKS, KNIGHT_BARRACKS),
+    'BARRACKS-ARCHER': (BARRACKS, ARCHER_BARRACKS),
+    'BARRACKS-GIANT': (BARRACKS, GIANT_BARRACKS),
+}
+
+
+class CommandError(Exception):
+    pass
+
+
+class RefSite:
+    def __init__(self, site_id, x, y, radius, gold, max_mine_size):
+        self.site_id = site_id
+        self.x = x
+        self.y = y
+        self.radius = radius
+        self.gold = gold
+        self.max_mine_size = max_mine_size
+        self.clear_structure()
+
+    def clear_structure(self):
+        self.structure_type = NO_STRUCTURE
+        self.owner = NO_OWNER
+        self.income = 0
+        self.tower_hp = 0
+        self.creep_type = -1
+        self.train_left = 0
+
+    def copy(self):
+        return RefSite(self.site_id, self.x, self.y, self.radius, self.gold, self.max_mine_size)
+
+    def attack_radius(self):
+        area = math.pi*self.radius**2
+        return int(((self.tower_hp*TOWER_COVERAGE_PER_HP+area)/math.pi)**0.5)
+
+    def params(self):
+        if self.structure_type == GOLDMINE:
+            return self.income, -1
+        elif self.structure_type == TOWER:
+            return self.tower_hp, self.attack_radius()
+        elif self.structure_type == BARRACKS:
+            return self.train_left, self.creep_type
+        return -1, -1
+
+
+class RefUnit:
+    def __init__(self, x, y, owner, unit_type, hp):
+        self.x = float(x)
+        self.y = float(y)
+        self.owner = owner
+        self.unit_type = unit_type
+        self.hp = hp
+        self.radius, self.mass, self.speed = UNIT_STATS[unit_type]
+
+
+class GameMap:
+    def __init__(self, seed, sites, queen_starts, queen_hp):
+        self.seed = seed
+        self.sites = sites
+        self.queen_starts = queen_starts
+        self.queen_hp = queen_hp
+
+    def site_lines(self):
+        return ['{0} {1} {2} {3}'.format(s.site_id, s.x, s.y, s.radius) for s in self.sites]
+
+
+class GameResult:
+    def __init__(self, seed, winner, turns, queen_hp, errors):
+        self.seed = seed
+        self.winner = winner
+        self.turns = turns
+        self.queen_hp = queen_hp
+        self.errors = errors
+
+    def swapped(self):
+        winner = self.winner if self.winner == -1 else 1-self.winner
+        return GameResult(self.seed, winner, self.turns,
+                          tuple(reversed(self.queen_hp)), list(reversed(self.errors)))
+
+
+def distance(x1, y1, x2, y2):
+    return ((x1-x2)**2+(y1-y2)**2)**0.5
+
+
+def generate_map(seed):
+    rng = random.Random(seed)
+    pairs = rng.randint(*SITE_PAIRS_RANGE)
+    placed = []
+    attempts = 0
+    while len(placed) < pairs and attempts < 2000:
+        attempts += 1
+        radius = rng.randint(*SITE_RADIUS_RANGE)
+        x = rng.randint(radius, FIELD_WIDTH-radius)
+        y = rng.randint(radius, FIELD_HEIGHT-radius)
+        mx, my = FIELD_WIDTH-x, FIELD_HEIGHT-y
+        if distance(x, y, mx, my) < 2*radius+SITE_GAP:
+            continue
+        fits = True
+        for ox, oy, oradius in placed:
+            for px, py in ((ox, oy), (FIELD_WIDTH-ox, FIELD_HEIGHT-oy)):
+                if distance(x, y, px, py) < radius+oradius+SITE_GAP:
+                    fits = False
+            if not fits:
+                break
+        if fits:
+            placed.append((x, y, radius))
+    sites = []
+    center_x, center_y = FIELD_WIDTH/2, FIELD_HEIGHT/2
+    for x, y, radius in placed:
+        gold = rng.randint(*SITE_GOLD_RANGE)
+        max_mine_size = rng.randint(*SITE_MINE_SIZE_RANGE)
+        d = distance(x, y, center_x, center_y)
+        if d < SITE_BONUS_DISTANCE_1:
+            gold += SITE_GOLD_BONUS
+            max_mine_size += 1
+        if d < SITE_BONUS_DISTANCE_2:
+            gold += SITE_GOLD_BONUS
+        for px, py in ((x, y), (FIELD_WIDTH-x, FIELD_HEIGHT-y)):
+            sites.append(RefSite(len(sites), px, py, radius, gold, max_mine_size))
+    qx = rng.randint(QUEEN_R, 200)
+    qy = rng.randint(QUEEN_R, FIELD_HEIGHT-QUEEN_R)
+    queen_starts = ((qx, qy), (FIELD_WIDTH-qx, FIELD_HEIGHT-qy))
+    queen_hp = rng.randint(*QUEEN_HP_RANGE)*QUEEN_HP_MULT
+    return GameMap(seed, sites, queen_starts, queen_hp)
+
+
+class Game:
+    def __init__(self, game_map):
+        self.game_map = game_map
+        self.sites = [site.copy() for site in game_map.sites]
+        self.gold = [STARTING_GOLD, STARTING_GOLD]
+        self.queens = [RefUnit(x, y, player, QUEEN, game_map.queen_hp)
+                       for player, (x, y) in enumerate(game_map.queen_starts)]
+        self.creeps = []
+        self.turn = 0
+        self.resolve_collisions()
+        self.round_positions()
+
+    def over(self):
+        return self.turn >= MAX_TURNS or any(q.hp <= 0 for q in self.queens)
+
+    def winner(self):
+        hp = [q.hp for q in self.queens]
+        if hp[0] == hp[1] or (hp[0] <= 0 and hp[1] <= 0):
+            return -1
+        return 0 if hp[0] > hp[1] else 1
+
+    def relative_owner(self, owner, player):
+        if owner == NO_OWNER:
+            return NO_OWNER
+        return 0 if owner == player else 1
+
+    def touched_site(self, player):
+        queen = self.queens[player]
+        for site in self.sites:
+            gap = distance(queen.x, queen.y, site.x, site.y)-site.radius-queen.radius
+            if gap <= TOUCH_DISTANCE:
+                return site.site_id
+        return -1
+
+    def site_visible(self, site, player):
+        if site.owner == player:
+            return True
+        queen = self.queens[player]
+        return distance(queen.x, queen.y, site.x, site.y)-site.radius <= QUEEN_VISION
+
+    def player_input(self, player):
+        queen_status = '{0} {1}'.format(self.gold[player], self.touched_site(player))
+        site_lines = []
+        for site in self.sites:
+            if self.site_visible(site, player):
+                gold, max_mine_size = site.gold, site.max_mine_size
+            else:
+                gold, max_mine_size = -1, -1
+            param_1, param_2 = site.params()
+            site_lines.append('{0} {1} {2} {3} {4} {5} {6}'.format(
+                site.site_id, gold, max_mine_size, site.structure_type,
+                self.relative_owner(site.owner, player), param_1, param_2))
+        unit_lines = []
+        for unit in self.queens+self.creeps:
+            unit_lines.append('{0} {1} {2} {3} {4}'.format(
+                int(unit.x), int(unit.y), self.relative_owner(unit.owner, player),
+                unit.unit_type, unit.hp))
+        return queen_status, site_lines, unit_lines
+
+    def parse_queen_command(self, line):
+        parts = line.split()
+        if len(parts) == 1 and parts[0] == 'WAIT':
+            return ('WAIT',)
+        if len(parts) == 3 and parts[0] == 'MOVE':
+            try:
+                return ('MOVE', int(parts[1]), int(parts[2]))
+            except ValueError:
+                pass
+        if len(parts) == 3 and parts[0] == 'BUILD' and parts[2] in BUILD_TYPES:
+            try:
+                site_id = int(parts[1])
+            except ValueError:
+                site_id = -1
+            if 0 <= site_id < len(self.sites):
+                return ('BUILD', site_id, parts[2])
+        raise CommandError('invalid queen command {0!r}'.format(line))
+
+    def parse_train_command(self, player, line):
+        parts = line.split()
+        if not parts or parts[0] != 'TRAIN':
+            raise CommandError('invalid train command {0!r}'.format(line))
+        site_ids = []
+        for part in parts[1:]:
+            try:
+                site_id = int(part)
+            except ValueError:
+                raise CommandError('invalid train command {0!r}'.format(line))
+            if not 0 <= site_id < len(self.sites):
+                raise CommandError('invalid barracks {0}'.format(site_id))
+            site = self.sites[site_id]
+            if site.structure_type != BARRACKS or site.owner != player:
+                raise CommandError('site {0} is not own barracks'.format(site_id))
+            if site_id not in site_ids:
+                site_ids.append(site_id)
+        return site_ids
+
+    def step(self, commands):
+        queen_commands = []
+        train_commands = []
+        for player, command in enumerate(commands):
+            if len(command) != 2:
+                raise CommandError('expected two lines, got {0}'.format(len(command)))
+            queen_commands.append(self.parse_queen_command(command[0]))
+            train_commands.append(self.parse_train_command(player, command[1]))
+        self.turn += 1
+        for player, site_ids in enumerate(train_commands):
+            self.train(player, site_ids)
+        self.apply_queen_commands(queen_commands)
+        self.move_creeps()
+        self.resolve_collisions()
+        self.creeps_attack()
+        self.towers_attack()
+        for creep in self.creeps:
+            creep.hp -= CREEP_AGING
+        self.creeps = [c for c in self.creeps if c.hp > 0]
+        self.update_sites()
+        self.round_positions()
+
+    def train(self, player, site_ids):
+        ready = [self.sites[i] for i in site_ids if self.sites[i].train_left == 0]
+        cost = sum(CREEP_STATS[site.creep_type][1] for site in ready)
+        if cost > self.gold[player]:
+            return
+        self.gold[player] -= cost
+        for site in ready:
+            site.train_left = CREEP_STATS[site.creep_type][4]
+
+    def apply_queen_commands(self, queen_commands):
+        builds = {}
+        for player, command in enumerate(queen_commands):
+            queen = self.queens[player]
+            if command[0] == 'MOVE':
+                self.move_unit(queen, command[1], command[2], 0)
+            elif command[0] == 'BUILD':
+                site = self.sites[command[1]]
+                gap = distance(queen.x, queen.y, site.x, site.y)-site.radius-queen.radius
+                if gap <= TOUCH_DISTANCE:
+                    builds.setdefault(site.site_id, []).append((player, command[2]))
+                else:
+                    self.move_unit(queen, site.x, site.y, site.radius)
+        for site_id, requests in builds.items():
+            if len(requests) == 1:
+                player, kind = requests[0]
+                self.build(player, self.sites[site_id], kind)
+
+    def build(self, player, site, kind):
+        structure_type, creep_type = BUILD_TYPES[kind]
+        if site.structure_type == TOWER and site.owner not in (player, NO_OWNER):
+            return
+        own = site.owner == player and site.structure_type == structure_type
+        if site.structure_type == BARRACKS and site.owner == player and site.train_left > 0:
+            return
+        if structure_type == GOLDMINE:
+            if site.gold <= 0:
+                return
+            if own:
+                site.income = min(site.income+1, site.max_mine_size)
+                return
+            site.clear_structure()
+            site.income = 1
+        elif structure_type == TOWER:
+            if own:
+                site.tower_hp = min(site.tower_hp+TOWER_UP_PER_TURN, TOWER_MAX_HP)
+                return
+            site.clear_structure()
+            site.tower_hp = TOWER_START_HP
+        else:
+            if own and site.creep_type == creep_type:
+                return
+            site.clear_structure()
+            site.creep_type = creep_type
+        site.structure_type = structure_type
+        site.owner = player
+
+    def move_unit(self, unit, tx, ty, stop_distance):
+        d = distance(unit.x, unit.y, tx, ty)
+        step = min(unit.speed, d-stop_distance)
+        if d == 0 or step <= 0:
+            return
+        unit.x += (tx-unit.x)/d*step
+        unit.y += (ty-unit.y)/d*step
+
+    def nearest(self, unit, candidates):
+        best = None
+        best_d = 0
+        for other in candidates:
+            d = distance(unit.x, unit.y, other.x, other.y)
+            if best is None or d < best_d:
+                best = other
+                best_d = d
+        return best, best_d
+
+    def move_creeps(self):
+        for creep in self.creeps:
+            enemy = 1-creep.owner
+            if creep.unit_type == KNIGHT:
+                queen = self.queens[enemy]
+                self.move_unit(creep, queen.x, queen.y, creep.radius+queen.radius)
+            elif creep.unit_type == GIANT:
+                towers = [s for s in self.sites if s.structure_type == TOWER and s.owner == enemy]
+                tower, _ = self.nearest(creep, towers)
+                if tower is not None:
+                    self.move_unit(creep, tower.x, tower.y, creep.radius+tower.radius)
+            elif creep.unit_type == ARCHER:
+                targets = [c for c in self.creeps if c.owner == enemy]
+                target, _ = self.nearest(creep, targets)
+                if target is not None:
+                    self.move_unit(creep, target.x, target.y, ARCHER_RANGE)
+                else:
+                    queen = self.queens[creep.owner]
+                    self.move_unit(creep, queen.x, queen.y, creep.radius+queen.radius)
+
+    def resolve_collisions(self):
+        units = self.queens+self.creeps
+        for _ in range(COLLISION_ITERATIONS):
+            collided = False
+            for i, a in enumerate(units):
+                for b in units[i+1:]:
+                    min_d = a.radius+b.radius
+                    dx = b.x-a.x
+                    dy = b.y-a.y
+                    if abs(dx) >= min_d or abs(dy) >= min_d:
+                        continue
+                    d2 = dx*dx+dy*dy
+                    if d2 >= min_d*min_d:
+                        continue
+                    d = d2**0.5
+                    if d == 0:
+                        dx, dy, d = 1.0, 0.0, 1.0
+                    overlap = min_d-d
+                    total = a.mass+b.mass
+                    a.x -= dx/d*overlap*b.mass/total
+                    a.y -= dy/d*overlap*b.mass/total
+                    b.x += dx/d*overlap*a.mass/total
+                    b.y += dy/d*overlap*a.mass/total
+                    collided = True
+            for unit in units:
+                for site in self.sites:
+                    min_d = unit.radius+site.radius
+                    dx = unit.x-site.x
+                    dy = unit.y-site.y
+                    if abs(dx) >= min_d or abs(dy) >= min_d:
+                        continue
+                    d2 = dx*dx+dy*dy
+                    if d2 >= min_d*min_d:
+                        continue
+                    d = d2**0.5
+                    if d == 0:
+                        dx, dy, d = 1.0, 0.0, 1.0
+                    unit.x = site.x+dx/d*min_d
+                    unit.y = site.y+dy/d*min_d
+                    collided = True
+                unit.x = min(max(unit.x, unit.radius), FIELD_WIDTH-unit.radius)
+                unit.y = min(max(unit.y, unit.radius), FIELD_HEIGHT-unit.radius)
+            if not collided:
+                break
+
+    def round_positions(self):
+        for unit in self.queens+self.creeps:
+            unit.x = float(round(unit.x))
+            unit.y = float(round(unit.y))
+
+    def creeps_attack(self):
+        for creep in self.creeps:
+            enemy = 1-creep.owner
+            if creep.unit_type == KNIGHT:
+                queen = self.queens[enemy]
+                gap = distance(creep.x, creep.y, queen.x, queen.y)-creep.radius-queen.radius
+                if gap <= TOUCH_DISTANCE:
+                    queen.hp -= KNIGHT_DAMAGE
+            elif creep.unit_type == ARCHER:
+                targets = [c for c in self.creeps if c.owner == enemy and c.hp > 0]
+                target, d = self.nearest(creep, targets)
+                if target is not None and d-creep.radius-target.radius <= ARCHER_RANGE:
+                    if target.unit_type == GIANT:
+                        target.hp -= ARCHER_DAMAGE_TO_GIANTS
+                    else:
+                        target.hp -= ARCHER_DAMAGE
+            elif creep.unit_type == GIANT:
+                for site in self.sites:
+                    if site.structure_type != TOWER or site.owner != enemy:
+                        continue
+                    gap = distance(creep.x, creep.y, site.x, site.y)-creep.radius-site.radius
+                    if gap <= TOUCH_DISTANCE:
+                        site.tower_hp -= GIANT_BUST_RATE
+                        if site.tower_hp <= 0:
+                            site.clear_structure()
+                        break
+
+    def towers_attack(self):
+        for site in self.sites:
+            if site.structure_type != TOWER:
+                continue
+            enemy = 1-site.owner
+            attack_radius = site.attack_radius()
+            targets = [c for c in self.creeps if c.owner == enemy and c.hp > 0]
+            target, d = self.nearest(site, targets)
+            if target is not None and d < attack_radius:
+                target.hp -= TOWER_CREEP_DAMAGE_MIN+int((attack_radius-d)/TOWER_DAMAGE_CLIMB_DISTANCE)
+                continue
+            queen = self.queens[enemy]
+            d = distance(site.x, site.y, queen.x, queen.y)
+            if d < attack_radius:
+                queen.hp -= TOWER_QUEEN_DAMAGE_MIN+int((attack_radius-d)/TOWER_DAMAGE_CLIMB_DISTANCE)
+
+    def update_sites(self):
+        for site in self.sites:
+            if site.structure_type == GOLDMINE:
+                extracted = min(site.income, site.gold)
+                self.gold[site.owner] += extracted
+                site.gold -= extracted
+                if site.gold <= 0:
+                    site.clear_structure()
+            elif site.structure_type == TOWER:
+                site.tower_hp -= TOWER_MELT_RATE
+                if site.tower_hp <= 0:
+                    site.clear_structure()
+            elif site.structure_type == BARRACKS and site.train_left > 0:
+                site.train_left -= 1
+                if site.train_left == 0:
+                    self.spawn(site)
+
+    def spawn(self, site):
+        unit_type, _, squad, health, _ = CREEP_STATS[site.creep_type]
+        radius = UNIT_STATS[unit_type][0]
+        for i in range(squad):
+            angle = 2*math.pi*i/squad
+            x = site.x+math.cos(angle)*(site.radius+radius)
+            y = site.y+math.sin(angle)*(site.radius+radius)
+            self.creeps.append(RefUnit(x, y, site.owner, unit_type, health))
+
+
+def reads_stdin(node):
+    if (isinstance(node, ast.If) and isinstance(node.test, ast.Compare)
+            and isinstance(node.test.left, ast.Name) and node.test.left.id == '__name__'):
+        return False
+    if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+        return False
+    for child in ast.walk(node):
+        if isinstance(child, ast.Name) and child.id == 'input':
+            return True
+        if isinstance(child, ast.Attribute) and child.attr == 'stdin':
+            return True
+    return False
+
+
+def library_code(path):
+    # revisions older than the __main__ guard run their stdin loop at import; everything
+    # from the first top-level statement reading stdin on is left out
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    for i, node in enumerate(tree.body):
+        if reads_stdin(node):
+            tree.body = tree.body[:i]
+            return compile(tree, path, 'exec')
+    return None
+
+
+def load_strategy(path, name='Strategy'):
+    module_name = 'llq_variant_{0}'.format(abs(hash(os.path.abspath(path))))
+    if module_name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        code = library_code(path)
+        if code is None:
+            spec.loader.exec_module(module)
+        else:
+            exec(code, module.__dict__)
+    return getattr(sys.modules[module_name], name)
+
+
+_books = {}
+
+
+def booked(factory):
+    # the submission always plays its embedded opening book; one decoded book per revision
+    # is shared by every game of the process
+    module = sys.modules[factory.__module__]
+    if not hasattr(module, 'OpeningBook'):
+        return factory
+    book = _books.get(module.__name__)
+    if book is None:
+        book = module.OpeningBook(module.OPENING_BOOK)
+        _books[module.__name__] = book
+
+    def make(num_sites, site_lines, **kwargs):
+        return factory(num_sites, site_lines, opening_book=book, **kwargs)
+    return make
+
+
+def profiled(factory, profilers, trace=None):
+    def make(num_sites, site_lines):
+        if trace is not None:
+            print('# game {0}'.format(len(profilers)), file=trace)
+        profiler = llq.TurnProfiler(trace=trace)
+        profilers.append(profiler)
+        return factory(num_sites, site_lines, profiler=profiler)
+    return make
+
+
+def recorded(factory, directory, options=()):
+    def make(num_sites, site_lines, **kwargs):
+        path = '{0}/game{1:05d}.replay'.format(directory, make.games)
+        make.games += 1
+        return RecordingStrategy(factory(num_sites, site_lines, **kwargs), open(path, 'w'), num_sites, site_lines,
+                                 options)
+    make.games = 0
+    return make
+
+
+class RecordingStrategy:
+    def __init__(self, strategy, out, num_sites, site_lines, options=()):
+        self.strategy = strategy
+        self.recorder = llq.ReplayRecorder(out)
+        self.recorder.record_init(num_sites, site_lines, options)
+
+    def turn(self, queen_status, site_lines, unit_lines):
+        command = self.strategy.turn(queen_status, site_lines, unit_lines)
+        self.recorder.record_turn(queen_status, site_lines, unit_lines, command)
+        return command
+
+
+def play_game(factories, seed, max_turns=MAX_TURNS, quiet=True, game_map=None):
+    if game_map is None:
+        game_map = generate_map(seed)
+    game = Game(game_map)
+    site_lines = game_map.site_lines()
+    errors = [None, None]
+    stderr = io.StringIO() if quiet else sys.stderr
+    with contextlib.redirect_stderr(stderr):
+        bots = []
+        for player, factory in enumerate(factories):
+            try:
+                bots.append(factory(len(site_lines), list(site_lines)))
+            except Exception as e:
+                bots.append(None)
+                errors[player] = 'init: {0!r}'.format(e)
+        while not any(errors) and game.turn < max_turns and not game.over():
+            commands = []
+            for player, bot in enumerate(bots):
+                try:
+                    commands.append(bot.turn(*game.player_input(player)))
+                except Exception as e:
+                    errors[player] = 'turn {0}: {1!r}'.format(game.turn, e)
+            if any(errors):
+                break
+            for player in range(2):
+                try:
+                    game.parse_queen_command(commands[player][0])
+                    game.parse_train_command(player, commands[player][1])
+                except (CommandError, IndexError) as e:
+                    errors[player] = 'turn {0}: {1}'.format(game.turn, e)
+            if any(errors):
+                break
+            game.step(commands)
+            if quiet:
+                stderr.seek(0)
+                stderr.truncate()
+    if errors[0] and errors[1]:
+        winner = -1
+    elif errors[0]:
+        winner = 1
+    elif errors[1]:
+        winner = 0
+    else:
+        winner = game.winner()
+    return GameResult(seed, winner, game.turn, tuple(q.hp for q in game.queens), errors)
+
+
+def run_batch(factories, games, seed=0, max_turns=MAX_TURNS, swap_sides=True, quiet=True):
+    results = []
+    for i in range(games):
+        if swap_sides and i % 2 == 1:
+            result = play_game(factories[::-1], seed+i//2, max_turns, quiet).swapped()
+        else:
+            result = play_game(factories, seed+(i//2 if swap_sides else i), max_turns, quiet)
+        results.append(result)
+    return results
+
+
+def summarize(results):
+    wins = sum(1 for r in results if r.winner == 0)
+    losses = sum(1 for r in results if r.winner == 1)
+    draws = len(results)-wins-losses
+    errors = sum(1 for r in results if r.errors[0])
+    return {
+        'games': len(results),
+        'wins': wins,
+        'draws': draws,
+        'losses': losses,
+        'errors': errors,
+        'score': (wins+0.5*draws)/len(results) if results else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local Code Royale referee for llq.Strategy')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-turns', type=int, default=MAX_TURNS)
+    parser.add_argument('--player', default=None, help='llq.py revision to play as player (default: this llq)')
+    parser.add_argument('--opponent', default=None, help='llq.py revision to play against (default: this llq)')
+    parser.add_argument('--book', action='store_true', help='play both sides with their opening book, as llq.py does')
+    parser.add_argument('--verbose', action='store_true', help='keep strategy debug output on stderr')
+    parser.add_argument('--list', action='store_true', help='print one line per game')
+    parser.add_argument('--profile', action='store_true', help='print per-phase turn latency of the player')
+    parser.add_argument('--trace', default=None, help='write per-turn phase timings of the player to this file')
+    parser.add_argument('--record', default=None, help='write a replay of every game of the player to this directory')
+    args = parser.parse_args(argv)
+
+    player = load_strategy(args.player) if args.player else llq.Strategy
+    opponent = load_strategy(args.opponent) if args.opponent else llq.Strategy
+    if args.book:
+        player = booked(player)
+        opponent = booked(opponent)
+    profilers = []
+    trace = open(args.trace, 'w') if args.trace else None
+    if args.profile or trace:
+        player = profiled(player, profilers, trace)
+    if args.record:
+        os.makedirs(args.record, exist_ok=True)
+        player = recorded(player, args.record, (llq.REPLAY_BOOK,) if args.book else ())
+    start = time.time()
+    results = run_batch((player, opponent), args.games, args.seed, args.max_turns, quiet=not args.verbose)
+    elapsed = time.time()-start
+    if trace:
+        trace.close()
+    if args.list:
+        for r in results:
+            print('seed {0} winner {1} turns {2} hp {3} {4} errors {5}'.format(
+                r.seed, r.winner, r.turns, r.queen_hp[0], r.queen_hp[1], r.errors))
+    summary = summarize(results)
+    print('games {games} wins {wins} draws {draws} losses {losses} errors {errors} score {score:.3f}'.format(**summary))
+    print('elapsed {0:.1f}s games/hour {1:.0f}'.format(elapsed, len(results)/elapsed*3600 if elapsed else 0))
+    if args.profile:
+        total = llq.TurnProfiler()
+        for profiler in profilers:
+            total.merge(profiler)
+        print(total.summary())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+import argparse
+import contextlib
+import io
+import sys
+import time
+
+import llq
+import referee
+
+
+class ReplayError(Exception):
+    pass
+
+
+class ReplayTurn:
+    __slots__ = ('queen_status', 'site_lines', 'unit_lines', 'command')
+
+    def __init__(self, queen_status, site_lines, unit_lines, command):
+        self.queen_status = queen_status
+        self.site_lines = site_lines
+        self.unit_lines = unit_lines
+        self.command = command
+
+
+class Replay:
+    def __init__(self, num_sites, site_lines, turns, options=()):
+        self.num_sites = num_sites
+        self.site_lines = site_lines
+        self.turns = turns
+        self.options = options
+
+    def factory(self, factory):
+        # rebuild the Strategy the way the recording was made
+        if llq.REPLAY_BOOK in self.options:
+            return referee.booked(factory)
+        return factory
+
+
+class Mismatch:
+    def __init__(self, turn, expected, actual):
+        self.turn = turn
+        self.expected = expected
+        self.actual = actual
+
+    def __str__(self):
+        return 'turn {0}: expected {1} got {2}'.format(self.turn, ' | '.join(self.expected), ' | '.join(self.actual))
+
+
+def load_replay(path):
+    with open(path) as f:
+        header = f.readline()
+        if not header.startswith(llq.REPLAY_HEADER+' '):
+            raise ReplayError('{0}: not a replay file'.format(path))
+        version, *options = header[len(llq.REPLAY_HEADER):].split()
+        # version 1 files carry no options
+        if not version.isdigit() or not 1 <= int(version) <= llq.REPLAY_VERSION:
+            raise ReplayError('{0}: unsupported replay version {1}'.format(path, version))
+        inputs = []
+        outputs = []
+        for line in f:
+            line = line.rstrip('\n')
+            if line.startswith('< '):
+                inputs.append(line[2:])
+            elif line.startswith('> '):
+                outputs.append((len(inputs), line[2:]))
+            elif line:
+                raise ReplayError('{0}: bad line {1!r}'.format(path, line))
+    num_sites = int(inputs[0])
+    pos = num_sites+1
+    site_lines = inputs[1:pos]
+    turns = []
+    out = 0
+    while pos < len(inputs):
+        queen_status = inputs[pos]
+        turn_sites = inputs[pos+1:pos+1+num_sites]
+        pos += num_sites+1
+        num_units = int(inputs[pos])
+        unit_lines = inputs[pos+1:pos+1+num_units]
+        pos += num_units+1
+        command = []
+        while out < len(outputs) and outputs[out][0] == pos:
+            command.append(outputs[out][1])
+            out += 1
+        if len(unit_lines) != num_units:
+            raise ReplayError('{0}: truncated turn {1}'.format(path, len(turns)))
+        turns.append(ReplayTurn(queen_status, turn_sites, unit_lines, command))
+    return Replay(num_sites, site_lines, turns, tuple(options))
+
+
+def replay(game, factory=llq.Strategy, profiler=None, stop_first=False):
+    mismatches = []
+    played = 0
+    factory = game.factory(factory)
+    with contextlib.redirect_stderr(io.StringIO()) as stderr:
+        if profiler is not None:
+            strategy = factory(game.num_sites, list(game.site_lines), profiler=profiler)
+        else:
+            strategy = factory(game.num_sites, list(game.site_lines))
+        for n, turn in enumerate(game.turns):
+            command = strategy.turn(turn.queen_status, turn.site_lines, turn.unit_lines)
+            played += 1
+            if command != turn.command:
+                mismatches.append(Mismatch(n, turn.command, command))
+                if stop_first:
+                    break
+            stderr.seek(0)
+            stderr.truncate()
+    return played, mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay recorded games through llq.Strategy and diff the commands')
+    parser.add_argument('replays', nargs='+', help='files written by llq.py --record or referee.py --record')
+    parser.add_argument('--strategy', default=None, help='llq.py revision to replay with (default: this llq)')
+    parser.add_argument('--repeat', type=int, default=1, help='replay every file this many times')
+    parser.add_argument('--profile', action='store_true', help='print per-phase turn latency')
+    parser.add_argument('--stop-first', action='store_true', help='stop each replay at its first mismatch')
+    args = parser.parse_args(argv)
+
+    factory = referee.load_strategy(args.strategy) if args.strategy else llq.Strategy
+    games = [load_replay(path) for path in args.replays]
+    total = llq.TurnProfiler(enabled=args.profile)
+    failed = 0
+    turns = 0
+    start = time.time()
+    for _ in range(args.repeat):
+        for path, game in zip(args.replays, games):
+            profiler = llq.TurnProfiler() if args.profile else None
+            played, mismatches = replay(game, factory, profiler, args.stop_first)
+            turns += played
+            if profiler is not None:
+                total.merge(profiler)
+            if mismatches:
+                failed += 1
+                print('{0}: {1} mismatches, first {2}'.format(path, len(mismatches), mismatches[0]))
+    elapsed = time.time()-start
+    print('replays {0} failed {1} turns {2} elapsed {3:.2f}s turns/s {4:.0f}'.format(
+        len(games)*args.repeat, failed, turns, elapsed, turns/elapsed if elapsed else 0))
+    if args.profile:
+        print(total.summary())
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
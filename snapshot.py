@@ -0,0 +1,294 @@
+import argparse
+import array
+import contextlib
+import io
+import multiprocessing
+import os
+import time
+from multiprocessing import shared_memory
+
+import llq
+import referee
+import replay
+
+MAGIC = 0x6c6c71
+UNIT_CAPACITY = 256
+WORD = 8
+
+# header: magic, sites, unit capacity, published version
+HEADER = 4
+# slot: version, turn, gold, touched site, unit count
+SLOT_HEADER = 5
+SITE_COLUMNS = ('structure_type', 'owner', 'param_1', 'param_2', 'gold', 'max_mine_size')
+UNIT_COLUMNS = ('x', 'y', 'owner', 'unit_type', 'hp')
+WRITING = -1
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class SnapshotLayout:
+    def __init__(self, sites, units):
+        self.sites = sites
+        self.units = units
+        self.static = HEADER
+        self.slot_size = SLOT_HEADER+len(SITE_COLUMNS)*sites+len(UNIT_COLUMNS)*units
+        self.slots = (HEADER+3*sites, HEADER+3*sites+self.slot_size)
+        self.size = self.slots[1]+self.slot_size
+
+    def slot(self, version):
+        return self.slots[version % 2]
+
+    def site_column(self, slot, column):
+        return slot+SLOT_HEADER+column*self.sites
+
+    def unit_column(self, slot, column):
+        return slot+SLOT_HEADER+len(SITE_COLUMNS)*self.sites+column*self.units
+
+
+class SnapshotWriter:
+    def __init__(self, site_x, site_y, site_r, units=UNIT_CAPACITY):
+        self.layout = SnapshotLayout(len(site_x), units)
+        self.shm = shared_memory.SharedMemory(create=True, size=self.layout.size*WORD)
+        self.name = self.shm.name
+        self.words = self.shm.buf.cast('q')
+        self.words[0:HEADER] = array.array('q', [MAGIC, self.layout.sites, units, 0])
+        sites = self.layout.sites
+        static = self.layout.static
+        for column, values in enumerate((site_x, site_y, site_r)):
+            start = static+column*sites
+            self.words[start:start+sites] = array.array('q', values)
+        self.version = 0
+
+    def publish(self, strategy):
+        layout = self.layout
+        words = self.words
+        table = strategy.site_table
+        units = strategy.unit_table
+        if units.count > layout.units:
+            raise SnapshotError('{0} units do not fit in {1} slots'.format(units.count, layout.units))
+        version = self.version+1
+        slot = layout.slot(version)
+        # readers of the previous version use the other slot; a reader still on this
+        # one sees WRITING or a newer version and retries
+        words[slot] = WRITING
+        me = strategy.own_side
+        words[slot+1:slot+SLOT_HEADER] = array.array('q', [strategy.current_turn, me.owned_gold, me.touched_site,
+                                                           units.count])
+        for column, name in enumerate(SITE_COLUMNS):
+            start = layout.site_column(slot, column)
+            words[start:start+layout.sites] = array.array('q', getattr(table, name)[:layout.sites])
+        for column, name in enumerate(UNIT_COLUMNS):
+            start = layout.unit_column(slot, column)
+            words[start:start+units.count] = array.array('q', getattr(units, name)[:units.count])
+        words[slot] = version
+        words[3] = version
+        self.version = version
+        return version
+
+    def close(self):
+        self.words.release()
+        self.shm.close()
+        self.shm.unlink()
+
+
+class SnapshotReader:
+    def __init__(self, name):
+        # pool workers share the writer's resource tracker, which unlinks the block only
+        # if the writer dies without closing it
+        self.shm = shared_memory.SharedMemory(name=name)
+        words = self.shm.buf.cast('q')
+        if words[0] != MAGIC:
+            raise SnapshotError('{0}: not a snapshot block'.format(name))
+        self.words = words
+        self.layout = SnapshotLayout(words[1], words[2])
+        sites = self.layout.sites
+        static = self.layout.static
+        self.site_x = words[static:static+sites].tolist()
+        self.site_y = words[static+sites:static+2*sites].tolist()
+        self.site_r = words[static+2*sites:static+3*sites].tolist()
+
+    def latest(self):
+        return self.words[3]
+
+    def read(self, version=None, retries=100):
+        for _ in range(retries):
+            want = self.latest() if version is None else version
+            state = self.copy(want)
+            if state is not None:
+                return state
+            if version is not None:
+                break
+        raise SnapshotError('version {0} was overwritten while reading'.format(want))
+
+    def copy(self, version):
+        layout = self.layout
+        words = self.words
+        slot = layout.slot(version)
+        if words[slot] != version:
+            return None
+        turn, gold, _, count = words[slot+1:slot+SLOT_HEADER].tolist()
+        state = llq.SimState()
+        state.turn = turn
+        state.gold = [gold, 0]
+        columns = []
+        for column in range(len(SITE_COLUMNS)):
+            start = layout.site_column(slot, column)
+            columns.append(words[start:start+layout.sites].tolist())
+        (state.structure_type, state.owner, state.param_1, state.param_2,
+         state.site_gold, state.max_mine_size) = columns
+        units = []
+        for column in range(len(UNIT_COLUMNS)):
+            start = layout.unit_column(slot, column)
+            units.append(words[start:start+count].tolist())
+        if words[slot] != version:
+            return None
+        state.queen_x = [0, 0]
+        state.queen_y = [0, 0]
+        state.queen_hp = [0, 0]
+        state.unit_x = []
+        state.unit_y = []
+        state.unit_hp = []
+        state.unit_owner = []
+        state.unit_type = []
+        for x, y, owner, unit_type, hp in zip(*units):
+            if unit_type == llq.QUEEN:
+                state.queen_x[owner] = x
+                state.queen_y[owner] = y
+                state.queen_hp[owner] = hp
+                continue
+            state.unit_x.append(x)
+            state.unit_y.append(y)
+            state.unit_hp.append(hp)
+            state.unit_owner.append(owner)
+            state.unit_type.append(unit_type)
+        return state
+
+    def close(self):
+        self.words.release()
+        self.shm.close()
+
+
+_reader = None
+_simulator = None
+_cached = (None, None)
+
+
+def _init_worker(name):
+    global _reader, _simulator
+    _reader = SnapshotReader(name)
+    _simulator = llq.Simulator(_reader.site_x, _reader.site_y, _reader.site_r)
+
+
+def _rollout(job):
+    global _cached
+    version, index, action, depth = job
+    if _cached[0] != version:
+        _cached = (version, _reader.read(version))
+    return index, _simulator.rollout(_cached[1].copy(), action, depth)
+
+
+class ParallelEvaluator:
+    # Strategy(lookahead=True, rollout_pool=...) fans its rollouts out here; a turn is
+    # published once and workers only receive (version, index, action, depth)
+
+    def __init__(self, site_x, site_y, site_r, processes=None, units=UNIT_CAPACITY):
+        self.writer = SnapshotWriter(site_x, site_y, site_r, units)
+        self.processes = processes or os.cpu_count()
+        self.pool = multiprocessing.Pool(self.processes, _init_worker, (self.writer.name,))
+        self.published = None
+        self.version = 0
+
+    def publish(self, strategy):
+        key = (id(strategy), strategy.current_turn)
+        if key != self.published:
+            self.version = self.writer.publish(strategy)
+            self.published = key
+        return self.version
+
+    def evaluate(self, strategy, actions, depth):
+        version = self.publish(strategy)
+        jobs = [(version, index, action, depth) for index, action in enumerate(actions)]
+        scores = [0.0]*len(actions)
+        chunksize = max(1, len(jobs)//(4*self.processes))
+        for index, score in self.pool.imap_unordered(_rollout, jobs, chunksize):
+            scores[index] = score
+        return scores
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+        self.writer.close()
+
+
+def legal_actions(strategy):
+    table = strategy.site_table
+    actions = [('WAIT',)]
+    for site_id in sorted(strategy.site_coords):
+        if table.structure_type[site_id] == llq.TOWER and table.owner[site_id] == llq.ENEMY:
+            continue
+        actions.append(('BUILD', site_id, 'TOWER'))
+        if strategy.for_mining[site_id] != 0:
+            actions.append(('BUILD', site_id, 'MINE'))
+        actions.append(('BUILD', site_id, 'BARRACKS-KNIGHT'))
+    return actions
+
+
+def analyze_game(game, evaluator, depth, factory=llq.Strategy):
+    rows = []
+    with contextlib.redirect_stderr(io.StringIO()) as stderr:
+        strategy = game.factory(factory)(game.num_sites, list(game.site_lines))
+        for n, turn in enumerate(game.turns):
+            strategy.turn(turn.queen_status, turn.site_lines, turn.unit_lines)
+            actions = legal_actions(strategy)
+            recorded = llq.parse_command(turn.command[0]) if turn.command else ('WAIT',)
+            if recorded not in actions:
+                actions.append(recorded)
+            scores = evaluator.evaluate(strategy, actions, depth)
+            best = max(range(len(actions)), key=lambda i: scores[i])
+            rows.append((n, recorded, scores[actions.index(recorded)], actions[best], scores[best], len(actions)))
+            stderr.seek(0)
+            stderr.truncate()
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Score every legal queen move of recorded games on all cores')
+    parser.add_argument('replays', nargs='+', help='files written by llq.py --record or referee.py --record')
+    parser.add_argument('--strategy', default=None, help='llq.py revision rebuilding the state (default: this llq)')
+    parser.add_argument('--depth', type=int, default=8, help='simulated turns per move')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--margin', type=float, default=llq.LOOKAHEAD_MARGIN,
+                        help='report turns where the best move beats the recorded one by this much')
+    args = parser.parse_args(argv)
+
+    factory = referee.load_strategy(args.strategy) if args.strategy else llq.Strategy
+    start = time.time()
+    rollouts = 0
+    for path in args.replays:
+        game = replay.load_replay(path)
+        site_lines = [line.split() for line in game.site_lines]
+        site_x = [int(parts[1]) for parts in site_lines]
+        site_y = [int(parts[2]) for parts in site_lines]
+        site_r = [int(parts[3]) for parts in site_lines]
+        evaluator = ParallelEvaluator(site_x, site_y, site_r, args.processes)
+        try:
+            rows = analyze_game(game, evaluator, args.depth, factory)
+        finally:
+            evaluator.close()
+        missed = 0
+        for n, recorded, score, best, best_score, count in rows:
+            rollouts += count
+            if best_score-score >= args.margin:
+                missed += 1
+                print('{0} turn {1}: {2} {3:.0f}, best {4} {5:.0f}'.format(
+                    path, n, ' '.join(map(str, recorded)), score, ' '.join(map(str, best)), best_score))
+        print('{0}: turns {1} below best by {2:.0f}+ {3}'.format(path, len(rows), args.margin, missed))
+    elapsed = time.time()-start
+    print('rollouts {0} elapsed {1:.1f}s rollouts/s {2:.0f}'.format(
+        rollouts, elapsed, rollouts/elapsed if elapsed else 0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import json
+import math
+
+import pytest
+
+import batch
+import llq
+import referee
+
+
+@pytest.fixture(scope='module')
+def rows(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('replays')
+    referee.run_batch((referee.recorded(llq.Strategy, str(directory)), llq.Strategy), 1, seed=9, max_turns=40)
+    batch._init_worker(None, 24)
+    path, rows = batch.process_file(str(next(directory.iterdir())))
+    batch._init_worker(None, batch.BATCH_SITES)
+    assert len(rows) == 40
+    assert any(value is None for value in rows[0])
+    return rows
+
+
+def write(out, names, rows, fmt):
+    writer = batch.ChunkWriter(str(out), names, chunk_rows=7, fmt=fmt)
+    for row in rows:
+        writer.add(row)
+    writer.flush()
+    assert writer.total == len(rows)
+    assert writer.chunks == math.ceil(len(rows)/7)
+    with open(out / 'schema.json') as f:
+        assert json.load(f) == {'columns': names, 'text': list(batch.TEXT_COLUMNS), 'format': fmt}
+    return sorted(out.glob('part-*.{0}'.format(fmt)))
+
+
+def test_npz_chunks_read_back(tmp_path, rows):
+    np = pytest.importorskip('numpy')
+    names = batch.columns(24)
+    parts = write(tmp_path, names, rows, 'npz')
+    read = []
+    for part in parts:
+        with np.load(part) as data:
+            assert list(data.files) == names
+            read.extend(zip(*(data[name].tolist() for name in names)))
+    assert len(read) == len(rows)
+    for row, back in zip(rows, read):
+        for name, value, got in zip(names, row, back):
+            if name in batch.TEXT_COLUMNS:
+                assert got == value
+            elif value is None:
+                assert math.isnan(got)
+            else:
+                assert got == float(value)
+
+
+def test_tsv_chunks_read_back(tmp_path, rows):
+    names = batch.columns(24)
+    parts = write(tmp_path, names, rows, 'tsv')
+    read = []
+    for part in parts:
+        with open(part) as f:
+            assert f.readline().rstrip('\n').split('\t') == names
+            read.extend(line.rstrip('\n').split('\t') for line in f)
+    assert read == [['' if value is None else str(value) for value in row] for row in rows]
+
+
+def test_flush_without_rows_writes_nothing(tmp_path):
+    writer = batch.ChunkWriter(str(tmp_path), ['replay', 'turn'], chunk_rows=2, fmt='tsv')
+    writer.flush()
+    writer.add(['a', 1])
+    writer.add(['a', 2])
+    writer.flush()
+    assert (writer.chunks, writer.total) == (1, 2)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['part-00000.tsv', 'schema.json']
@@ -0,0 +1,41 @@
+import bench
+import llq
+
+
+def test_states_have_the_phase_shape():
+    for phase, (turn, min_sites, structures, creeps, gold) in bench.PHASES.items():
+        state = bench.make_state(phase)
+        assert state.turn == turn
+        assert len(state.site_lines) == len(state.init_lines) >= min_sites
+        assert state.queen_status.split()[0] == str(gold)
+        assert len(state.unit_lines) == 2+2*creeps
+
+
+def test_turn_cycles_through_perturbed_copies():
+    state = bench.make_state('mid')
+    turns = bench.perturbed_turns(state, bench.TURN_VARIANTS)
+    assert len(turns) == bench.TURN_VARIANTS
+    assert len({(queen_status, tuple(site_lines)) for queen_status, site_lines, _ in turns}) == bench.TURN_VARIANTS
+    towers = [i for i, line in enumerate(state.site_lines) if int(line.split()[3]) == llq.TOWER]
+    assert towers
+    for queen_status, site_lines, unit_lines in turns:
+        assert len(site_lines) == len(state.site_lines)
+        for i in towers:
+            old = state.site_lines[i].split()
+            new = site_lines[i].split()
+            assert new[0:5] == old[0:5]
+            assert 1 <= int(new[5]) <= int(old[5])
+        # every copy is a position the strategy can play
+        strategy = llq.Strategy(len(state.init_lines), list(state.init_lines))
+        strategy.turn(queen_status, site_lines, unit_lines)
+
+
+def test_run_and_compare():
+    results = bench.run(llq.Strategy, llq, ['early'], 0.0, only='turn')
+    assert set(results) == {'early/turn', 'early/read_turn'}
+    assert all(result['calls'] >= 20 for result in results.values())
+    slower = {key: dict(result, p50=result['p50']/2) for key, result in results.items()}
+    lines, regressions = bench.compare(results, slower, 0.10)
+    assert sorted(regressions) == sorted(results)
+    lines, regressions = bench.compare(results, results, 0.10)
+    assert regressions == []
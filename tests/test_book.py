@@ -0,0 +1,110 @@
+import random
+
+import book
+import llq
+import referee
+import replay
+
+W = llq.FIELD_WIDTH
+H = llq.FIELD_HEIGHT
+
+
+def triples(game_map):
+    return [(s.x, s.y, s.radius) for s in game_map.sites]
+
+
+def flip_map(game_map):
+    sites = [referee.RefSite(s.site_id, s.x, H-s.y, s.radius, s.gold, s.max_mine_size) for s in game_map.sites]
+    queen_starts = tuple((x, H-y) for x, y in game_map.queen_starts)
+    return referee.GameMap(game_map.seed, sites, queen_starts, game_map.queen_hp)
+
+
+def test_layout_key_normalizes_sides_and_flip():
+    rng = random.Random(13)
+    for seed in range(20):
+        sites = triples(referee.generate_map(seed))
+        key, flipped = llq.layout_key(sites)
+        assert len(key) == len(sites)//2
+        shuffled = sites[:]
+        rng.shuffle(shuffled)
+        assert llq.layout_key(shuffled) == (key, flipped)
+        # listing every site by its mirror is the same set of sites
+        assert llq.layout_key([(W-x, H-y, r) for x, y, r in sites]) == (key, flipped)
+        flip_key, flip_flipped = llq.layout_key([(x, H-y, r) for x, y, r in sites])
+        assert flip_key == key
+        if sorted(key) != sorted((x, H-y, r) for x, y, r in key):
+            assert flip_flipped != flipped
+
+
+def test_frame_point():
+    assert llq.frame_point(100, 200, False, False) == (100, 200)
+    assert llq.frame_point(100, 200, True, False) == (W-100, H-200)
+    assert llq.frame_point(100, 200, False, True) == (100, H-200)
+    assert llq.frame_point(100, 200, True, True) == (W-100, 200)
+    for mirrored in (False, True):
+        for flipped in (False, True):
+            assert llq.frame_point(*llq.frame_point(321, 654, mirrored, flipped), mirrored, flipped) == (321, 654)
+
+
+def book_commands(game_map, opening_book, turns):
+    game = referee.Game(game_map)
+    site_lines = game_map.site_lines()
+    players = [llq.Strategy(len(site_lines), site_lines, opening_book=opening_book) for _ in range(2)]
+    commands = []
+    for _ in range(turns):
+        turn = [players[p].turn(*game.player_input(p)) for p in range(2)]
+        commands.append([command[0] for command in turn])
+        game.step(turn)
+    assert all(player.opening is not None and not player.opening.diverged for player in players)
+    return commands
+
+
+def transform(game_map, other_map, command, point):
+    parts = command.split()
+    if parts[0] == 'MOVE':
+        return 'MOVE {0} {1}'.format(*point(int(parts[1]), int(parts[2])))
+    elif parts[0] == 'BUILD':
+        site = game_map.sites[int(parts[1])]
+        x, y = point(site.x, site.y)
+        other = next(s for s in other_map.sites if (s.x, s.y) == (x, y))
+        return 'BUILD {0} {1}'.format(other.site_id, parts[2])
+    return command
+
+
+def test_opening_line_is_mirrored_and_flipped():
+    game_map = referee.generate_map(4)
+    layout, flipped = book.map_layout(game_map)
+    entry = book.record_line(llq.Strategy, 4, layout, flipped, 10, 12, game_map)
+    opening_book = llq.OpeningBook(entries=[entry])
+    commands = book_commands(game_map, opening_book, 10)
+    assert [move[0] for move in entry['moves']] != ['W']*10
+    # the right side plays the same line through the centre of the field
+    for left, right in commands:
+        assert right == transform(game_map, game_map, left, lambda x, y: (W-x, H-y))
+    # and on the upside down map the line is played upside down
+    flipped_map = flip_map(game_map)
+    assert book.map_layout(flipped_map) == (layout, not flipped)
+    flipped_commands = book_commands(flipped_map, opening_book, 10)
+    for (left, _), (flipped_left, _) in zip(commands, flipped_commands):
+        assert flipped_left == transform(game_map, flipped_map, left, lambda x, y: (x, H-y))
+
+
+def test_replay_map_rebuilds_the_recorded_layout(tmp_path):
+    referee.run_batch((referee.recorded(llq.Strategy, str(tmp_path)), llq.Strategy), 2, seed=7)
+    game_map = referee.generate_map(7)
+    games = [replay.load_replay(str(path)) for path in sorted(tmp_path.iterdir())]
+    for n, game in enumerate(games):
+        other = book.replay_map(game, n)
+        assert triples(other) == triples(game_map)
+        assert other.queen_hp == game_map.queen_hp
+        # the second game was recorded from the right side
+        assert other.queen_starts == (game_map.queen_starts[::-1] if n else game_map.queen_starts)
+        seen = {int(line.split()[0]) for turn in game.turns for line in turn.site_lines if line.split()[1] != '-1'}
+        assert seen
+        for site, other_site in zip(game_map.sites, other.sites):
+            if site.site_id in seen:
+                assert other_site.max_mine_size == site.max_mine_size
+                assert 0 <= other_site.gold <= site.gold
+            else:
+                assert referee.SITE_MINE_SIZE_RANGE[0] <= other_site.max_mine_size <= referee.SITE_MINE_SIZE_RANGE[1]+1
+        assert book.map_layout(other) == book.map_layout(game_map)
@@ -0,0 +1,71 @@
+import math
+import random
+
+import llq
+import referee
+
+
+def sites(seed):
+    site_coords = {}
+    for line in referee.generate_map(seed).site_lines():
+        site_id, x, y, radius = [int(i) for i in line.split()]
+        site_coords[site_id] = llq.Site(x, y, radius, site_id)
+    for site in site_coords.values():
+        distances = {other.site_id: math.sqrt((site.x-other.x)**2+(site.y-other.y)**2)
+                     for other in site_coords.values()}
+        site.calculate_can_fire_upon(site_coords, distances)
+    return site_coords
+
+
+def brute_force(site_coords, towers, target, owner):
+    covering = set()
+    for site_id, (tower_owner, hp) in towers.items():
+        tower = site_coords[site_id]
+        other = site_coords[target]
+        d = math.sqrt((tower.x-other.x)**2+(tower.y-other.y)**2)
+        if tower_owner == owner and tower.need_hp_to_fire_upon(d) <= hp:
+            covering.add(site_id)
+    return covering
+
+
+def test_incremental_index_matches_brute_force():
+    rng = random.Random(3)
+    for seed in (0, 1, 2):
+        site_coords = sites(seed)
+        index = llq.CoverageIndex(site_coords)
+        towers = {}
+        for _ in range(400):
+            site_id = rng.choice(list(site_coords))
+            if site_id in towers and rng.random() < 0.25:
+                index.remove_tower(site_id)
+                del towers[site_id]
+            else:
+                # hp moves both ways, and a tower can change hands
+                owner = rng.choice((llq.FRIENDLY, llq.ENEMY))
+                hp = rng.randint(1, llq.TOWER_MAX_HP)
+                index.set_tower(site_id, owner, hp)
+                towers[site_id] = (owner, hp)
+            for target in site_coords:
+                for owner in (llq.FRIENDLY, llq.ENEMY):
+                    expected = brute_force(site_coords, towers, target, owner)
+                    assert index.covering[owner].get(target, set()) == expected
+                    assert index.covered_by_owner(target, owner) == bool(expected)
+            for tower_id, (owner, hp) in towers.items():
+                assert index.covered(tower_id) == site_coords[tower_id].currently_firing_at(hp)
+
+
+def test_owner_change_moves_reverse_entries():
+    site_coords = sites(5)
+    index = llq.CoverageIndex(site_coords)
+    tower = max(site_coords, key=lambda i: len(site_coords[i].can_fire_upon))
+    index.set_tower(tower, llq.ENEMY, llq.TOWER_MAX_HP)
+    targets = index.covered(tower)
+    assert targets and all(index.covered_by_owner(t, llq.ENEMY) for t in targets)
+    index.set_tower(tower, llq.FRIENDLY, llq.TOWER_START_HP)
+    assert not any(index.covered_by_owner(t, llq.ENEMY) for t in site_coords)
+    assert index.covered(tower) == index.hypothetical(tower, llq.TOWER_START_HP)
+    index.remove_tower(tower)
+    assert not any(index.covered_by_owner(t, owner) for t in site_coords for owner in (llq.FRIENDLY, llq.ENEMY))
+    assert index.covered(tower) == []
+    # removing an unknown tower is a no-op
+    index.remove_tower(tower)
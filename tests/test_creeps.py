@@ -0,0 +1,84 @@
+import random
+
+import pytest
+
+import llq
+import referee
+
+
+class Knight:
+    def __init__(self, x, y, hp):
+        self.x = x
+        self.y = y
+        self.hp = hp
+
+
+class Tower:
+    def __init__(self, site_id, attack_radius):
+        self.site_id = site_id
+        self.attack_radius = attack_radius
+
+
+def layout(seed):
+    sites = [[int(i) for i in line.split()] for line in referee.generate_map(seed).site_lines()]
+    return [s[1] for s in sites], [s[2] for s in sites], [s[3] for s in sites]
+
+
+def random_state(rng, site_x):
+    queen_x = rng.randint(30, llq.FIELD_WIDTH-30)
+    queen_y = rng.randint(30, llq.FIELD_HEIGHT-30)
+    knights = [Knight(rng.randint(0, llq.FIELD_WIDTH), rng.randint(0, llq.FIELD_HEIGHT), rng.randint(1, 30))
+               for _ in range(rng.randint(1, 12))]
+    towers = [Tower(site_id, rng.randint(100, 500)) for site_id in rng.sample(range(len(site_x)), rng.randint(0, 4))]
+    return knights, towers, queen_x, queen_y
+
+
+def test_numpy_matches_lists():
+    pytest.importorskip('numpy')
+    rng = random.Random(12)
+    for seed in range(10):
+        site_x, site_y, site_r = layout(seed)
+        arrays = llq.CreepPredictor(site_x, site_y, site_r)
+        lists = llq.CreepPredictor(site_x, site_y, site_r, use_numpy=False)
+        assert arrays.use_numpy and not lists.use_numpy
+        for _ in range(70):
+            state = random_state(rng, site_x)
+            assert arrays.predict(*state) == pytest.approx(lists.predict(*state), abs=1e-9)
+
+
+def test_numpy_matches_lists_in_games():
+    pytest.importorskip('numpy')
+    checked = 0
+    for seed in (3, 4):
+        game = referee.Game(referee.generate_map(seed))
+        site_lines = game.game_map.site_lines()
+        arrays = llq.Strategy(len(site_lines), site_lines, predict_creeps=True)
+        lists = llq.Strategy(len(site_lines), site_lines, predict_creeps=True)
+        lists.creep_predictor.use_numpy = False
+        opponent = llq.Strategy(len(site_lines), site_lines)
+        while not game.over():
+            turn = game.player_input(0)
+            command = arrays.turn(*turn)
+            assert lists.turn(*turn) == command
+            assert arrays.queen_damage == pytest.approx(lists.queen_damage, abs=1e-9)
+            checked += len(arrays.enemy_side.knights) > 0
+            game.step([command, opponent.turn(*game.player_input(1))])
+    assert checked > 0
+
+
+def test_damage_is_discounted_per_turn():
+    predictor = llq.CreepPredictor([1500], [150], [60], horizon=4, use_numpy=False)
+    # two knights already touching the queen keep hitting every turn
+    knights = [Knight(100, 560, 30), Knight(160, 500, 30)]
+    damage = predictor.predict(knights, [], 100, 500)
+    assert damage == pytest.approx([2*llq.CREEP_STAY_PROBABILITY**(t+1) for t in range(4)])
+    assert predictor.predict([], [], 100, 500) == [0.0]*4
+
+
+def test_towers_kill_knights_before_they_arrive():
+    predictor = llq.CreepPredictor([1500], [150], [60], use_numpy=False)
+    knights = [Knight(600, 500, 20)]
+    damage = predictor.predict(knights, [], 100, 500)
+    # 450 to walk at 100 a turn
+    assert damage[:4] == [0.0]*4 and all(damage[4:])
+    assert sum(predictor.predict(knights, [Tower(0, 2000)], 100, 500)) == 0
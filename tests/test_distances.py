@@ -0,0 +1,40 @@
+import math
+
+import llq
+import referee
+
+
+def strategy(seed):
+    site_lines = referee.generate_map(seed).site_lines()
+    return llq.Strategy(len(site_lines), site_lines)
+
+
+def test_site_distance_matrix():
+    for seed in range(5):
+        s = strategy(seed)
+        size = len(s.site_x)
+        for a in range(size):
+            assert s.site_distances[a][a] == 0
+            for b in range(size):
+                assert s.site_distances[a][b] == s.site_distances[b][a]
+                assert math.isclose(s.site_distances[a][b],
+                                    math.hypot(s.site_x[a]-s.site_x[b], s.site_y[a]-s.site_y[b]))
+
+
+def test_queen_etas():
+    s = strategy(3)
+    distances = s.distances_from(400, 300)
+    assert distances == [math.sqrt((400-x)**2+(300-y)**2) for x, y in zip(s.site_x, s.site_y)]
+    etas = s.queen_etas(distances)
+    assert etas == [(d-r)/llq.QUEEN_SPEED for d, r in zip(distances, s.site_r)]
+    assert s.queen_etas(s.site_distances[0])[0] == -s.site_r[0]/llq.QUEEN_SPEED
+
+
+def test_fire_conditions_match_direct_distances():
+    s = strategy(7)
+    for site_id, site in s.site_coords.items():
+        fresh = llq.Site(site.x, site.y, site.radius, site_id)
+        distances = {other.site_id: s.distance(site.x, site.y, other.x, other.y) for other in s.site_coords.values()}
+        fresh.calculate_can_fire_upon(s.site_coords, distances)
+        assert ([(c.site_id, c.needed_hp) for c in fresh.can_fire_upon]
+                == [(c.site_id, c.needed_hp) for c in site.can_fire_upon])
@@ -0,0 +1,56 @@
+import llq
+
+MINES = [(0, 1, 3, -1), (4, 2, 2, 40)]
+
+
+def test_following_the_projection_hits_the_memo():
+    planner = llq.EconomyPlanner()
+    plan = planner.get(10, 100, MINES, 0, [0], 6)
+    assert (planner.hits, planner.drifts, planner.misses) == (0, 0, 1)
+    for elapsed in range(1, 8):
+        gold, cooldowns = plan.states[elapsed]
+        assert planner.get(10+elapsed, gold, MINES, 0, list(cooldowns), 6) is plan
+    assert (planner.hits, planner.drifts, planner.misses) == (7, 0, 1)
+
+
+def test_no_barracks_hits_while_the_eta_counts_down():
+    planner = llq.EconomyPlanner()
+    plan = planner.get(10, 100, MINES, 0, [], 6)
+    gold, cooldowns = plan.states[1]
+    assert planner.get(11, gold, MINES, 0, list(cooldowns), 5) is plan
+    # the queen was held up, the barracks comes a turn later than planned
+    assert planner.get(12, plan.states[2][0], MINES, 0, [], 5) is not plan
+    assert (planner.hits, planner.drifts, planner.misses) == (1, 1, 1)
+
+
+def test_gold_drift_projects_the_rest_again():
+    planner = llq.EconomyPlanner()
+    plan = planner.get(10, 100, MINES, 0, [0], 6)
+    assert plan.upgrades > 0
+    gold, cooldowns = plan.states[1]
+    drifted = planner.get(11, gold+15, MINES, 0, list(cooldowns), 6)
+    assert drifted is not plan
+    assert (planner.hits, planner.drifts, planner.misses) == (0, 1, 1)
+    # the upgrade count chosen on the miss is kept, one turn of it is spent
+    assert drifted.upgrades == plan.upgrades-1
+    assert drifted.states[0] == (gold+15, cooldowns)
+    assert (drifted.packs, drifted.income, drifted.states) == planner.project(
+        gold+15, MINES, 0, drifted.upgrades, list(cooldowns), 6)
+
+
+def test_mine_change_misses():
+    planner = llq.EconomyPlanner()
+    plan = planner.get(10, 100, MINES, 0, [0], 6)
+    gold, cooldowns = plan.states[1]
+    # a mine lost, then the queen standing on another mine
+    fewer = planner.get(11, gold, MINES[0:1], 0, list(cooldowns), 6)
+    assert fewer is not plan
+    assert planner.get(11, gold, MINES[0:1], -1, list(cooldowns), 6) is not fewer
+    assert (planner.hits, planner.drifts, planner.misses) == (0, 0, 3)
+
+
+def test_miss_picks_the_best_upgrade_count():
+    planner = llq.EconomyPlanner()
+    plan = planner.get(10, 100, MINES, 0, [0], 6)
+    options = [planner.project(100, MINES, 0, upgrades, [0], 6) for upgrades in range(3)]
+    assert (plan.packs, plan.income) == max((packs, income) for packs, income, _ in options)
@@ -0,0 +1,94 @@
+import pytest
+
+import llq
+
+
+class Queen:
+    x = 1500
+    y = 500
+
+
+class Barracks:
+    def __init__(self, build_progress):
+        self.build_progress = build_progress
+
+
+class Side:
+    def __init__(self):
+        self.queen = Queen()
+        self.knight_barracks = {}
+
+
+class FakeStrategy:
+    def __init__(self):
+        self.current_turn = 0
+        self.enemy_side = Side()
+        self.structure_changes = llq.RingBuffer(llq.HISTORY_CHANGES)
+
+
+def test_ring_buffer_wraps_around():
+    ring = llq.RingBuffer(3)
+    assert len(ring) == 0 and list(ring) == []
+    with pytest.raises(IndexError):
+        ring[0]
+    for item in range(2):
+        ring.append(item)
+    assert list(ring) == [0, 1]
+    assert (ring[0], ring[-1]) == (0, 1)
+    for item in range(2, 8):
+        ring.append(item)
+        assert len(ring) == 3
+        assert list(ring) == [item-2, item-1, item]
+        assert [ring[i] for i in range(3)] == [ring[i] for i in range(-3, 0)] == list(ring)
+        assert list(ring.newest(2)) == [item, item-1]
+        assert list(ring.newest(10)) == [item, item-1, item-2]
+    for i in (3, -4):
+        with pytest.raises(IndexError):
+            ring[i]
+
+
+def test_builds_and_waves():
+    strategy = FakeStrategy()
+    model = llq.EnemyModel(strategy)
+    enemy = strategy.enemy_side
+    # a barracks counting down twice, retrained right away the second time
+    progress = [None, 5, 4, 3, 2, 1, 0, 5, 4, 3, 2, 1, 5, 4]
+    for turn, now in enumerate(progress, 1):
+        strategy.current_turn = turn
+        if now is not None:
+            enemy.knight_barracks[7] = Barracks(now)
+        if turn == 1:
+            strategy.structure_changes.append(llq.StructureChange(1, 3, llq.NO_STRUCTURE, llq.NO_OWNER,
+                                                                  llq.TOWER, llq.ENEMY))
+        elif turn == 2:
+            strategy.structure_changes.append(llq.StructureChange(2, 7, llq.NO_STRUCTURE, llq.NO_OWNER,
+                                                                  llq.BARRACKS, llq.ENEMY))
+            strategy.structure_changes.append(llq.StructureChange(2, 8, llq.BARRACKS, llq.ENEMY,
+                                                                  llq.NO_STRUCTURE, llq.NO_OWNER))
+        model.observe()
+    assert list(model.waves) == [7, 13]
+    # every enemy build counted once, on the turn it shows up
+    assert [change.site_id for change in model.builds] == [3, 7]
+    assert model.wave_interval() == 6
+    assert model.archetype == llq.Archetype.RUSH
+
+
+def test_classify_by_builds():
+    strategy = FakeStrategy()
+    model = llq.EnemyModel(strategy)
+    assert model.classify() == llq.Archetype.UNKNOWN
+    for site_id, kind in enumerate([llq.TOWER, llq.TOWER, llq.GOLDMINE]):
+        model.builds.append(llq.StructureChange(1, site_id, llq.NO_STRUCTURE, llq.NO_OWNER, kind, llq.ENEMY))
+    assert model.classify() == llq.Archetype.TURTLE
+    model.builds.append(llq.StructureChange(1, 5, llq.NO_STRUCTURE, llq.NO_OWNER, llq.GOLDMINE, llq.ENEMY))
+    assert model.classify() == llq.Archetype.ECO
+
+
+def test_queen_distance_averages_recent_turns():
+    model = llq.EnemyModel(FakeStrategy(), size=8)
+    assert model.queen_distance(0, 0) == 0.0
+    for x in range(0, 1000, 100):
+        model.queen_x.append(x)
+        model.queen_y.append(0)
+    assert model.queen_distance(0, 0) == (900+800+700+600)/4
+    assert model.queen_distance(0, 0, turns=20) == sum(range(200, 1000, 100))/8
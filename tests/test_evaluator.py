@@ -0,0 +1,50 @@
+import llq
+import referee
+
+
+class Target:
+    def __init__(self, site_id, own_eta, value):
+        self.site_id = site_id
+        self.own_eta = own_eta
+        self.value = value
+
+
+def test_values_over_a_game():
+    game = referee.Game(referee.generate_map(5))
+    site_lines = game.game_map.site_lines()
+    strategy = llq.Strategy(len(site_lines), site_lines, evaluate_builds=True)
+    opponent = llq.Strategy(len(site_lines), site_lines)
+    evaluator = strategy.evaluator
+    evaluate = evaluator.evaluate
+    checked = []
+
+    def check(analyzed):
+        evaluate(analyzed)
+        for site in analyzed:
+            values = (site.mine_value, site.tower_value, site.barrack_value)
+            if site.site_type == llq.SiteType.ENEMY_TOWER or (site.under_fire and not site.fire_suppressed):
+                assert values == (0, 0, 0)
+                continue
+            gold = strategy.for_mining[site.site_id]
+            if gold >= 0:
+                assert 0 <= site.mine_value <= gold
+            targets = evaluator.targets(site.site_id)
+            assert targets == strategy.coverage.hypothetical(site.site_id, llq.EVAL_TOWER_HP)
+            assert 0 <= site.tower_value <= llq.EVAL_COVER_VALUE*len(targets)
+            assert 0 <= site.barrack_value <= llq.EVAL_PACK_VALUE
+            checked.append(site.site_id)
+    evaluator.evaluate = check
+    for _ in range(60):
+        if game.over():
+            break
+        game.step([strategy.turn(*game.player_input(0)), opponent.turn(*game.player_input(1))])
+    assert checked
+
+
+def test_best_trades_value_for_eta():
+    evaluator = llq.SiteEvaluator(None)
+    near = Target(1, 1, 100)
+    far = Target(2, 5, 100+3*llq.EVAL_ETA_COST)
+    assert evaluator.best([near, far], lambda x: x.value) == 1
+    far.value += 2*llq.EVAL_ETA_COST
+    assert evaluator.best([near, far], lambda x: x.value) == 2
@@ -0,0 +1,118 @@
+import random
+
+import llq
+import referee
+from llq import SiteType
+
+FILTERS = ('filter_danger', 'filter_emergency', 'filter_emergency_with_towers', 'filter_empty',
+           'filter_for_barracks', 'filter_for_money')
+
+
+def turns(seeds=(21, 22, 23), max_turns=150):
+    for seed in seeds:
+        game = referee.Game(referee.generate_map(seed))
+        site_lines = game.game_map.site_lines()
+        players = [llq.Strategy(len(site_lines), site_lines) for _ in range(2)]
+        while not game.over() and game.turn < max_turns:
+            commands = [strategy.turn(*game.player_input(player)) for player, strategy in enumerate(players)]
+            yield players[0], list(players[0].analyze_sites().values())
+            game.step(commands)
+
+
+def exposed(site):
+    return len(site.under_fire) > 0 and not site.fire_suppressed
+
+
+def old_filter_danger(strategy, sites):
+    return [site for site in sites
+            if site.site_type not in (SiteType.ENEMY_TOWER, SiteType.OWN_MINE)
+            and not (site.site_type == SiteType.OWN_TOWER
+                     and strategy.own_side.towers[site.site_id].hp > strategy.params.tower_hp_enough)
+            and not (site.site_type == SiteType.OWN_BARRACKS
+                     and strategy.own_side.barracks[site.site_id].build_progress != 0)
+            and not exposed(site) and site.own_eta < site.enemy_eta]
+
+
+def old_filter_emergency(strategy, sites):
+    return [site for site in sites
+            if site.site_type != SiteType.ENEMY_TOWER
+            and not (site.site_type == SiteType.OWN_TOWER
+                     and strategy.own_side.towers[site.site_id].hp > strategy.params.tower_hp_enough)
+            and not (site.site_type == SiteType.OWN_BARRACKS
+                     and strategy.own_side.barracks[site.site_id].build_progress != 0)
+            and not exposed(site) and site.own_eta < site.enemy_eta]
+
+
+def old_filter_emergency_with_towers(strategy, sites):
+    return [site for site in sites
+            if site.site_type != SiteType.ENEMY_TOWER
+            and not (site.site_type == SiteType.OWN_BARRACKS
+                     and strategy.own_side.barracks[site.site_id].build_progress != 0)
+            and not exposed(site) and site.own_eta < site.enemy_eta]
+
+
+def mine_full(strategy, site):
+    if site.site_type != SiteType.OWN_MINE:
+        return False
+    mine = strategy.own_side.mines[site.site_id]
+    return mine.max_size == mine.income
+
+
+def old_filter_empty(strategy, sites):
+    return [site for site in sites
+            if site.site_type not in (SiteType.ENEMY_TOWER, SiteType.OWN_BARRACKS)
+            and not mine_full(strategy, site)
+            and not (site.site_type == SiteType.OWN_TOWER
+                     and strategy.own_side.towers[site.site_id].hp > strategy.params.tower_hp_enough)
+            and not exposed(site) and site.own_eta < site.enemy_eta]
+
+
+def old_filter_for_barracks(strategy, sites):
+    return [site for site in sites
+            if site.site_type not in (SiteType.ENEMY_TOWER, SiteType.OWN_BARRACKS, SiteType.OWN_MINE)
+            and not exposed(site)
+            and site.own_eta < site.enemy_eta-strategy.params.barracks_eta_margin]
+
+
+def old_filter_for_money(strategy, sites):
+    return [site for site in sites
+            if site.site_type != SiteType.ENEMY_TOWER
+            and not mine_full(strategy, site)
+            and strategy.for_mining[site.site_id] != 0
+            and not (site.site_type == SiteType.OWN_BARRACKS
+                     and strategy.own_side.barracks[site.site_id].build_progress != 0)
+            and not exposed(site) and site.own_eta < site.enemy_eta]
+
+
+def ids(sites):
+    return [site.site_id for site in sites]
+
+
+def test_site_filter_matches_old_loops():
+    checked = 0
+    for strategy, analyzed in turns():
+        for name in FILTERS:
+            expected = ids(globals()['old_'+name](strategy, analyzed))
+            assert ids(getattr(strategy, name)(analyzed)) == expected, (name, strategy.current_turn)
+            checked += 1
+    assert checked > 0
+
+
+def test_partial_masks_fill_in_for_new_sites():
+    # a filter asked about some of the sites first must still get the others right
+    for strategy, analyzed in turns((24,)):
+        first = strategy.filter_empty(analyzed[0::2])
+        assert ids(first) == ids(old_filter_empty(strategy, analyzed[0::2]))
+        assert ids(strategy.filter_empty(analyzed)) == ids(old_filter_empty(strategy, analyzed))
+        assert ids(strategy.filter_emergency(analyzed, 0)) == ids(
+            [site for site in old_filter_emergency_with_towers(strategy, analyzed)
+             if not (site.site_type == SiteType.OWN_TOWER and strategy.own_side.towers[site.site_id].hp > 0)])
+
+
+def test_top_k_matches_sort():
+    rng = random.Random(25)
+    strategy = next(turns((25,)))[0]
+    for size in (0, 5, llq.TOP_K_SORT-1, llq.TOP_K_SORT, 3*llq.TOP_K_SORT):
+        items = [(rng.randint(0, 20), n) for n in range(size)]
+        for k in (0, 1, 3, size):
+            assert strategy.top_k(items, lambda x: x[0], k) == sorted(items, key=lambda x: x[0])[0:k]
@@ -0,0 +1,49 @@
+import random
+
+import llq
+
+
+def brute_force(units, x, y, radius, owner, unit_type=None):
+    return {slot for slot in range(units.count)
+            if units.unit_type[slot] != llq.QUEEN and units.owner[slot] == owner
+            and (unit_type is None or units.unit_type[slot] == unit_type)
+            and (units.x[slot]-x)**2+(units.y[slot]-y)**2 < radius*radius}
+
+
+def test_grid_matches_brute_force():
+    rng = random.Random(14)
+    units = llq.UnitTable(4)
+    grid = llq.UnitGrid(units)
+    unit_types = [llq.QUEEN, llq.KNIGHT, llq.ARCHER, llq.GIANT]
+    for _ in range(100):
+        units.clear()
+        for _ in range(rng.randint(0, 60)):
+            # units may stand just outside the field, they land in the border cells
+            units.add(rng.randint(-50, llq.FIELD_WIDTH+50), rng.randint(-50, llq.FIELD_HEIGHT+50),
+                      rng.choice([llq.FRIENDLY_UNIT, llq.ENEMY_UNIT]), rng.choice(unit_types), rng.randint(1, 30))
+        grid.rebuild()
+        for _ in range(30):
+            x = rng.randint(0, llq.FIELD_WIDTH)
+            y = rng.randint(0, llq.FIELD_HEIGHT)
+            radius = rng.choice([0, 1, 60, llq.GRID_CELL, 250, 700, 2500])
+            owner = rng.choice([llq.FRIENDLY_UNIT, llq.ENEMY_UNIT])
+            unit_type = rng.choice([None, llq.KNIGHT, llq.ARCHER])
+            expected = brute_force(units, x, y, radius, owner, unit_type)
+            slots = list(grid.slots_within(x, y, radius, owner, unit_type))
+            assert len(slots) == len(set(slots))
+            assert set(slots) == expected
+            assert grid.any_within(x, y, radius, owner, unit_type) == bool(expected)
+
+
+def test_rebuild_forgets_old_units():
+    units = llq.UnitTable()
+    grid = llq.UnitGrid(units)
+    units.add(500, 500, llq.ENEMY_UNIT, llq.KNIGHT, 10)
+    grid.rebuild()
+    assert grid.any_within(520, 500, 30, llq.ENEMY_UNIT)
+    units.clear()
+    units.add(1500, 500, llq.ENEMY_UNIT, llq.KNIGHT, 10)
+    grid.rebuild()
+    assert not grid.any_within(520, 500, 30, llq.ENEMY_UNIT)
+    assert list(grid.slots_within(1500, 520, 30, llq.ENEMY_UNIT)) == [0]
+    assert not grid.any_within(1500, 520, 30, llq.FRIENDLY_UNIT)
@@ -0,0 +1,47 @@
+import llq
+import referee
+
+
+def fields(strategy):
+    return {site_id: (view.site_type, view.own_eta, view.enemy_eta, view.enemy_base_distance,
+                      list(view.under_fire), view.fire_suppressed)
+            for site_id, view in enumerate(strategy.analyzed_views) if site_id in strategy.site_coords}
+
+
+def test_fields_read_after_skipped_turns_are_current():
+    checked = 0
+    for seed in (2, 6):
+        game = referee.Game(referee.generate_map(seed))
+        site_lines = game.game_map.site_lines()
+        players = [llq.Strategy(len(site_lines), site_lines) for _ in range(2)]
+        while not game.over() and game.turn < 150:
+            inputs = [game.player_input(player) for player in range(2)]
+            commands = [strategy.turn(*turn) for strategy, turn in zip(players, inputs)]
+            # the fields are only read every third turn, the turns between leave them stale
+            if game.turn % 3 == 0:
+                fresh = llq.Strategy(len(site_lines), site_lines)
+                fresh.turn(*inputs[0])
+                assert fields(players[0]) == fields(fresh), (seed, game.turn)
+                checked += 1
+            game.step(commands)
+    assert checked > 50
+
+
+def test_new_turn_recomputes_read_fields():
+    game = referee.Game(referee.generate_map(4))
+    site_lines = game.game_map.site_lines()
+    strategy = llq.Strategy(len(site_lines), site_lines)
+    strategy.turn(*game.player_input(0))
+    views = [strategy.analyzed_views[site_id] for site_id in sorted(strategy.site_coords)]
+    before = [(view.own_eta, view.enemy_eta, view.enemy_base_distance) for view in views]
+    me = strategy.own_side.queen
+    enemy = strategy.enemy_side.queen
+    me.x, me.y = llq.FIELD_WIDTH-me.x, llq.FIELD_HEIGHT-me.y
+    enemy.x, enemy.y = llq.FIELD_WIDTH-enemy.x, llq.FIELD_HEIGHT-enemy.y
+    strategy.analyze_sites()
+    after = [(view.own_eta, view.enemy_eta, view.enemy_base_distance) for view in views]
+    assert after != before
+    own = strategy.queen_etas(strategy.distances_from(me.x, me.y))
+    other = strategy.queen_etas(strategy.distances_from(enemy.x, enemy.y))
+    base = strategy.distances_from(strategy.enemy_x, strategy.enemy_y)
+    assert after == [(own[view.site_id], other[view.site_id], base[view.site_id]) for view in views]
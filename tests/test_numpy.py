@@ -0,0 +1,42 @@
+import pytest
+
+import llq
+import referee
+
+pytest.importorskip('numpy')
+
+FILTERS = ('filter_danger', 'filter_emergency', 'filter_emergency_with_towers', 'filter_empty',
+           'filter_for_barracks', 'filter_for_money')
+
+
+def ids(sites):
+    return [site.site_id for site in sites]
+
+
+def fields(site):
+    return (site.site_type, list(site.under_fire), site.fire_suppressed,
+            round(site.own_eta, 9), round(site.enemy_eta, 9), round(site.enemy_base_distance, 9))
+
+
+def test_numpy_engine_matches_pure():
+    checked = 0
+    for seed in (1, 6, 9):
+        game = referee.Game(referee.generate_map(seed))
+        site_lines = game.game_map.site_lines()
+        pure = llq.Strategy(len(site_lines), site_lines)
+        arrays = llq.Strategy(len(site_lines), site_lines, use_numpy=True)
+        opponent = llq.Strategy(len(site_lines), site_lines)
+        while not game.over() and game.turn < 150:
+            turn = game.player_input(0)
+            command = pure.turn(*turn)
+            assert arrays.turn(*turn) == command
+            pure_sites = list(pure.analyze_sites().values())
+            array_sites = list(arrays.analyze_sites().values())
+            assert [fields(s) for s in array_sites] == [fields(s) for s in pure_sites]
+            for name in FILTERS:
+                assert ids(getattr(arrays, name)(array_sites)) == ids(getattr(pure, name)(pure_sites)), \
+                    (seed, game.turn, name)
+            assert ids(arrays.filter_emergency(array_sites, 0)) == ids(pure.filter_emergency(pure_sites, 0))
+            game.step([command, opponent.turn(*game.player_input(1))])
+            checked += 1
+    assert checked > 100
@@ -0,0 +1,73 @@
+import math
+
+import pytest
+
+import llq
+
+# a wall of one site between the queen and a site behind it
+SITE_X = [800, 1400, 300]
+SITE_Y = [500, 500, 150]
+SITE_R = [90, 60, 70]
+
+
+def planner():
+    return llq.PathPlanner(SITE_X, SITE_Y, SITE_R)
+
+
+def straight_eta(x, y, site_id):
+    d = math.sqrt((x-SITE_X[site_id])**2+(y-SITE_Y[site_id])**2)
+    return (d-SITE_R[site_id]-llq.QUEEN_R)/llq.QUEEN_SPEED
+
+
+def test_clearance():
+    paths = planner()
+    assert not paths.clear(200, 500, 1200, 500)
+    # passing well above the site and stopping short of it are both clear
+    assert paths.clear(200, 300, 1200, 300)
+    assert paths.clear(200, 500, 600, 500)
+    # a segment that starts on a site, leaving it, is not blocked by it
+    assert paths.clear(800, 500, 800, 900)
+    for x, y in zip(paths.node_x, paths.node_y):
+        assert 0 <= x <= llq.FIELD_WIDTH and 0 <= y <= llq.FIELD_HEIGHT
+        for sx, sy, r in zip(SITE_X, SITE_Y, SITE_R):
+            assert math.sqrt((x-sx)**2+(y-sy)**2) > r+llq.QUEEN_R
+
+
+def test_eta_in_the_open_is_the_straight_line():
+    etas = planner().search(200, 500, []).site_etas()
+    # graph nodes sit one unit outside touching distance
+    assert etas[0] == pytest.approx(straight_eta(200, 500, 0), abs=1/llq.QUEEN_SPEED)
+    assert etas[2] == pytest.approx(straight_eta(200, 500, 2), abs=1/llq.QUEEN_SPEED)
+
+
+def test_eta_around_a_site_is_longer():
+    etas = planner().search(200, 500, []).site_etas()
+    straight = straight_eta(200, 500, 1)
+    detour = math.pi*(SITE_R[0]+llq.QUEEN_R)/llq.QUEEN_SPEED
+    assert straight < etas[1] < straight+detour
+
+
+def test_touching_site_has_zero_eta():
+    etas = planner().search(800, 500-SITE_R[0]-llq.QUEEN_R+1, []).site_etas()
+    assert etas[0] == 0.0
+
+
+def test_towers_add_cost():
+    paths = planner()
+    free = paths.search(200, 500, [])
+    covered = paths.search(200, 500, [(500, 500, 400)])
+    # the cheapest path may walk further round the covered area, it is never shorter
+    assert all(c >= f-1e-9 for c, f in zip(covered.site_etas(), free.site_etas()))
+    assert all(c >= f for c, f in zip(covered.cost, free.cost))
+    assert any(c > f for c, f in zip(covered.cost, free.cost))
+
+
+def test_waypoint():
+    tree = planner().search(200, 500, [])
+    assert tree.waypoint(200, 900) == (200, 900)
+    assert tree.waypoint(-100, 2000) == (0, llq.FIELD_HEIGHT)
+    x, y = tree.waypoint(1400, 500)
+    assert (x, y) != (1400, 500)
+    assert tree.planner.clear(200, 500, x, y)
+    # the waypoint goes round the wall, above or below it
+    assert abs(y-500) > SITE_R[0]
@@ -0,0 +1,80 @@
+import time
+
+import llq
+import referee
+
+
+def game_strategy(profiler, **kwargs):
+    game = referee.Game(referee.generate_map(3))
+    site_lines = game.game_map.site_lines()
+    strategy = llq.Strategy(len(site_lines), site_lines, profiler=profiler, **kwargs)
+    return strategy, game
+
+
+def play(strategy, game, elapsed):
+    # the turn is started as if its input had arrived elapsed seconds ago
+    strategy.profiler.start_turn(now=time.perf_counter()-elapsed)
+    command = strategy.turn(*game.player_input(0))
+    game.step([command, ['WAIT', 'TRAIN']])
+    return command
+
+
+def test_guard_skips_the_turn_past_budget_minus_reserve():
+    profiler = llq.TurnProfiler(guard=True, budget=0.05, first_budget=1.0, reserve=0.01)
+    strategy, game = game_strategy(profiler)
+    # the first turn has its own budget
+    assert play(strategy, game, 0.5) != ['WAIT', 'TRAIN']
+    assert 'deadline' not in strategy.branch
+    assert play(strategy, game, 0.0) != ['WAIT', 'TRAIN']
+    assert play(strategy, game, 0.045) == ['WAIT', 'TRAIN']
+    assert strategy.branch == ['deadline']
+    assert (profiler.turns, profiler.guarded) == (3, 1)
+    assert 'decision' not in profiler.current
+
+
+def test_no_guard_plays_late_turns():
+    profiler = llq.TurnProfiler()
+    strategy, game = game_strategy(profiler)
+    play(strategy, game, 0.0)
+    play(strategy, game, 0.045)
+    assert 'deadline' not in strategy.branch
+    assert profiler.guarded == 0
+    assert len(profiler.wall['decision']) == 2
+
+
+class LateProfiler(llq.TurnProfiler):
+    # on time for the first check of a turn, past the deadline from the second on
+    def __init__(self):
+        super().__init__(guard=True)
+        self.checks = 0
+
+    def start_turn(self, now=None):
+        super().start_turn(now)
+        self.checks = 0
+
+    def near_deadline(self):
+        self.checks += 1
+        return self.checks > 1
+
+
+def test_guard_skips_search():
+    strategy, game = game_strategy(LateProfiler(), lookahead=True)
+
+    def choose(*args):
+        raise AssertionError('search ran past the deadline')
+    strategy.lookahead.choose = choose
+    for _ in range(3):
+        play(strategy, game, 0.0)
+        assert 'deadline' not in strategy.branch
+    assert strategy.profiler.guarded == 0
+
+
+def test_phases_and_summary():
+    profiler = llq.TurnProfiler()
+    strategy, game = game_strategy(profiler)
+    for _ in range(4):
+        play(strategy, game, 0.0)
+    for phase in llq.PROFILE_PHASES:
+        assert len(profiler.wall[phase]) == 4
+    assert profiler.wall['total'][0] >= profiler.wall['decision'][0]
+    assert profiler.summary().startswith('prof turns 4 guarded 0')
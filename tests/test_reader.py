@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+import llq
+
+
+def turn_text():
+    init = ['3', '0 100 200 60', '1 1820 800 60', '2 960 500 70']
+    turn = ['135 -1',
+            '0 -1 -1 -1 -1 -1 -1', '1 1 0 -1 -1 -1 -1', '2 0 1 12 3 150 2',
+            '2',
+            '100 950 0 -1 200', '1820 50 1 -1 200']
+    return '\n'.join(init+turn+turn)+'\n'
+
+
+@pytest.mark.parametrize('chunk', [1, 2, 3, 5, 7, 64])
+def test_numbers_split_across_chunks(monkeypatch, chunk):
+    monkeypatch.setattr(llq, 'READ_CHUNK', chunk)
+    read_fd, write_fd = os.pipe()
+    os.write(write_fd, turn_text().encode())
+    os.close(write_fd)
+    reader = llq.TurnReader(read_fd)
+    num_sites, site_lines = reader.read_init()
+    assert num_sites == 3
+    assert site_lines == ['0 100 200 60', '1 1820 800 60', '2 960 500 70']
+    for _ in range(2):
+        reader.wait()
+        reader.read_turn(num_sites)
+        assert (reader.gold, reader.touched_site) == (135, -1)
+        assert reader.site_values == [0, -1, -1, -1, -1, -1, -1, 1, 1, 0, -1, -1, -1, -1, 2, 0, 1, 12, 3, 150, 2]
+        assert reader.unit_values == [100, 950, 0, -1, 200, 1820, 50, 1, -1, 200]
+    with pytest.raises(EOFError):
+        reader.wait()
+    os.close(read_fd)
@@ -0,0 +1,73 @@
+import hashlib
+import sys
+
+import llq
+import referee
+
+
+def command_hash(factory, games, seed=0):
+    digest = hashlib.md5()
+
+    def make(num_sites, site_lines):
+        strategy = factory(num_sites, site_lines)
+        turn = strategy.turn
+
+        def recorded_turn(*args):
+            command = turn(*args)
+            digest.update(repr(command).encode())
+            return command
+        strategy.turn = recorded_turn
+        return strategy
+    results = referee.run_batch((make, make), games, seed)
+    return digest.hexdigest(), [(r.winner, r.turns, r.queen_hp) for r in results]
+
+
+def test_same_seed_same_game():
+    for seed in (0, 7, 123):
+        first = referee.play_game((llq.Strategy, llq.Strategy), seed)
+        second = referee.play_game((llq.Strategy, llq.Strategy), seed)
+        assert (first.winner, first.turns, first.queen_hp) == (second.winner, second.turns, second.queen_hp)
+        assert first.errors == second.errors == [None, None]
+
+
+def test_same_seed_same_commands():
+    assert command_hash(llq.Strategy, 6, seed=40) == command_hash(llq.Strategy, 6, seed=40)
+
+
+def test_maps_differ_per_seed():
+    assert referee.generate_map(1).site_lines() != referee.generate_map(2).site_lines()
+
+
+def test_default_matches_baseline():
+    # md5 of every command of both sides over 40 self-play games, as played by the first
+    # revision of llq.py; the default Strategy must not drift from it
+    digest, _ = command_hash(llq.Strategy, 40)
+    assert digest == '4b77c7f2f6f8020e65d281bd054fa8ed'
+
+
+OLD_REVISION = '''
+import sys
+
+
+class Strategy:
+    def __init__(self, num_sites, sites_lines):
+        self.num_sites = num_sites
+
+    def turn(self, queen_status, site_lines, unit_lines):
+        return ['WAIT', 'TRAIN']
+
+
+num_sites = int(input())
+strategy = Strategy(num_sites, [])
+while True:
+    print('\\n'.join(strategy.turn(input(), [], [])))
+'''
+
+
+def test_load_strategy_skips_stdin_loop(tmp_path):
+    path = tmp_path / 'old_llq.py'
+    path.write_text(OLD_REVISION)
+    factory = referee.load_strategy(str(path))
+    result = referee.play_game((llq.Strategy, factory), 0, max_turns=20)
+    assert result.errors == [None, None]
+    assert not hasattr(sys.modules[factory.__module__], 'strategy')
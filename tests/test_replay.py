@@ -0,0 +1,98 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import llq
+import referee
+import replay
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def record_games(directory, games, player=llq.Strategy, opponent=llq.Strategy, options=()):
+    referee.run_batch((referee.recorded(player, str(directory), options), opponent), games, seed=11)
+    return sorted(str(path) for path in directory.iterdir())
+
+
+def test_referee_round_trip(tmp_path):
+    paths = record_games(tmp_path, 4)
+    assert len(paths) == 4
+    for path in paths:
+        game = replay.load_replay(path)
+        assert game.turns
+        assert game.options == ()
+        played, mismatches = replay.replay(game)
+        assert played == len(game.turns)
+        assert mismatches == []
+
+
+def test_referee_round_trip_with_book(tmp_path):
+    player = referee.booked(llq.Strategy)
+    for path in record_games(tmp_path, 4, player, referee.booked(llq.Strategy), (llq.REPLAY_BOOK,)):
+        game = replay.load_replay(path)
+        assert game.options == (llq.REPLAY_BOOK,)
+        assert replay.replay(game)[1] == []
+
+
+def test_version_1_header(tmp_path):
+    source = record_games(tmp_path, 1)[0]
+    with open(source) as f:
+        lines = f.readlines()
+    path = tmp_path / 'old.replay'
+    path.write_text('{0} 1\n'.format(llq.REPLAY_HEADER)+''.join(lines[1:]))
+    game = replay.load_replay(str(path))
+    assert game.options == ()
+    assert replay.replay(game)[1] == []
+
+
+def test_llq_record_round_trip(tmp_path):
+    directory = tmp_path / 'referee'
+    directory.mkdir()
+    source = record_games(directory, 2)[1]
+    with open(source) as f:
+        stdin = ''.join(line[2:] for line in f if line.startswith('< '))
+    path = tmp_path / 'llq.replay'
+    subprocess.run([sys.executable, os.path.join(ROOT, 'llq.py'), '--record', str(path)],
+                   input=stdin, capture_output=True, text=True, timeout=120)
+    game = replay.load_replay(str(path))
+    recorded = replay.load_replay(source)
+    assert len(game.turns) == len(recorded.turns)
+    assert [turn.site_lines for turn in game.turns] == [turn.site_lines for turn in recorded.turns]
+    played, mismatches = replay.replay(game)
+    assert played == len(game.turns)
+    assert mismatches == []
+
+
+def test_other_strategy_mismatches(tmp_path):
+    path = record_games(tmp_path, 1)[0]
+    game = replay.load_replay(path)
+
+    def tuned(num_sites, site_lines):
+        return llq.Strategy(num_sites, site_lines, params=llq.Params(debut_turns=10, defensive_offset=0))
+    played, mismatches = replay.replay(game, tuned)
+    assert played == len(game.turns)
+    assert mismatches
+    assert mismatches[0].expected == game.turns[mismatches[0].turn].command
+    played, mismatches = replay.replay(game, tuned, stop_first=True)
+    assert len(mismatches) == 1 and played == mismatches[0].turn+1
+
+
+def test_bad_files(tmp_path):
+    path = record_games(tmp_path, 1)[0]
+    with open(path) as f:
+        lines = f.readlines()
+    bad = tmp_path / 'bad'
+    bad.mkdir()
+    cases = {
+        'header': ['# something else\n']+lines[1:],
+        'version': ['{0} 99\n'.format(llq.REPLAY_HEADER)]+lines[1:],
+        'line': lines[:5]+['? what\n']+lines[5:],
+        'truncated': [line for line in lines if not line.startswith('>')][:-1],
+    }
+    for name, content in cases.items():
+        case = bad / name
+        case.write_text(''.join(content))
+        with pytest.raises(replay.ReplayError):
+            replay.load_replay(str(case))
@@ -0,0 +1,73 @@
+import llq
+import referee
+
+
+def scheduled_game(seed, turns, check):
+    # plays until check says stop, returns the strategy of player 0
+    game = referee.Game(referee.generate_map(seed))
+    site_lines = game.game_map.site_lines()
+    strategy = llq.Strategy(len(site_lines), site_lines, schedule_creeps=True)
+    opponent = llq.Strategy(len(site_lines), site_lines)
+    scheduler = strategy.scheduler
+    update = scheduler.update
+    stop = []
+
+    def checked():
+        wave = update()
+        if check(strategy, wave):
+            stop.append(True)
+        return wave
+    scheduler.update = checked
+    for _ in range(turns):
+        if game.over() or stop:
+            break
+        game.step([strategy.turn(*game.player_input(0)), opponent.turn(*game.player_input(1))])
+    scheduler.update = update
+    return strategy
+
+
+def check_wave(strategy, wave, planned):
+    scheduler = strategy.scheduler
+    table = strategy.site_table
+    turn = strategy.current_turn
+    assert set(wave.launches) == set(scheduler.attackers())
+    assert scheduler.affordable(wave.launches, turn)
+    for site_id, launch in wave.launches.items():
+        assert site_id in strategy.own_side.barracks
+        # a barracks still training cannot be sent again before it is free
+        assert launch >= turn+table.param_1[site_id]
+        if planned:
+            # every pack of a new wave reaches its target on the same turn
+            lead = llq.CREEP_TYPES[table.param_2[site_id]][1]+scheduler.travel(site_id)
+            assert launch+lead == wave.arrival
+
+
+def test_waves_are_valid():
+    waves = []
+
+    def check(strategy, wave):
+        if wave is not None:
+            check_wave(strategy, wave, not waves or wave is not waves[-1])
+            waves.append(wave)
+    for seed in (1, 2, 3):
+        scheduled_game(seed, 120, check)
+    assert len(set(map(id, waves))) > 3
+
+
+def test_replan_when_a_barracks_is_lost():
+    strategy = scheduled_game(2, 200, lambda strategy, wave: wave is not None and len(wave.launches) > 0)
+    scheduler = strategy.scheduler
+    me = strategy.own_side
+    wave = scheduler.update()
+    assert wave is not None and wave.launches
+    replans = scheduler.replans
+    site_id = min(wave.launches)
+    del me.barracks[site_id]
+    me.knight_barracks.pop(site_id, None)
+    me.giant_barracks.pop(site_id, None)
+    replanned = scheduler.update()
+    assert scheduler.replans == replans+1
+    assert replanned is not wave
+    assert replanned is None or site_id not in replanned.launches
+    assert scheduler.update() is replanned
+    assert scheduler.replans == replans+1
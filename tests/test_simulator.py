@@ -0,0 +1,212 @@
+import pytest
+
+import llq
+import referee
+from llq import ENEMY, FRIENDLY, NO_OWNER, NO_STRUCTURE
+
+SITES = [(300, 500, 60), (1620, 500, 60), (960, 150, 70), (960, 850, 70)]
+
+
+def simulator():
+    return llq.Simulator(*[list(column) for column in zip(*SITES)])
+
+
+def make_state(queens=((100, 500), (1820, 500)), hp=(50, 50), gold=(0, 0)):
+    state = llq.SimState()
+    state.turn = 0
+    state.gold = list(gold)
+    state.queen_x = [x for x, _ in queens]
+    state.queen_y = [y for _, y in queens]
+    state.queen_hp = list(hp)
+    state.unit_x = []
+    state.unit_y = []
+    state.unit_hp = []
+    state.unit_owner = []
+    state.unit_type = []
+    state.structure_type = [NO_STRUCTURE]*len(SITES)
+    state.owner = [NO_OWNER]*len(SITES)
+    state.param_1 = [-1]*len(SITES)
+    state.param_2 = [-1]*len(SITES)
+    state.site_gold = [200]*len(SITES)
+    state.max_mine_size = [2]*len(SITES)
+    return state
+
+
+def own(state, site_id, structure_type, param_1, param_2=-1, owner=FRIENDLY):
+    state.structure_type[site_id] = structure_type
+    state.owner[site_id] = owner
+    state.param_1[site_id] = param_1
+    state.param_2[site_id] = param_2
+
+
+def add_unit(state, x, y, owner, unit_type, hp):
+    state.unit_x.append(x)
+    state.unit_y.append(y)
+    state.unit_owner.append(owner)
+    state.unit_type.append(unit_type)
+    state.unit_hp.append(hp)
+
+
+def test_move_is_done_on_arrival():
+    sim = simulator()
+    state = make_state()
+    assert not sim.step(state, ('MOVE', 400, 700))
+    d = (300**2+200**2)**0.5
+    assert (state.queen_x[0], state.queen_y[0]) == (pytest.approx(100+300/d*60), pytest.approx(500+200/d*60))
+    assert state.turn == 1
+    for _ in range(10):
+        if sim.step(state, ('MOVE', 400, 700)):
+            break
+    assert (state.queen_x[0], state.queen_y[0]) == (400, 700)
+
+
+def test_build_walks_then_lands():
+    sim = simulator()
+    state = make_state(queens=((100, 200), (1820, 500)))
+    steps = 1
+    while not sim.step(state, ('BUILD', 0, 'TOWER')):
+        steps += 1
+        assert steps < 10
+    # 270 to walk to the site edge at 60 a turn, then the build; the tower melts on its first turn
+    assert steps == 6
+    assert (state.structure_type[0], state.owner[0]) == (llq.TOWER, FRIENDLY)
+    assert state.param_1[0] == llq.TOWER_START_HP-llq.TOWER_MELT_RATE
+    assert state.param_2[0] == pytest.approx(sim.attack_radius(0, state.param_1[0]))
+    sim.step(state, ('BUILD', 0, 'TOWER'))
+    assert state.param_1[0] == llq.TOWER_START_HP+llq.TOWER_UP_PER_TURN-2*llq.TOWER_MELT_RATE
+
+
+def test_no_build_on_enemy_tower():
+    sim = simulator()
+    state = make_state(queens=((210, 500), (1820, 500)))
+    own(state, 0, llq.TOWER, 400, sim.attack_radius(0, 400), owner=ENEMY)
+    assert sim.step(state, ('BUILD', 0, 'MINE'))
+    assert (state.structure_type[0], state.owner[0]) == (llq.TOWER, ENEMY)
+
+
+def test_mines_pay_their_owner():
+    sim = simulator()
+    state = make_state()
+    own(state, 0, llq.GOLDMINE, 2)
+    own(state, 1, llq.GOLDMINE, 1, owner=ENEMY)
+    state.site_gold[1] = 1
+    sim.step(state, ('WAIT',))
+    assert state.gold == [2, 1]
+    assert state.site_gold[0] == 198
+    # an empty mine is gone
+    assert (state.structure_type[1], state.owner[1]) == (NO_STRUCTURE, NO_OWNER)
+
+
+def test_barracks_train_and_spawn():
+    sim = simulator()
+    state = make_state(gold=(llq.KNIGHT_COST+10, 0))
+    own(state, 2, llq.BARRACKS, 0, llq.KNIGHT_BARRACKS)
+    sim.step(state, ('WAIT',))
+    assert state.gold[0] == 10
+    assert state.param_1[2] == llq.KNIGHT_TRAIN-1
+    for _ in range(llq.KNIGHT_TRAIN-1):
+        assert state.unit_type == []
+        sim.step(state, ('WAIT',))
+    assert state.unit_type == [llq.KNIGHT]*llq.KNIGHT_SQUAD
+    assert state.unit_owner == [FRIENDLY]*llq.KNIGHT_SQUAD
+
+
+def test_knights_hit_the_enemy_queen_and_age():
+    sim = simulator()
+    state = make_state(queens=((100, 500), (1500, 800)))
+    add_unit(state, 1500, 700, FRIENDLY, llq.KNIGHT, 10)
+    add_unit(state, 1000, 300, ENEMY, llq.KNIGHT, 1)
+    sim.step(state, ('WAIT',))
+    assert state.queen_hp == [50, 49]
+    # a creep at CREEP_AGING hp dies of age
+    assert state.unit_owner == [FRIENDLY]
+    assert state.unit_hp == [10-llq.CREEP_AGING]
+
+
+def test_towers_shoot_creeps_before_the_queen():
+    sim = simulator()
+    state = make_state(queens=((100, 500), (400, 500)))
+    own(state, 0, llq.TOWER, 400, sim.attack_radius(0, 400))
+    add_unit(state, 300, 620, ENEMY, llq.KNIGHT, 20)
+    sim.fight(state)
+    assert state.queen_hp[1] == 50
+    assert state.unit_hp[0] < 20-llq.CREEP_AGING
+    state.unit_hp[0] = 0
+    sim.fight(state)
+    assert state.queen_hp[1] < 50
+
+
+def test_evaluate_is_symmetric_on_a_dead_queen():
+    sim = simulator()
+    alive = sim.evaluate(make_state(hp=(10, 10)))
+    assert sim.evaluate(make_state(hp=(0, 10))) < alive-50000
+    assert sim.evaluate(make_state(hp=(10, 0))) > alive+50000
+    assert sim.evaluate(make_state(hp=(10, 0)))-alive == pytest.approx(alive-sim.evaluate(make_state(hp=(0, 10))))
+
+
+def test_policy():
+    sim = simulator()
+    state = make_state()
+    # no barracks yet: the nearest free site becomes one
+    assert sim.policy(state, FRIENDLY) == ('BUILD', 0, 'BARRACKS-KNIGHT')
+    assert sim.policy(state, ENEMY) == ('BUILD', 1, 'BARRACKS-KNIGHT')
+    own(state, 3, llq.BARRACKS, 0, llq.KNIGHT_BARRACKS)
+    assert sim.policy(state, FRIENDLY) == ('BUILD', 0, 'MINE')
+    state.site_gold[0] = 0
+    assert sim.policy(state, FRIENDLY) == ('BUILD', 0, 'TOWER')
+    add_unit(state, 150, 550, ENEMY, llq.KNIGHT, 10)
+    own(state, 2, llq.TOWER, 300, sim.attack_radius(2, 300))
+    assert sim.policy(state, FRIENDLY) == ('BUILD', 0, 'TOWER')
+
+
+def test_rollout_plays_the_candidate_once_then_the_policy():
+    sim = simulator()
+    state = make_state(queens=((960, 300), (1820, 500)))
+    candidate = ('BUILD', 2, 'MINE')
+    sim.rollout(state, candidate, 12)
+    assert (state.structure_type[2], state.owner[2]) == (llq.GOLDMINE, FRIENDLY)
+    # once the mine landed the policy took over: one mine level, then a barracks
+    assert state.param_1[2] == 1
+    assert llq.BARRACKS in [t for t, o in zip(state.structure_type, state.owner) if o == FRIENDLY]
+    assert state.turn == 12
+
+
+def test_rollout_matches_stepping():
+    sim = simulator()
+    stepped = make_state(gold=(200, 200))
+    own(stepped, 3, llq.BARRACKS, 0, llq.KNIGHT_BARRACKS)
+    rolled = stepped.copy()
+    score = sim.rollout(rolled, ('MOVE', 960, 500), 8)
+    action = ('MOVE', 960, 500)
+    for _ in range(8):
+        if action is None:
+            sim.step(stepped, sim.policy(stepped, FRIENDLY))
+        elif sim.step(stepped, action):
+            action = None
+    assert score == sim.evaluate(stepped)
+    assert (rolled.queen_x, rolled.unit_x, rolled.structure_type) == (stepped.queen_x, stepped.unit_x,
+                                                                      stepped.structure_type)
+
+
+def test_search_keeps_the_root_and_returns_a_command():
+    game = referee.Game(referee.generate_map(7))
+    site_lines = game.game_map.site_lines()
+    strategy = llq.Strategy(len(site_lines), site_lines, lookahead=True)
+    opponent = llq.Strategy(len(site_lines), site_lines)
+    for _ in range(30):
+        command = strategy.turn(*game.player_input(0))
+        game.parse_queen_command(command[0])
+        game.step([command, opponent.turn(*game.player_input(1))])
+    search = strategy.lookahead
+    root = search.simulator.from_strategy(strategy)
+    before = (root.queen_x[:], root.structure_type[:], root.unit_x[:])
+    search.rollout(root, ('WAIT',), 4)
+    assert (root.queen_x, root.structure_type, root.unit_x) == before
+    assert search.nodes >= 4
+
+
+def test_command_round_trip():
+    for command in ('MOVE 120 840', 'BUILD 7 TOWER', 'BUILD 3 BARRACKS-KNIGHT', 'WAIT'):
+        assert llq.format_command(llq.parse_command(command)) == command
+    assert llq.parse_command('BUILD 3 MINE') == ('BUILD', 3, 'MINE')
+    assert llq.format_command(('MOVE', 120.7, 840.2)) == 'MOVE 120 840'
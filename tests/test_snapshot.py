@@ -0,0 +1,96 @@
+import pytest
+
+import llq
+import referee
+import snapshot
+
+
+def played_strategy(seed=3, turns=40):
+    game = referee.Game(referee.generate_map(seed))
+    site_lines = game.game_map.site_lines()
+    strategy = llq.Strategy(len(site_lines), site_lines)
+    opponent = llq.Strategy(len(site_lines), site_lines)
+    for _ in range(turns):
+        game.step([strategy.turn(*game.player_input(0)), opponent.turn(*game.player_input(1))])
+    return strategy
+
+
+@pytest.fixture
+def block():
+    strategy = played_strategy()
+    writer = snapshot.SnapshotWriter(strategy.site_x, strategy.site_y, strategy.site_r)
+    reader = snapshot.SnapshotReader(writer.name)
+    yield strategy, writer, reader
+    reader.close()
+    writer.close()
+
+
+def test_read_matches_strategy(block):
+    strategy, writer, reader = block
+    assert (reader.site_x, reader.site_y, reader.site_r) == (strategy.site_x, strategy.site_y, strategy.site_r)
+    version = writer.publish(strategy)
+    assert reader.latest() == version
+    state = reader.read()
+    table = strategy.site_table
+    units = strategy.unit_table
+    assert (state.turn, state.gold[0]) == (strategy.current_turn, strategy.own_side.owned_gold)
+    assert state.structure_type == table.structure_type
+    assert (state.owner, state.param_1, state.param_2) == (table.owner, table.param_1, table.param_2)
+    queens = [slot for slot in range(units.count) if units.unit_type[slot] == llq.QUEEN]
+    assert sorted(zip(state.queen_x, state.queen_y)) == sorted((units.x[i], units.y[i]) for i in queens)
+    assert len(state.unit_x) == units.count-len(queens)
+
+
+def test_versions_alternate_slots(block):
+    strategy, writer, reader = block
+    layout = writer.layout
+    assert layout.slot(1) != layout.slot(2)
+    assert layout.slot(1) == layout.slot(3)
+    first = writer.publish(strategy)
+    strategy.current_turn += 1
+    second = writer.publish(strategy)
+    # the previous version sits in the other slot and is still readable
+    assert reader.read(first).turn == strategy.current_turn-1
+    assert reader.read(second).turn == strategy.current_turn
+    writer.publish(strategy)
+    with pytest.raises(snapshot.SnapshotError, match='version {0} '.format(first)):
+        reader.read(first)
+
+
+class Tearing:
+    # publishes twice while the reader copies, so the slot it is reading is rewritten
+    def __init__(self, writer, strategy, times):
+        self.writer = writer
+        self.strategy = strategy
+        self.times = times
+        self.calls = 0
+        self.make = llq.SimState
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.times:
+            self.writer.publish(self.strategy)
+            self.writer.publish(self.strategy)
+        return self.make()
+
+
+def test_torn_read_retries(block, monkeypatch):
+    strategy, writer, reader = block
+    writer.publish(strategy)
+    tearing = Tearing(writer, strategy, 2)
+    monkeypatch.setattr(snapshot.llq, 'SimState', tearing)
+    state = reader.read()
+    assert tearing.calls == 3
+    assert reader.latest() == 5
+    assert state.turn == strategy.current_turn
+
+
+def test_torn_read_gives_up_with_the_version_tried(block, monkeypatch):
+    strategy, writer, reader = block
+    writer.publish(strategy)
+    monkeypatch.setattr(snapshot.llq, 'SimState', Tearing(writer, strategy, 100))
+    with pytest.raises(snapshot.SnapshotError, match='version 5 '):
+        reader.read(retries=3)
+    # a fixed version is not retried
+    with pytest.raises(snapshot.SnapshotError, match='version 7 '):
+        reader.read(7)
@@ -0,0 +1,51 @@
+import llq
+import referee
+
+
+def test_unit_table_grows_and_reuses_slots():
+    units = llq.UnitTable(2)
+    views = [units.add(10*n, 20*n, n % 2, llq.KNIGHT, n) for n in range(5)]
+    assert units.count == 5 and len(units.views) >= 5
+    # views handed out before the table grew still read their own slot
+    assert [(view.x, view.y, view.owner, view.hp) for view in views] == [(10*n, 20*n, n % 2, n) for n in range(5)]
+    views[1].hp = 99
+    assert units.hp[1] == 99
+    units.clear()
+    assert units.count == 0
+    again = units.add(1, 2, llq.ENEMY_UNIT, llq.GIANT, 7)
+    assert again is views[0]
+    assert (again.x, again.y, again.unit_type, again.hp) == (1, 2, llq.GIANT, 7)
+
+
+def test_site_views_share_the_table():
+    table = llq.SiteTable(4)
+    mine = llq.Mine(table, 2)
+    status = llq.SiteStatus(table, 2)
+    tower = llq.Tower(table, 3)
+    barrack = llq.Barrack(table, 3)
+    mine.income = 2
+    status.max_mine_size = 3
+    assert (table.param_1[2], mine.max_size) == (2, 3)
+    table.param_1[3] = 400
+    table.param_2[3] = 250
+    assert (tower.hp, tower.attack_radius) == (400, 250)
+    assert (barrack.build_progress, barrack.creep_type) == (400, 250)
+    assert table.param_1[0:2] == [-1, -1]
+
+
+def test_views_are_reused_across_turns():
+    game = referee.Game(referee.generate_map(6))
+    site_lines = game.game_map.site_lines()
+    players = [llq.Strategy(len(site_lines), site_lines) for _ in range(2)]
+    strategy = players[0]
+    analyzed = None
+    queen = None
+    for _ in range(30):
+        commands = [player.turn(*game.player_input(n)) for n, player in enumerate(players)]
+        if analyzed is not None:
+            assert strategy.analyzed_views == analyzed
+            assert strategy.own_side.queen is queen
+        analyzed = list(strategy.analyzed_views)
+        queen = strategy.own_side.queen
+        assert (queen.x, queen.y) == (strategy.unit_table.x[queen.slot], strategy.unit_table.y[queen.slot])
+        game.step(commands)
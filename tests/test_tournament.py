@@ -0,0 +1,130 @@
+import math
+
+import pytest
+
+import llq
+import tournament
+from tournament import PairStats, Tournament, Variant
+
+
+def stats(wins, draws, losses):
+    result = PairStats()
+    for winner, count in ((0, wins), (-1, draws), (1, losses)):
+        for _ in range(count):
+            result.add(winner)
+    return result
+
+
+def test_elo_score_round_trip():
+    assert tournament.score_to_elo(0.5) == 0
+    assert tournament.elo_to_score(0) == 0.5
+    for elo in (-600, -100, -10, 0, 35, 400):
+        assert tournament.score_to_elo(tournament.elo_to_score(elo)) == pytest.approx(elo)
+    # 400 elo is ten to one
+    assert tournament.elo_to_score(400) == pytest.approx(10/11)
+    assert tournament.score_to_elo(0) == -math.inf
+    assert tournament.score_to_elo(1) == math.inf
+
+
+def test_sprt_bounds():
+    lower, upper = tournament.sprt_bounds(0.05, 0.05)
+    assert lower == pytest.approx(math.log(0.05/0.95))
+    assert upper == pytest.approx(-lower)
+    lower, upper = tournament.sprt_bounds(0.05, 0.1)
+    assert lower == pytest.approx(math.log(0.1/0.95))
+    assert upper == pytest.approx(math.log(0.9/0.05))
+
+
+def test_pair_stats():
+    pair = stats(6, 2, 2)
+    assert pair.games() == 10
+    assert pair.score() == pytest.approx(0.7)
+    # per game scores 1, 0.5 and 0 around their mean
+    assert pair.variance() == pytest.approx((6*0.3**2+2*0.2**2+2*0.7**2)/10)
+    low, high = pair.elo_interval()
+    assert low < pair.elo() < high
+    assert stats(60, 20, 20).elo_interval()[1]-stats(60, 20, 20).elo_interval()[0] < high-low
+
+
+def test_llr():
+    assert stats(0, 0, 0).llr(0, 10) == 0
+    assert stats(60, 10, 30).llr(0, 10) > 0
+    assert stats(30, 10, 60).llr(0, 10) < 0
+    # right between the hypotheses neither is favoured
+    assert stats(50, 0, 50).llr(-10, 10) == pytest.approx(0)
+    # no variance: one virtual draw keeps it finite
+    assert math.isfinite(stats(20, 0, 0).llr(0, 10))
+    assert stats(20, 0, 0).llr(0, 10) > 0
+
+
+def test_bradley_terry_two_players_match_score():
+    ratings = tournament.bradley_terry(['a', 'b'], {('a', 'b'): stats(70, 10, 20)})
+    assert ratings['a'] == 0
+    assert ratings['a']-ratings['b'] == pytest.approx(tournament.score_to_elo(0.75), abs=0.1)
+
+
+def test_bradley_terry_orders_three_players():
+    pairs = {('a', 'b'): stats(60, 0, 40), ('a', 'c'): stats(80, 0, 20), ('b', 'c'): stats(70, 0, 30)}
+    ratings = tournament.bradley_terry(['a', 'b', 'c'], pairs)
+    assert ratings['a'] > ratings['b'] > ratings['c']
+
+
+def test_sprt_stops_pair():
+    variants = [Variant('a', tournament.__file__), Variant('b', tournament.__file__)]
+    played = Tournament(variants, 1000)
+    for _ in range(200):
+        played.record(0, 1, 0)
+    assert played.pairs[('a', 'b')].decision == 'H1'
+    assert not played.open_pair(0, 1)
+    played = Tournament(variants, 1000, elo0=0, elo1=50)
+    for n in range(400):
+        played.record(0, 1, n % 2)
+    assert played.pairs[('a', 'b')].decision == 'H0'
+
+
+def test_variant_parse():
+    variant = Variant.parse('new=path/llq.py:Other@queen_far=700,bold_eta=1.5')
+    assert (variant.name, variant.path, variant.class_name) == ('new', 'path/llq.py', 'Other')
+    assert variant.params == {'queen_far': 700, 'bold_eta': 1.5}
+    variant = Variant.parse('path/llq.py')
+    assert (variant.name, variant.class_name, variant.params) == ('llq', 'Strategy', {})
+
+
+def test_resume_only_matches_same_spec(tmp_path):
+    first = tmp_path / 'a.py'
+    second = tmp_path / 'b.py'
+    first.write_text('# a\n')
+    second.write_text('# b\n')
+    results = tmp_path / 'results.tsv'
+    base = [Variant('a', str(first)), Variant('b', str(second))]
+    done = Tournament(base, 4)
+    rows = []
+    for seed, swapped in ((0, 0), (0, 1)):
+        rows.append('\t'.join(['a', 'b', done.specs[0], done.specs[1], str(seed), str(swapped), '0', '50']))
+    # a row of the old format is dropped instead of merged
+    rows.append('a\tb\t1\t0\t0\t50')
+    results.write_text('\n'.join(rows)+'\n')
+    played = tournament.read_results(str(results))
+    assert len(done.jobs(played)) == 2
+    assert Tournament(base, 4).pairs[('a', 'b')].games() == 0
+
+    tuned = [Variant('a', str(first), params={'queen_far': 700}), Variant('b', str(second))]
+    assert len(Tournament(tuned, 4).jobs(played)) == 4
+    booked = [Variant('a', str(first), book=True), Variant('b', str(second))]
+    assert len(Tournament(booked, 4).jobs(played)) == 4
+    second.write_text('# b, edited\n')
+    assert len(Tournament(base, 4).jobs(played)) == 4
+
+
+def test_variant_flags():
+    path = llq.__file__
+    variant = Variant.parse('new={0}+lookahead@queen_far=700'.format(path))
+    assert (variant.name, variant.path, variant.flags) == ('new', path, ('lookahead',))
+    assert variant.params == {'queen_far': 700}
+    factory = variant.load()
+    assert factory.keywords['lookahead'] is True
+    assert factory.keywords['params'].queen_far == 700
+    assert '+lookahead' in variant.spec()
+    assert variant.spec() != Variant.parse('new={0}@queen_far=700'.format(path)).spec()
+    with pytest.raises(ValueError):
+        Variant.parse('{0}+no_such_feature'.format(path))
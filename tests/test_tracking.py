@@ -0,0 +1,62 @@
+import llq
+import referee
+
+
+def sides(strategy):
+    result = []
+    for side in (strategy.own_side, strategy.enemy_side):
+        result.append([sorted(d) for d in (side.mines, side.towers, side.barracks, side.knight_barracks,
+                                           side.archer_barracks, side.giant_barracks)])
+        result.append(side.building_centroid())
+    return result
+
+
+def fire(strategy):
+    return {site_id: (list(site.under_fire), site.fire_suppressed)
+            for site_id, site in strategy.analyze_sites().items()}
+
+
+def covering(strategy):
+    return [{site_id: towers for site_id, towers in by_owner.items() if towers}
+            for by_owner in strategy.coverage.covering]
+
+
+def test_incremental_state_matches_a_fresh_parse():
+    checked = 0
+    for seed in (2, 5, 8):
+        game = referee.Game(referee.generate_map(seed))
+        site_lines = game.game_map.site_lines()
+        players = [llq.Strategy(len(site_lines), site_lines) for _ in range(2)]
+        while not game.over() and game.turn < 120:
+            inputs = [game.player_input(player) for player in range(2)]
+            commands = [strategy.turn(*turn) for strategy, turn in zip(players, inputs)]
+            fresh = llq.Strategy(len(site_lines), site_lines)
+            fresh.turn(*inputs[0])
+            tracked = players[0]
+            table = tracked.site_table
+            for name in ('gold', 'max_mine_size', 'structure_type', 'owner', 'param_1', 'param_2'):
+                assert getattr(table, name) == getattr(fresh.site_table, name), (seed, game.turn, name)
+            assert tracked.free_sites == fresh.free_sites
+            assert sides(tracked) == sides(fresh)
+            assert fire(tracked) == fire(fresh)
+            assert covering(tracked) == covering(fresh)
+            game.step(commands)
+            checked += 1
+    assert checked > 100
+
+
+def test_tower_order_follows_site_ids():
+    game = referee.Game(referee.generate_map(4))
+    site_lines = game.game_map.site_lines()
+    strategy = llq.Strategy(len(site_lines), site_lines)
+    strategy.turn(*game.player_input(0))
+    # enemy towers appear in descending site order
+    for site_id in sorted(range(len(game.sites)), reverse=True)[:3]:
+        site = game.sites[site_id]
+        site.structure_type = llq.TOWER
+        site.owner = 1
+        site.tower_hp = 400
+        strategy.turn(*game.player_input(0))
+    assert list(strategy.enemy_side.towers) != sorted(strategy.enemy_side.towers)
+    order = strategy.site_analysis.tower_order
+    assert sorted(order, key=order.get) == sorted(strategy.enemy_side.towers)
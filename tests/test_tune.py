@@ -0,0 +1,49 @@
+import os
+import sys
+
+import pytest
+
+import llq
+import referee
+
+np = pytest.importorskip('numpy')
+import tune  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_write_defaults_round_trips_params(tmp_path):
+    path = tmp_path / 'llq_tuned.py'
+    with open(os.path.join(ROOT, 'llq.py')) as f:
+        path.write_text(f.read())
+    params = llq.Params().as_dict()
+    changed = {name: high if value != high else low for (name, _, low, high), value
+               in zip(llq.PARAM_SPACE, params.values())}
+    tune.write_defaults(str(path), changed)
+    module = sys.modules[referee.load_strategy(str(path)).__module__]
+    assert module.Params().as_dict() == changed
+    assert [name for name, _, _, _ in module.PARAM_SPACE] == list(params)
+    assert [space[2:] for space in module.PARAM_SPACE] == [space[2:] for space in llq.PARAM_SPACE]
+    with pytest.raises(ValueError):
+        tune.write_defaults(str(path), {'no_such_param': 1})
+
+
+def test_vector_round_trip():
+    params = llq.Params().as_dict()
+    x = tune.to_vector(params, llq.PARAM_SPACE)
+    assert all(0 <= value <= 1 for value in x)
+    assert tune.to_params(x, llq.PARAM_SPACE) == params
+    # out of range coordinates clamp to the bounds
+    low = tune.to_params([-1.0]*len(x), llq.PARAM_SPACE)
+    high = tune.to_params([2.0]*len(x), llq.PARAM_SPACE)
+    assert low == {name: lo for name, _, lo, _ in llq.PARAM_SPACE}
+    assert high == {name: hi for name, _, _, hi in llq.PARAM_SPACE}
+
+
+def test_cmaes_minimizes_a_sphere():
+    target = np.array([0.2, 0.7, 0.4, 0.9])
+    es = tune.CMAES([0.5]*4, 0.3, seed=3)
+    for _ in range(60):
+        xs = es.ask()
+        es.tell(xs, [float(np.sum((x-target)**2)) for x in xs])
+    assert np.abs(es.mean-target).max() < 1e-3
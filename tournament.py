@@ -0,0 +1,331 @@
+import argparse
+import collections
+import functools
+import hashlib
+import math
+import multiprocessing
+import os
+import queue
+import sys
+import time
+
+import referee
+
+# opt-in Strategy features a variant can switch on with +name
+VARIANT_FLAGS = ('lookahead', 'predict_creeps', 'plan_economy', 'evaluate_builds', 'plan_paths', 'model_enemy',
+                 'schedule_creeps')
+
+
+class Variant:
+    def __init__(self, name, path, class_name='Strategy', params=None, book=False, flags=()):
+        self.name = name
+        self.path = path
+        self.class_name = class_name
+        self.params = params or {}
+        self.book = book
+        self.flags = tuple(flags)
+
+    @staticmethod
+    def parse(spec):
+        spec, _, overrides = spec.partition('@')
+        name, sep, rest = spec.partition('=')
+        if not sep:
+            rest = name
+            name = None
+        rest, *flags = rest.split('+')
+        path, sep, class_name = rest.partition(':')
+        if name is None:
+            name = os.path.splitext(os.path.basename(path))[0]
+        for flag in flags:
+            if flag not in VARIANT_FLAGS:
+                raise ValueError('unknown variant flag {0}, expected one of {1}'.format(flag, ', '.join(VARIANT_FLAGS)))
+        params = {}
+        for override in overrides.split(','):
+            if override:
+                key, _, value = override.partition('=')
+                params[key] = float(value) if '.' in value else int(value)
+        return Variant(name, path, class_name or 'Strategy', params, flags=flags)
+
+    def spec(self):
+        # written with every result, so a resumed run only counts games of the same code and settings
+        with open(self.path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()[:12]
+        spec = '{0}:{1}'.format(digest, self.class_name)
+        for flag in sorted(self.flags+(('book',) if self.book else ())):
+            spec += '+'+flag
+        if self.params:
+            spec += '@'+','.join('{0}={1}'.format(k, v) for k, v in sorted(self.params.items()))
+        return spec
+
+    def load(self):
+        factory = referee.load_strategy(self.path, self.class_name)
+        module = sys.modules[factory.__module__]
+        if self.book:
+            factory = referee.booked(factory)
+        kwargs = {flag: True for flag in self.flags}
+        if self.params:
+            kwargs['params'] = module.Params(**self.params)
+        if not kwargs:
+            return factory
+        return functools.partial(factory, **kwargs)
+
+
+class PairStats:
+    def __init__(self):
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+        self.decision = None
+
+    def add(self, winner):
+        if winner == 0:
+            self.wins += 1
+        elif winner == 1:
+            self.losses += 1
+        else:
+            self.draws += 1
+
+    def games(self):
+        return self.wins+self.draws+self.losses
+
+    def score(self):
+        n = self.games()
+        return (self.wins+0.5*self.draws)/n if n else 0.5
+
+    def variance(self, extra_draws=0):
+        n = self.games()+extra_draws
+        if n == 0:
+            return 0.0
+        draws = self.draws+extra_draws
+        s = (self.wins+0.5*draws)/n
+        return (self.wins*(1-s)**2+draws*(0.5-s)**2+self.losses*s**2)/n
+
+    def elo(self):
+        return score_to_elo(self.score())
+
+    def elo_interval(self, z=1.96):
+        n = self.games()
+        if n == 0:
+            return -math.inf, math.inf
+        margin = z*(self.variance()/n)**0.5
+        return score_to_elo(self.score()-margin), score_to_elo(self.score()+margin)
+
+    def llr(self, elo0, elo1):
+        n = self.games()
+        if n == 0:
+            return 0.0
+        var = self.variance()
+        if var == 0:
+            # all games ended the same way, fall back to one virtual draw
+            var = self.variance(extra_draws=1)
+        s0 = elo_to_score(elo0)
+        s1 = elo_to_score(elo1)
+        total = self.wins+0.5*self.draws
+        return (s1-s0)*(2*total-n*(s0+s1))/(2*var)
+
+
+def elo_to_score(elo):
+    return 1/(1+10**(-elo/400))
+
+
+def score_to_elo(score):
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return -400*math.log10(1/score-1)
+
+
+def sprt_bounds(alpha, beta):
+    return math.log(beta/(1-alpha)), math.log((1-beta)/alpha)
+
+
+def bradley_terry(names, pairs, iterations=200):
+    strength = {name: 1.0 for name in names}
+    for _ in range(iterations):
+        updated = {}
+        for name in names:
+            won = 0.0
+            denom = 0.0
+            for (a, b), stats in pairs.items():
+                n = stats.games()
+                if n == 0 or name not in (a, b):
+                    continue
+                score = stats.wins+0.5*stats.draws
+                other = b if name == a else a
+                won += score if name == a else n-score
+                denom += n/(strength[name]+strength[other])
+            updated[name] = max(won, 0.5)/denom if denom else strength[name]
+        norm = updated[names[0]]
+        strength = {name: value/norm for name, value in updated.items()}
+    return {name: 400*math.log10(value) for name, value in strength.items()}
+
+
+_worker_variants = None
+
+
+def _init_worker(variants):
+    global _worker_variants
+    _worker_variants = variants
+
+
+def _play(job):
+    a, b, seed, swapped, max_turns = job
+    factories = (_worker_variants[a].load(), _worker_variants[b].load())
+    if swapped:
+        result = referee.play_game(factories[::-1], seed, max_turns).swapped()
+    else:
+        result = referee.play_game(factories, seed, max_turns)
+    return a, b, seed, swapped, result.winner, result.turns
+
+
+def read_results(path):
+    played = {}
+    if not path or not os.path.exists(path):
+        return played
+    with open(path) as f:
+        for line in f:
+            if line.startswith('#') or not line.strip():
+                continue
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) != 8:
+                # rows without variant specs cannot be matched to a variant, play them again
+                continue
+            a, b, spec_a, spec_b, seed, swapped, winner, turns = fields
+            played[(a, b, spec_a, spec_b, int(seed), int(swapped))] = (int(winner), int(turns))
+    return played
+
+
+class Tournament:
+    def __init__(self, variants, max_games, seed=0, max_turns=referee.MAX_TURNS,
+                 elo0=0.0, elo1=10.0, alpha=0.05, beta=0.05, results_path=None):
+        self.variants = variants
+        self.names = [v.name for v in variants]
+        self.specs = [v.spec() for v in variants]
+        self.max_games = max_games
+        self.seed = seed
+        self.max_turns = max_turns
+        self.elo0 = elo0
+        self.elo1 = elo1
+        self.lower, self.upper = sprt_bounds(alpha, beta)
+        self.results_path = results_path
+        self.pairs = {}
+        for i in range(len(variants)):
+            for j in range(i+1, len(variants)):
+                self.pairs[(self.names[i], self.names[j])] = PairStats()
+
+    def record(self, a, b, winner):
+        stats = self.pairs[(self.names[a], self.names[b])]
+        stats.add(winner)
+        if stats.decision is None:
+            llr = stats.llr(self.elo0, self.elo1)
+            if llr >= self.upper:
+                stats.decision = 'H1'
+            elif llr <= self.lower:
+                stats.decision = 'H0'
+
+    def open_pair(self, a, b):
+        stats = self.pairs[(self.names[a], self.names[b])]
+        return stats.decision is None and stats.games() < self.max_games
+
+    def jobs(self, played):
+        pending = collections.deque()
+        for n in range(self.max_games):
+            seed = self.seed+n//2
+            swapped = n % 2
+            for i in range(len(self.variants)):
+                for j in range(i+1, len(self.variants)):
+                    key = (self.names[i], self.names[j], self.specs[i], self.specs[j], seed, swapped)
+                    if key in played:
+                        self.record(i, j, played[key][0])
+                    else:
+                        pending.append((i, j, seed, swapped, self.max_turns))
+        return pending
+
+    def run(self, processes=None, report_every=30.0, report=print):
+        played = read_results(self.results_path)
+        pending = self.jobs(played)
+        done = queue.Queue()
+        out = open(self.results_path, 'a') if self.results_path else None
+        processes = processes or os.cpu_count()
+        pool = multiprocessing.Pool(processes, _init_worker, (self.variants,))
+        in_flight = 0
+        last_report = time.time()
+        try:
+            while pending or in_flight:
+                while pending and in_flight < processes*2:
+                    job = pending.popleft()
+                    if not self.open_pair(job[0], job[1]):
+                        continue
+                    pool.apply_async(_play, (job,), callback=done.put, error_callback=done.put)
+                    in_flight += 1
+                if not in_flight:
+                    break
+                result = done.get()
+                in_flight -= 1
+                if isinstance(result, BaseException):
+                    raise result
+                a, b, seed, swapped, winner, turns = result
+                self.record(a, b, winner)
+                if out:
+                    out.write('{0}\t{1}\t{2}\t{3}\t{4}\t{5}\t{6}\t{7}\n'.format(
+                        self.names[a], self.names[b], self.specs[a], self.specs[b], seed, swapped, winner, turns))
+                if time.time()-last_report > report_every:
+                    report(self.report())
+                    last_report = time.time()
+        finally:
+            pool.terminate()
+            pool.join()
+            if out:
+                out.close()
+        return self.report()
+
+    def report(self):
+        lines = []
+        ratings = bradley_terry(self.names, self.pairs)
+        lines.append('{0:<16} {1:>8}'.format('variant', 'elo'))
+        for name in sorted(self.names, key=lambda x: -ratings[x]):
+            lines.append('{0:<16} {1:>8.1f}'.format(name, ratings[name]))
+        lines.append('{0:<33} {1:>6} {2:>6} {3:>6} {4:>6} {5:>7} {6:>17} {7:>7} {8}'.format(
+            'pair', 'games', 'wins', 'draws', 'losses', 'elo', '95% ci', 'llr', 'sprt'))
+        for (a, b), stats in self.pairs.items():
+            low, high = stats.elo_interval()
+            lines.append('{0:<33} {1:>6} {2:>6} {3:>6} {4:>6} {5:>7.1f} {6:>8.1f},{7:>8.1f} {8:>7.2f} {9}'.format(
+                '{0} vs {1}'.format(a, b), stats.games(), stats.wins, stats.draws, stats.losses,
+                stats.elo(), low, high, stats.llr(self.elo0, self.elo1), stats.decision or '-'))
+        return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Parallel self-play tournament between llq.py variants')
+    parser.add_argument('variants', nargs='+', help='name=path/to/llq.py[:Class][+flag...][@param=value,...], '
+                        'flags: {0}'.format(', '.join(VARIANT_FLAGS)))
+    parser.add_argument('--games', type=int, default=1000, help='maximum games per pair')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-turns', type=int, default=referee.MAX_TURNS)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--results', default=None, help='tab separated results file, appended to and resumed from')
+    parser.add_argument('--elo0', type=float, default=0.0)
+    parser.add_argument('--elo1', type=float, default=10.0)
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--beta', type=float, default=0.05)
+    parser.add_argument('--book', action='store_true', help='play every variant with its opening book, as llq.py does')
+    args = parser.parse_args(argv)
+
+    try:
+        variants = [Variant.parse(spec) for spec in args.variants]
+    except ValueError as e:
+        parser.error(str(e))
+    for variant in variants:
+        variant.book = args.book
+    if len(variants) < 2:
+        parser.error('need at least two variants')
+    if len(set(v.name for v in variants)) != len(variants):
+        parser.error('variant names must be unique')
+    tournament = Tournament(variants, args.games, args.seed, args.max_turns,
+                            args.elo0, args.elo1, args.alpha, args.beta, args.results)
+    print(tournament.run(args.processes))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+import argparse
+import math
+import multiprocessing
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+import llq
+import referee
+
+
+class CMAES:
+    def __init__(self, mean, sigma, seed=0):
+        n = len(mean)
+        self.n = n
+        self.mean = np.array(mean, dtype=float)
+        self.sigma = sigma
+        self.rng = np.random.default_rng(seed)
+        self.popsize = 4+int(3*math.log(n))
+        self.mu = self.popsize//2
+        weights = math.log(self.mu+0.5)-np.log(np.arange(1, self.mu+1))
+        self.weights = weights/weights.sum()
+        self.mueff = 1/np.sum(self.weights**2)
+        self.cc = (4+self.mueff/n)/(n+4+2*self.mueff/n)
+        self.cs = (self.mueff+2)/(n+self.mueff+5)
+        self.c1 = 2/((n+1.3)**2+self.mueff)
+        self.cmu = min(1-self.c1, 2*(self.mueff-2+1/self.mueff)/((n+2)**2+self.mueff))
+        self.damps = 1+2*max(0.0, math.sqrt((self.mueff-1)/(n+1))-1)+self.cs
+        self.chi_n = math.sqrt(n)*(1-1/(4*n)+1/(21*n*n))
+        self.pc = np.zeros(n)
+        self.ps = np.zeros(n)
+        self.B = np.eye(n)
+        self.D = np.ones(n)
+        self.C = np.eye(n)
+        self.generation = 0
+
+    def ask(self):
+        z = self.rng.standard_normal((self.popsize, self.n))
+        return self.mean+self.sigma*(z*self.D) @ self.B.T
+
+    def tell(self, xs, losses):
+        order = np.argsort(losses, kind='stable')
+        selected = xs[order[:self.mu]]
+        old = self.mean
+        self.mean = self.weights @ selected
+        step = (self.mean-old)/self.sigma
+        inv_sqrt_c = self.B @ np.diag(1/self.D) @ self.B.T
+        self.ps = (1-self.cs)*self.ps+math.sqrt(self.cs*(2-self.cs)*self.mueff)*(inv_sqrt_c @ step)
+        self.generation += 1
+        norm_ps = np.linalg.norm(self.ps)
+        hsig = norm_ps/math.sqrt(1-(1-self.cs)**(2*self.generation))/self.chi_n < 1.4+2/(self.n+1)
+        self.pc = (1-self.cc)*self.pc+hsig*math.sqrt(self.cc*(2-self.cc)*self.mueff)*step
+        artmp = (selected-old)/self.sigma
+        self.C = ((1-self.c1-self.cmu)*self.C
+                  + self.c1*(np.outer(self.pc, self.pc)+(1-hsig)*self.cc*(2-self.cc)*self.C)
+                  + self.cmu*(artmp.T*self.weights) @ artmp)
+        self.sigma *= math.exp((self.cs/self.damps)*(norm_ps/self.chi_n-1))
+        self.C = np.triu(self.C)+np.triu(self.C, 1).T
+        eigenvalues, self.B = np.linalg.eigh(self.C)
+        self.D = np.sqrt(np.maximum(eigenvalues, 1e-20))
+
+
+def to_params(x, space):
+    params = {}
+    for value, (name, _, low, high) in zip(x, space):
+        params[name] = int(round(low+min(max(value, 0.0), 1.0)*(high-low)))
+    return params
+
+
+def to_vector(params, space):
+    return [(params[name]-low)/(high-low) for name, _, low, high in space]
+
+
+_worker_strategy = None
+_worker_module = None
+
+
+def _init_worker(path, book=False):
+    global _worker_strategy, _worker_module
+    _worker_strategy = referee.load_strategy(path) if path else llq.Strategy
+    _worker_module = sys.modules[_worker_strategy.__module__]
+    if book:
+        _worker_strategy = referee.booked(_worker_strategy)
+
+
+def _play(job):
+    index, params, seed, swapped, max_turns = job
+    tuned = _worker_module.Params(**params)
+
+    def player(num_sites, site_lines):
+        return _worker_strategy(num_sites, site_lines, params=tuned)
+    if swapped:
+        result = referee.play_game((_worker_strategy, player), seed, max_turns).swapped()
+    else:
+        result = referee.play_game((player, _worker_strategy), seed, max_turns)
+    return index, 1.0 if result.winner == 0 else 0.5 if result.winner == -1 else 0.0
+
+
+def evaluate(pool, candidates, games, seed, max_turns):
+    jobs = []
+    for index, params in enumerate(candidates):
+        for n in range(games):
+            jobs.append((index, params, seed+n//2, n % 2, max_turns))
+    scores = [0.0]*len(candidates)
+    for index, score in pool.imap_unordered(_play, jobs):
+        scores[index] += score
+    return [score/games for score in scores]
+
+
+def write_defaults(path, params):
+    with open(path) as f:
+        source = f.read()
+    for name, value in params.items():
+        source, count = re.subn(r"^(    \('{0}', )-?[0-9.]+,".format(name), r'\g<1>{0},'.format(value),
+                                source, count=1, flags=re.M)
+        if count != 1:
+            raise ValueError('{0}: parameter {1} not found in PARAM_SPACE'.format(path, name))
+    with open(path, 'w') as f:
+        f.write(source)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Tune llq.py PARAM_SPACE with CMA-ES in parallel self-play')
+    parser.add_argument('--strategy', default=None, help='llq.py revision to tune (default: this llq)')
+    parser.add_argument('--generations', type=int, default=30)
+    parser.add_argument('--games', type=int, default=20, help='games per candidate against the defaults')
+    parser.add_argument('--validate', type=int, default=200, help='games to check the final mean on fresh seeds')
+    parser.add_argument('--sigma', type=float, default=0.2, help='initial step, as a fraction of each range')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-turns', type=int, default=referee.MAX_TURNS)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--only', default=None, help='comma separated parameters to tune, the rest stay fixed')
+    parser.add_argument('--write', default=None, help='llq.py to write the tuned defaults into')
+    parser.add_argument('--book', action='store_true', help='play both sides with the opening book, as llq.py does')
+    parser.add_argument('--force', action='store_true', help='write even if validation does not beat the defaults')
+    args = parser.parse_args(argv)
+
+    strategy = referee.load_strategy(args.strategy) if args.strategy else llq.Strategy
+    space = sys.modules[strategy.__module__].PARAM_SPACE
+    defaults = {name: default for name, default, _, _ in space}
+    if args.only:
+        names = args.only.split(',')
+        space = [entry for entry in space if entry[0] in names]
+    es = CMAES(to_vector(defaults, space), args.sigma, args.seed)
+    pool = multiprocessing.Pool(args.processes or os.cpu_count(), _init_worker, (args.strategy, args.book))
+    start = time.time()
+    try:
+        for generation in range(args.generations):
+            xs = es.ask()
+            candidates = [dict(defaults, **to_params(x, space)) for x in xs]
+            # every candidate of a generation plays the same seeds
+            seed = args.seed+1000*(generation+1)
+            scores = evaluate(pool, candidates, args.games, seed, args.max_turns)
+            es.tell(xs, [-score for score in scores])
+            print('generation {0} best {1:.3f} mean {2:.3f} sigma {3:.3f} elapsed {4:.0f}s'.format(
+                generation, max(scores), sum(scores)/len(scores), es.sigma, time.time()-start))
+        tuned = dict(defaults, **to_params(es.mean, space))
+        score = evaluate(pool, [tuned], args.validate, args.seed+1000*(args.generations+1), args.max_turns)[0]
+    finally:
+        pool.terminate()
+        pool.join()
+    print('tuned mean scores {0:.3f} against the defaults over {1} games'.format(score, args.validate))
+    for name, _, low, high in space:
+        print('{0:<20} {1:>6} -> {2:>6}  [{3}, {4}]'.format(name, defaults[name], tuned[name], low, high))
+    if args.write and (score > 0.5 or args.force):
+        write_defaults(args.write, tuned)
+        print('wrote defaults to {0}'.format(args.write))
+
+
+if __name__ == '__main__':
+    main()